@@ -0,0 +1,148 @@
+"""
+@package core.rastercache
+
+@brief Process-wide cache of raster map metadata.
+
+Classes:
+ - rastercache::RasterMetadataCache
+
+Metadata (extent, resolution, data type, value range and list
+of categories) are read once by r.info and r.describe and reused
+until the map's header or data file is modified.
+
+(C) 2014 by the GRASS Development Team
+
+This program is free software under the GNU General Public License
+(>=v2). Read the file COPYING that comes with GRASS for details.
+
+@author Anna Petrasova <kratochanna gmail.com>
+"""
+
+import os
+import threading
+
+from grass.script import core as gcore
+from grass.script import raster as grast
+from grass.exceptions import CalledModuleError
+
+
+class RasterMetadataCache:
+    """Cache of raster map metadata.
+
+    Entry of a map is valid while modification times of its cellhd,
+    cell and fcell files do not change, so checking it costs few stat
+    calls instead of running a module. Location of the map is resolved
+    by g.findfile once and again only when the map disappears from it.
+    Methods can be called from any thread.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        # map name -> (mapset path, name without mapset)
+        self._paths = {}
+        # (mapset path, name) -> {'key': mtimes, 'info': ..., 'categories': ...}
+        self._entries = {}
+
+    def _findMap(self, name):
+        with self._lock:
+            path = self._paths.get(name)
+        if path and os.path.exists(os.path.join(path[0], 'cellhd', path[1])):
+            return path
+        found = gcore.find_file(name, element='cell')
+        if not found['file']:
+            return None
+        # file is <mapset path>/cell/<name>
+        path = (os.path.dirname(os.path.dirname(found['file'])), found['name'])
+        with self._lock:
+            self._paths[name] = path
+        return path
+
+    def _getKey(self, path):
+        """Returns modification times of files of the map"""
+        key = []
+        for element in ('cellhd', 'cell', 'fcell'):
+            try:
+                key.append(os.stat(os.path.join(path[0], element, path[1])).st_mtime)
+            except OSError:
+                key.append(None)
+        return tuple(key)
+
+    def _get(self, name, item, read):
+        """Returns cached item of map metadata, reads it when missing or outdated
+
+        :param read: function returning the item for fully qualified map name
+        """
+        path = self._findMap(name)
+        if path is None:
+            return None
+        key = self._getKey(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or entry['key'] != key:
+                entry = {'key': key}
+                self._entries[path] = entry
+            if item in entry:
+                return entry[item]
+        fullName = path[1] + '@' + os.path.basename(path[0])
+        try:
+            value = read(fullName)
+        except CalledModuleError:
+            return None
+        with self._lock:
+            # map could be modified in the meantime
+            if self._entries.get(path) is entry and self._getKey(path) == key:
+                entry[item] = value
+        return value
+
+    def GetInfo(self, name):
+        """Returns output of r.info as dictionary (see raster_info)
+        or None when the map does not exist"""
+        return self._get(name, 'info', grast.raster_info)
+
+    def GetCategories(self, name):
+        """Returns list of values (as strings) of integer map
+        (r.describe -1n), values of floating point maps are not listed"""
+        def read(fullName):
+            info = self.GetInfo(fullName)
+            if not info or info['datatype'] != 'CELL':
+                return []
+            values = gcore.read_command('r.describe', flags='1n',
+                                        map=fullName, quiet=True).strip()
+            return values.split('\n') if values else []
+        return self._get(name, 'categories', read)
+
+    def GetRange(self, name):
+        """Returns (min, max) of the map or None"""
+        info = self.GetInfo(name)
+        if not info:
+            return None
+        return info['min'], info['max']
+
+    def GetRegion(self, name):
+        """Returns region matching the map in format of g.region -gc
+        or None when the map does not exist"""
+        info = self.GetInfo(name)
+        if not info:
+            return None
+        region = {}
+        for key, infoKey in (('n', 'north'), ('s', 'south'), ('e', 'east'), ('w', 'west'),
+                             ('nsres', 'nsres'), ('ewres', 'ewres'),
+                             ('rows', 'rows'), ('cols', 'cols')):
+            region[key] = float(info[infoKey])
+        region['cells'] = region['rows'] * region['cols']
+        region['center_easting'] = (region['e'] + region['w']) / 2.
+        region['center_northing'] = (region['n'] + region['s']) / 2.
+        return region
+
+    def Invalidate(self, name=None):
+        """Forgets metadata of the map or of all maps"""
+        with self._lock:
+            if name is None:
+                self._paths.clear()
+                self._entries.clear()
+                return
+            path = self._paths.pop(name, None)
+            if path:
+                self._entries.pop(path, None)
+
+
+RasterMetadata = RasterMetadataCache()
@@ -1451,6 +1451,7 @@ class MapFrame(SingleMapFrame):
                                                 toolSwitcher=self._toolSwitcher)
         self.rdigit.newRasterCreated.connect(self.toolbars['rdigit'].NewRasterAdded)
         self.rdigit.newRasterCreated.connect(lambda name: self._giface.mapCreated.emit(name=name, ltype='raster'))
+        self.rdigit.targetRasterCreated.connect(lambda name: self._giface.mapCreated.emit(name=name, ltype='raster'))
         self.rdigit.newFeatureCreated.connect(self.toolbars['rdigit'].UpdateCellValues)
         self.rdigit.uploadMapCategories.connect(self.toolbars['rdigit'].UpdateCellValues)
         self.rdigit.showNotification.connect(lambda text: self.SetStatusText(text, 0))
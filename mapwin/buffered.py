@@ -37,6 +37,7 @@ from gui_core.dialogs   import SavedRegion
 from core.gcmd          import RunCommand, GException, GError, GMessage
 from core.debug         import Debug
 from core.settings      import UserSettings
+from core.rastercache   import RasterMetadata
 from mapwin.base import MapWindowBase
 from core.utils         import GetGEventAttribsForHandler, _
 import core.utils as utils
@@ -137,6 +138,9 @@ class BufferedMapWindow(MapWindowBase, wx.Window):
         # Emitted when mouse us moving (mouse motion event)
         # Parametres are x and y of the mouse position in map (cell) units
         self.mouseMoving = Signal('BufferedWindow.mouseMoving')
+        # Emitted when mouse is moving with button pressed (mouse dragging event)
+        # Parametres are x and y of the mouse position in map (cell) units
+        self.mouseDragging = Signal('BufferedWindow.mouseDragging')
 
         # event bindings
         self.Bind(wx.EVT_PAINT,           self.OnPaint)
@@ -1225,6 +1229,9 @@ class BufferedMapWindow(MapWindowBase, wx.Window):
 
         # dragging
         elif event.Dragging():
+            pixelCoordinates = event.GetPositionTuple()[:]
+            coordinates = self.Pixel2Cell(pixelCoordinates)
+            self.mouseDragging.emit(x=coordinates[0], y=coordinates[1])
             self.OnDragging(event)
 
         # double click
@@ -1809,6 +1816,13 @@ class BufferedMapWindow(MapWindowBase, wx.Window):
                 for rname in l.GetName().splitlines():
                     rast.append(rname)
 
+        if not updated and len(rast) == 1 and not rast3d and not vect and not ignoreNulls:
+            # extent of single raster map does not need g.region
+            region = RasterMetadata.GetRegion(rast[0])
+            if region:
+                self.Map.region = dict(self.Map.region, **region)
+                updated = True
+
         if not updated:
             self.Map.GetRegion(rast=rast,
                                rast3d=rast3d,
@@ -195,6 +195,19 @@ class GraphicsSet:
 
         return item
 
+    def AppendItem(self, item):
+        """Append existing item to the list.
+
+        Item can be instance of GraphicsSetItem subclass which keeps
+        its data elsewhere (e.g. in raster digitizer feature storage).
+
+        :param item: (GraphicsSetItem) - item to add
+        :return: added item reference
+        """
+        self.itemsList.append(item)
+
+        return item
+
     def DeleteItem(self, item):
         """Deletes item
 
@@ -203,6 +216,10 @@ class GraphicsSet:
         :return: True if item was removed
         :return: False if item was not found
         """
+        # removing the last item (undo) is the most common case
+        if self.itemsList and self.itemsList[-1] is item:
+            self.itemsList.pop()
+            return True
         try:
             self.itemsList.remove(item)
         except ValueError:
@@ -210,6 +227,14 @@ class GraphicsSet:
 
         return True
 
+    def DeleteItems(self, items):
+        """Deletes many items at once
+
+        :param items: list of items (GraphicsSetItem) to remove
+        """
+        ids = set(id(item) for item in items)
+        self.itemsList = [item for item in self.itemsList if id(item) not in ids]
+
     def GetAllItems(self):
         """Returns list of all containing instances of GraphicsSetItem,
         in order as they are drawn. If you want to change order of
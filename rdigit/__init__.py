@@ -1,4 +1,23 @@
 all = [
+    'autosave',
+    'backup',
+    'benchmark',
+    'brush',
+    'burn',
     'controller',
+    'dialogs',
+    'engine',
+    'export',
+    'fill',
+    'history',
+    'importer',
+    'journal',
+    'planner',
+    'preview',
+    'rasterizer',
+    'selection',
+    'simplify',
+    'store',
+    'targets',
     'toolbars'
     ]
@@ -0,0 +1,90 @@
+"""
+@package rdigit.autosave
+
+@brief Policy for saving edited raster map automatically.
+
+Classes:
+ - autosave::AutosavePolicy
+
+(C) 2014 by the GRASS Development Team
+This program is free software under the GNU General Public
+License (>=v2). Read the file COPYING that comes with GRASS
+for details.
+
+@author Anna Petrasova <kratochanna gmail.com>
+"""
+
+import time
+
+
+class AutosavePolicy:
+    """Decides when unsaved features should be saved.
+
+    Save is due when enough features were finished or when the oldest
+    unsaved change is old enough. It is deferred while the user is drawing
+    and until there was no input for idleSeconds. All triggers which
+    happen before the save starts result in one save.
+    """
+    def __init__(self, maxFeatures=None, maxSeconds=None, idleSeconds=2.0,
+                 clock=time.time):
+        """
+        :param maxFeatures: number of unsaved features triggering save
+                            (None to disable)
+        :param maxSeconds: age of the oldest unsaved change in seconds
+                           triggering save (None to disable)
+        :param idleSeconds: time without input before save can start
+        :param clock: function returning current time in seconds
+        """
+        self._maxFeatures = maxFeatures
+        self._maxSeconds = maxSeconds
+        self._idleSeconds = idleSeconds
+        self._clock = clock
+        self._changes = 0
+        self._firstChange = None
+        self._lastInput = None
+
+    def SetLimits(self, maxFeatures=None, maxSeconds=None):
+        self._maxFeatures = maxFeatures
+        self._maxSeconds = maxSeconds
+
+    def IsEnabled(self):
+        return bool(self._maxFeatures or self._maxSeconds)
+
+    def Input(self):
+        """Records user input (e.g. mouse click)"""
+        self._lastInput = self._clock()
+
+    def Changed(self, count=1):
+        """Records unsaved changes (e.g. finished feature)"""
+        if not self._changes:
+            self._firstChange = self._clock()
+        self._changes += count
+
+    def Started(self):
+        """Records that save started, changes made since then
+        are saved next time."""
+        self._changes = 0
+        self._firstChange = None
+
+    def IsTriggered(self):
+        """Checks if a limit was reached, regardless of user activity"""
+        if not self._changes:
+            return False
+        if self._maxFeatures and self._changes >= self._maxFeatures:
+            return True
+        if self._maxSeconds and self._clock() - self._firstChange >= self._maxSeconds:
+            return True
+        return False
+
+    def IsDue(self, drawing=False, busy=False):
+        """Checks if save should start now.
+
+        :param drawing: user is digitizing a feature
+        :param busy: other save is running
+        """
+        if drawing or busy or not self.IsTriggered():
+            return False
+        if self._lastInput is not None and \
+                self._clock() - self._lastInput < self._idleSeconds:
+            return False
+        return True
@@ -0,0 +1,177 @@
+"""
+@package rdigit.backup
+
+@brief Copy-on-write backup of edited raster map.
+
+Classes:
+ - backup::TileBackup
+
+(C) 2014 by the GRASS Development Team
+This program is free software under the GNU General Public
+License (>=v2). Read the file COPYING that comes with GRASS
+for details.
+
+@author Anna Petrasova <kratochanna gmail.com>
+"""
+
+import os
+import shutil
+import zlib
+
+try:
+    import numpy as np
+except ImportError:
+    pass
+
+
+class TileBackup:
+    """Keeps original content of edited raster map for tiles
+    which were overwritten.
+
+    Before an export overwrites a window of the raster map, the tiles
+    intersecting it which were not saved yet are captured while the rows
+    of the map are streamed (see rasterizer.PatchRaster). Tiles are stored
+    compressed in a directory. Tiles are aligned to the computational
+    region valid when the backup was created. Tiles already stored in the
+    directory (by an interrupted session) are used.
+    """
+    def __init__(self, grid, path, tileSize=256):
+        """
+        :param grid: RasterGrid of the computational region
+        :param path: directory for storing tiles (created if needed)
+        :param tileSize: number of rows and columns of a tile
+        """
+        self._grid = grid
+        self._path = path
+        self._tileSize = tileSize
+        if not os.path.exists(path):
+            os.makedirs(path)
+        # (tile row, tile col) -> (file name, shape, dtype) of saved tiles
+        self._saved = {}
+        self._loadTiles()
+        # tiles being captured: (tile row, tile col) -> array
+        self._pending = {}
+        # tiles captured by current export
+        self._written = {}
+        # decompressed tiles of one band of tile rows used for restoring
+        self._cachedBand = None
+        self._cache = {}
+
+    def _loadTiles(self):
+        """Registers tiles stored by previous session in the directory"""
+        for name in os.listdir(self._path):
+            parts = name.split('_')
+            if len(parts) != 4 or parts[0] != 'tile' or name.endswith('.part'):
+                continue
+            key = (int(parts[1]), int(parts[2]))
+            r0, r1, c0, c1 = self._tileExtent(*key)
+            self._saved[key] = (os.path.join(self._path, name),
+                                (r1 - r0, c1 - c0), parts[3])
+
+    def GetPath(self):
+        return self._path
+
+    def GetGrid(self):
+        return self._grid
+
+    def IsEmpty(self):
+        return not self._saved
+
+    def MatchesGrid(self, grid):
+        """Checks if grid is the same as the one of backup"""
+        return (grid.north, grid.south, grid.east, grid.west, grid.rows, grid.cols) == \
+            (self._grid.north, self._grid.south, self._grid.east, self._grid.west,
+             self._grid.rows, self._grid.cols)
+
+    def _tileExtent(self, tileRow, tileCol):
+        size = self._tileSize
+        return (tileRow * size, min((tileRow + 1) * size, self._grid.rows),
+                tileCol * size, min((tileCol + 1) * size, self._grid.cols))
+
+    def Prepare(self, window):
+        """Marks tiles intersecting window for capturing,
+        has to be called before the rows are streamed.
+
+        :param window: RasterGrid which is going to be overwritten
+        """
+        self._written = {}
+        size = self._tileSize
+        row0, col0 = window.rowOffset, window.colOffset
+        row1, col1 = row0 + window.rows, col0 + window.cols
+        for tileRow in range(row0 // size, (row1 - 1) // size + 1):
+            for tileCol in range(col0 // size, (col1 - 1) // size + 1):
+                key = (tileRow, tileCol)
+                if key not in self._saved:
+                    self._pending[key] = None
+
+    def CaptureRow(self, row, data):
+        """Stores row of the raster map before it is overwritten.
+
+        Rows have to come in increasing order, tiles are written
+        when their last row is captured.
+        """
+        if not self._pending:
+            return
+        tileRow = row // self._tileSize
+        for key, tile in list(self._pending.items()):
+            if key[0] != tileRow:
+                continue
+            r0, r1, c0, c1 = self._tileExtent(*key)
+            if tile is None:
+                tile = np.empty((r1 - r0, c1 - c0), dtype=data.dtype)
+                self._pending[key] = tile
+            tile[row - r0] = data[c0:c1]
+            if row == r1 - 1:
+                self._writeTile(key, tile)
+
+    def _writeTile(self, key, tile):
+        name = os.path.join(self._path, 'tile_{0}_{1}_{2}'.format(key[0], key[1],
+                                                                  tile.dtype.name))
+        # tile appears complete or not at all
+        with open(name + '.part', 'wb') as f:
+            f.write(zlib.compress(tile.tobytes(), 1))
+        os.rename(name + '.part', name)
+        self._written[key] = (name, tile.shape, tile.dtype.name)
+        del self._pending[key]
+
+    def Finish(self):
+        """Finishes capturing, captured tiles become available
+        for restoring. Tiles not captured completely are dropped."""
+        self._saved.update(self._written)
+        self._written = {}
+        self._pending = {}
+        self._cachedBand = None
+        self._cache = {}
+
+    def _readTile(self, key):
+        name, shape, dtype = self._saved[key]
+        with open(name, 'rb') as f:
+            data = zlib.decompress(f.read())
+        return np.frombuffer(data, dtype=np.dtype(dtype)).reshape(shape)
+
+    def RestoreRow(self, row, data):
+        """Replaces parts of row of the current raster map
+        with original values where tiles were saved.
+
+        :param row: row index
+        :param data: row of the current raster map, modified in place
+        """
+        tileRow = row // self._tileSize
+        if tileRow != self._cachedBand:
+            self._cache = {}
+            for key in self._saved:
+                if key[0] == tileRow:
+                    self._cache[key] = self._readTile(key)
+            self._cachedBand = tileRow
+        for key, tile in self._cache.items():
+            r0, r1, c0, c1 = self._tileExtent(*key)
+            data[c0:c1] = tile[row - r0]
+        return data
+
+    def Discard(self):
+        """Removes stored tiles"""
+        self._saved = {}
+        self._pending = {}
+        self._cache = {}
+        self._cachedBand = None
+        shutil.rmtree(self._path, ignore_errors=True)
@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+############################################################################
+#
+# MODULE:    rdigit/benchmark.py
+# AUTHOR(S): Anna Petrasova <kratochanna gmail.com>
+# PURPOSE:   Benchmark of saving features digitized by raster digitizer
+# COPYRIGHT: (C) 2014 by the GRASS Development Team
+#
+#  This program is free software under the GNU General Public License
+#  (>=v2). Read the file COPYING that comes with GRASS for details.
+#
+############################################################################
+"""Benchmark of the raster digitizer export pipeline.
+
+Runs outside of GRASS session, a temporary XY location is created
+(GISBASE has to be set). Synthetic sessions are generated for all
+combinations of the given numbers of features and vertices, mixes
+of widths and values and region sizes. Features are saved into a copy
+of the background raster map by DigitizerEngine, as in the GUI, and
+stages of the save are timed for each method:
+
+ - add: features added to the engine (store and journal)
+ - prepare: features turned into export records
+ - plan: grouping of records into batches (ExportJob)
+ - rasterize: all batches including buffers (and generating r.in.poly
+   input for method modules)
+ - patch: writing rasterized features over the edited raster map,
+   including backup of tiles and changes recorded for undo
+ - rename: replacing the edited raster map by the written one
+ - color: updating color table of the edited raster map
+
+Results are written as JSON. When a previous result is given
+by --compare, stages slower by more than the tolerance are reported
+and the script exits with status 1.
+
+Example::
+
+    GISBASE=/usr/lib/grass70 python rdigit/benchmark.py \\
+        --features 1000,10000,100000,1000000 --output results.json
+"""
+
+import os
+import sys
+import math
+import json
+import random
+import shutil
+import argparse
+import platform
+import datetime
+import tempfile
+import itertools
+from collections import OrderedDict
+from timeit import default_timer as timer
+
+wxbase = os.path.normpath(os.path.join(os.getenv('GISBASE', ''), 'gui', 'wxpython'))
+if wxbase not in sys.path:
+    sys.path.append(wxbase)
+
+import gettext
+gettext.install('grasswxpy', os.path.join(os.getenv('GISBASE', ''), 'locale'))
+
+from grass.script import core as gcore
+from grass.script import raster as grast
+
+from rdigit.engine import DigitizerEngine
+from rdigit.export import GetTempName
+from rdigit.importer import FeatureColumns
+from rdigit.rasterizer import haveNumpy, CanAccessRasters
+
+# share of feature types in generated sessions
+TYPES = (('area', 0.5), ('line', 0.3), ('point', 0.2))
+BACKGROUND = 'rdigit_benchmark_background'
+
+
+def GenerateFeatures(count, vertices, widths, values, region, size, seed=0):
+    """Generates random features within the region.
+
+    :param count: number of features
+    :param vertices: number of vertices of areas and lines
+    :param widths: 'none', 'mixed' (widths of half of lines and points)
+                   or 'all' (widths of all features)
+    :param values: 'constant', 'classes' (10 values) or 'unique'
+    :param region: number of rows and columns of the region (cell size is 1)
+    :param size: maximum radius of features in cells
+    :param seed: seed of random numbers
+
+    :return: FeatureColumns
+    """
+    rand = random.Random(seed)
+    columns = FeatureColumns()
+    bounds = []
+    total = 0
+    for ftype, share in TYPES:
+        total += share
+        bounds.append((total, ftype))
+    for i in range(count):
+        pick = rand.random() * total
+        ftype = [each for bound, each in bounds if pick <= bound][0]
+        x = rand.uniform(0, region)
+        y = rand.uniform(0, region)
+        radius = rand.uniform(1, size)
+        if ftype == 'point':
+            coords = [x, y]
+        elif ftype == 'area':
+            coords = []
+            for k in range(max(3, vertices)):
+                angle = 2 * math.pi * k / max(3, vertices)
+                r = radius * rand.uniform(0.7, 1)
+                coords.append([x + r * math.cos(angle), y + r * math.sin(angle)])
+        else:
+            coords = [[x, y]]
+            step = 2. * radius / max(1, vertices - 1)
+            for k in range(max(2, vertices) - 1):
+                x += rand.uniform(-step, step)
+                y += rand.uniform(-step, step)
+                coords.append([x, y])
+        if widths == 'all' or (widths == 'mixed' and ftype != 'area' and rand.random() < 0.5):
+            width = rand.choice((1, 2, 5))
+        else:
+            width = 0
+        if values == 'constant':
+            value = 1
+        elif values == 'classes':
+            value = rand.randint(1, 10)
+        else:
+            value = i + 1
+        columns.Add(ftype, coords, value, width)
+    return columns
+
+
+def CreateLocation(dbase):
+    """Creates XY location in dbase and starts session in it"""
+    import grass.script.setup as gsetup
+
+    location = 'rdigit_benchmark'
+    gcore.create_location(dbase, location)
+    gsetup.init(os.environ['GISBASE'], dbase, location, 'PERMANENT')
+
+
+def SetRegion(size):
+    """Sets region of size x size cells and creates background raster map"""
+    gcore.run_command('g.region', n=size, s=0, e=size, w=0, res=1, quiet=True)
+    grast.mapcalc(exp="{name} = int(row() % 7)".format(name=BACKGROUND),
+                  overwrite=True, quiet=True)
+
+
+def RunCase(columns, method, workers):
+    """Saves generated features into copy of background raster map
+    and times stages.
+
+    :param columns: FeatureColumns
+    :param method: 'numpy' or 'modules'
+    :param workers: number of parallel workers
+
+    :return: dictionary of stage durations in seconds
+    """
+    times = OrderedDict()
+    engine = DigitizerEngine(workers=workers, method='modules' if method == 'modules' else None)
+    output = GetTempName()
+    try:
+        gcore.run_command('g.copy', rast=[BACKGROUND, output], quiet=True)
+        engine.SelectMap(output + '@' + gcore.gisenv()['MAPSET'])
+
+        start = timer()
+        engine.AddFeatures(columns)
+        times['add'] = timer() - start
+
+        engine.Export()
+        times.update(engine.GetExportTimes())
+    finally:
+        engine.CleanUp()
+        gcore.run_command('g.remove', type='rast', flags='f', name=output, quiet=True)
+    return times
+
+
+def GetCaseKey(case):
+    return tuple(case[key] for key in ('features', 'vertices', 'widths', 'values',
+                                       'region', 'method', 'workers'))
+
+
+def Compare(results, baseline, tolerance):
+    """Returns list of messages about stages slower than in baseline
+
+    :param tolerance: allowed ratio of durations
+    """
+    previous = dict((GetCaseKey(case), case) for case in baseline['cases'])
+    messages = []
+    for case in results['cases']:
+        old = previous.get(GetCaseKey(case))
+        if not old:
+            continue
+        for stage, duration in case['stages'].items():
+            before = old['stages'].get(stage)
+            # very short stages are too noisy to compare
+            if before is None or max(duration, before) < 0.01:
+                continue
+            if duration > before * tolerance:
+                messages.append("{key}: {stage} {before:.3f} s -> {after:.3f} s".format(
+                    key=GetCaseKey(case), stage=stage, before=before, after=duration))
+    return messages
+
+
+def _parseList(text, convert=str):
+    return [convert(item) for item in text.split(',') if item]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--features', default='1000,10000,100000,1000000',
+                        help="numbers of features")
+    parser.add_argument('--vertices', default='8', help="numbers of vertices of areas and lines")
+    parser.add_argument('--widths', default='none,mixed', help="none, mixed or all")
+    parser.add_argument('--values', default='classes', help="constant, classes or unique")
+    parser.add_argument('--region', default='1000', help="numbers of rows (and columns)")
+    parser.add_argument('--size', type=float, default=10,
+                        help="maximum radius of features in cells")
+    parser.add_argument('--methods', default='numpy,modules', help="numpy and/or modules")
+    parser.add_argument('--workers', type=int, default=1, help="number of parallel workers")
+    parser.add_argument('--repeat', type=int, default=1,
+                        help="number of runs, the fastest is reported")
+    parser.add_argument('--output', help="JSON file with results (default standard output)")
+    parser.add_argument('--compare', help="JSON file with previous results")
+    parser.add_argument('--tolerance', type=float, default=1.25,
+                        help="allowed slowdown compared to previous results")
+    parser.add_argument('--dbase', help="directory for the location (default temporary)")
+    args = parser.parse_args()
+
+    if not os.getenv('GISBASE'):
+        sys.exit("GISBASE is not set")
+    methods = _parseList(args.methods)
+    if 'numpy' in methods and not haveNumpy:
+        sys.exit("Method numpy requires NumPy")
+
+    dbase = args.dbase or tempfile.mkdtemp(prefix='rdigit_benchmark')
+    results = {'date': datetime.datetime.now().isoformat(),
+               'python': platform.python_version(),
+               'platform': platform.platform(),
+               'cases': []}
+    try:
+        CreateLocation(dbase)
+        results['grass'] = gcore.version().get('version')
+        if 'numpy' in methods and not CanAccessRasters():
+            sys.exit("Method numpy requires pygrass")
+        for region in _parseList(args.region, int):
+            SetRegion(region)
+            for count, vertices, widths, values in itertools.product(
+                    _parseList(args.features, int), _parseList(args.vertices, int),
+                    _parseList(args.widths), _parseList(args.values)):
+                columns = GenerateFeatures(count, vertices, widths, values,
+                                           region=region, size=args.size)
+                for method in methods:
+                    stages = None
+                    for i in range(args.repeat):
+                        times = RunCase(columns, method, args.workers)
+                        if stages is None:
+                            stages = times
+                        else:
+                            for stage in stages:
+                                stages[stage] = min(stages[stage], times[stage])
+                    case = OrderedDict([('features', count), ('vertices', vertices),
+                                        ('widths', widths), ('values', values),
+                                        ('region', region), ('method', method),
+                                        ('workers', args.workers), ('stages', stages),
+                                        ('total', sum(stages.values()))])
+                    results['cases'].append(case)
+                    sys.stderr.write("{key}: {total:.3f} s\n".format(key=GetCaseKey(case),
+                                                                      total=case['total']))
+    finally:
+        if not args.dbase:
+            shutil.rmtree(dbase, ignore_errors=True)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        messages = Compare(results, baseline, args.tolerance)
+        for message in messages:
+            sys.stderr.write("Slower: " + message + '\n')
+        if messages:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""
+@package rdigit.brush
+
+@brief Brush strokes painted into raster cells.
+
+Classes:
+ - brush::BrushStroke
+
+(C) 2014 by the GRASS Development Team
+This program is free software under the GNU General Public
+License (>=v2). Read the file COPYING that comes with GRASS
+for details.
+
+@author Anna Petrasova <kratochanna gmail.com>
+"""
+
+import math
+import bisect
+
+from rdigit.rasterizer import DiskKernel
+
+
+def BrushFootprint(shape, radius, nsres, ewres):
+    """Returns half widths (in columns) of brush footprint rows.
+
+    Cells are included when the distance of their centers from the center
+    cell is not greater than radius, as for buffers of lines and points
+    (see rasterizer.DiskKernel), or each coordinate difference for square.
+
+    :param shape: 'circle' or 'square'
+    :param radius: radius in map units, 0 for single cell
+    :param nsres, ewres: cell size
+
+    :return: list of half widths for row offsets -n..n
+    """
+    if shape == 'square':
+        rows = int(radius / nsres + 1e-9)
+        return [int(radius / ewres + 1e-9)] * (2 * rows + 1)
+    return DiskKernel(radius, nsres, ewres)
+
+
+class BrushStroke:
+    """Cells painted by dragging brush over computational region.
+
+    Cells are kept as run-length encoded spans in raster coordinates
+    (row, first column, last column), spans of each row are sorted
+    and merged as the brush moves, so the stroke size depends on
+    the number of rows rather than on the number of cells.
+    """
+    def __init__(self, grid, shape='circle', radius=0):
+        """
+        :param grid: RasterGrid of computational region
+        :param shape: 'circle' or 'square'
+        :param radius: radius in map units
+        """
+        self._grid = grid
+        self._footprint = BrushFootprint(shape, radius, grid.nsres, grid.ewres)
+        self._radius = len(self._footprint) // 2
+        # row -> sorted list of first and last columns of disjoint spans
+        self._starts = {}
+        self._ends = {}
+        self._last = None
+
+    def IsEmpty(self):
+        return not self._starts
+
+    def _addSpan(self, row, col0, col1):
+        """Adds span to the row.
+
+        :return: list of (first column, last column) of cells
+                 which were not painted before
+        """
+        starts = self._starts.setdefault(row, [])
+        ends = self._ends.setdefault(row, [])
+        # spans touching or overlapping [col0, col1]
+        i = bisect.bisect_left(ends, col0 - 1)
+        j = bisect.bisect_right(starts, col1 + 1)
+        new = []
+        col = col0
+        for k in range(i, j):
+            if starts[k] > col:
+                new.append((col, min(starts[k] - 1, col1)))
+            col = max(col, ends[k] + 1)
+        if col <= col1:
+            new.append((col, col1))
+        if i < j:
+            col0 = min(col0, starts[i])
+            col1 = max(col1, ends[j - 1])
+        starts[i:j] = [col0]
+        ends[i:j] = [col1]
+        return new
+
+    def _stamp(self, row, col):
+        """Paints footprint centered in the cell
+
+        :return: list of newly painted spans (row, first column, last column)
+        """
+        new = []
+        radius = self._radius
+        for dr, halfWidth in enumerate(self._footprint):
+            r = row + dr - radius
+            if r < 0 or r >= self._grid.rows:
+                continue
+            col0 = max(col - halfWidth, 0)
+            col1 = min(col + halfWidth, self._grid.cols - 1)
+            if col0 > col1:
+                continue
+            new.extend((r, c0, c1) for c0, c1 in self._addSpan(r, col0, col1))
+        return new
+
+    def Paint(self, x, y):
+        """Moves brush to the point, cells between the previous
+        and the current position are painted too.
+
+        :param x, y: map coordinates
+
+        :return: list of newly painted spans (row, first column, last column)
+        """
+        col, row = self._grid.ToGrid(x, y)
+        col, row = int(math.floor(col)), int(math.floor(row))
+        if self._last is None:
+            self._last = (row, col)
+            return self._stamp(row, col)
+        row0, col0 = self._last
+        self._last = (row, col)
+        # stamps closer than quarter of the radius (in cells) leave
+        # footprint edges within a cell
+        step = max(1, min(self._radius, max(self._footprint)) // 4)
+        steps = int(math.ceil(max(abs(row - row0), abs(col - col0)) / float(step)))
+        new = []
+        for step in range(1, steps + 1):
+            t = step / float(steps)
+            new.extend(self._stamp(int(round(row0 + t * (row - row0))),
+                                   int(round(col0 + t * (col - col0)))))
+        return new
+
+    def GetRuns(self):
+        """Returns spans (row, first column, last column) sorted by rows"""
+        runs = []
+        for row in sorted(self._starts):
+            runs.extend((row, c0, c1) for c0, c1 in zip(self._starts[row], self._ends[row]))
+        return runs
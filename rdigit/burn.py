@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+############################################################################
+#
+# MODULE:    rdigit/burn.py
+# AUTHOR(S): Anna Petrasova <kratochanna gmail.com>
+# PURPOSE:   Burns features from vector map or file into raster map
+#            using raster digitizer engine
+# COPYRIGHT: (C) 2014 by the GRASS Development Team
+#
+#  This program is free software under the GNU General Public License
+#  (>=v2). Read the file COPYING that comes with GRASS for details.
+#
+############################################################################
+
+#%module
+#% description: Burns areas, lines and points into new or existing raster map.
+#% keyword: raster
+#% keyword: editing
+#% keyword: digitizer
+#%end
+#%option G_OPT_V_INPUT
+#% key: vector
+#% required: no
+#% guisection: Input
+#%end
+#%option G_OPT_F_INPUT
+#% key: file
+#% required: no
+#% description: GeoJSON or WKT file with features
+#% guisection: Input
+#%end
+#%option G_OPT_R_MAP
+#% description: Name of raster map to edit or create
+#%end
+#%option G_OPT_R_INPUT
+#% key: background
+#% required: no
+#% description: Name of background raster map of new raster map
+#%end
+#%option
+#% key: type
+#% type: string
+#% options: CELL,FCELL,DCELL
+#% answer: CELL
+#% description: Type of new raster map
+#%end
+#%option
+#% key: value
+#% type: double
+#% required: no
+#% description: Cell value of features
+#% guisection: Values
+#%end
+#%option G_OPT_DB_COLUMN
+#% key: value_column
+#% description: Attribute (property) with cell value
+#% guisection: Values
+#%end
+#%option
+#% key: width
+#% type: double
+#% required: no
+#% description: Width of lines and points in map units
+#% guisection: Values
+#%end
+#%option G_OPT_DB_COLUMN
+#% key: width_column
+#% description: Attribute (property) with width in map units
+#% guisection: Values
+#%end
+#%option G_OPT_M_NPROCS
+#%end
+#%option G_OPT_M_COLR
+#% answer: rainbow
+#% description: Color table of new raster map without background map
+#%end
+#%rules
+#% required: vector,file
+#% exclusive: vector,file
+#% required: value,value_column
+#% exclusive: value,value_column
+#% exclusive: width,width_column
+#%end
+
+import os
+import sys
+
+wxbase = os.path.normpath(os.path.join(os.getenv('GISBASE'), 'gui', 'wxpython'))
+if wxbase not in sys.path:
+    sys.path.append(wxbase)
+
+import gettext
+gettext.install('grasswxpy', os.path.join(os.getenv('GISBASE'), 'locale'))
+
+from grass.script import core as gcore
+from grass.exceptions import CalledModuleError, ScriptError
+
+from rdigit.engine import DigitizerEngine
+from rdigit.export import ExportCancelled
+from rdigit.importer import LoadFeatures, ReadFile, ReadVector
+
+
+def _toFloat(value):
+    return float(value) if value else None
+
+
+def _removeMap(name):
+    try:
+        gcore.run_command('g.remove', type='rast', flags='f', name=name, quiet=True)
+    except CalledModuleError:
+        pass
+
+
+def main():
+    options, flags = gcore.parser()
+    name = options['map'].split('@')[0]
+    mapset = gcore.gisenv()['MAPSET']
+
+    engine = DigitizerEngine(workers=int(options['nprocs'] or 1),
+                             colorTable=options['color'])
+    created = False
+    try:
+        if gcore.find_file(name, element='cell', mapset=mapset)['name']:
+            engine.SelectMap(name + '@' + mapset, session=False)
+        else:
+            engine.CreateMap(name, options['background'], options['type'], session=False)
+            created = True
+
+        gcore.message(_("Reading features..."))
+        if options['vector']:
+            features = ReadVector(options['vector'])
+        else:
+            features = ReadFile(options['file'])
+        try:
+            columns = LoadFeatures(features, value=_toFloat(options['value']),
+                                   width=_toFloat(options['width']),
+                                   valueColumn=options['value_column'] or None,
+                                   widthColumn=options['width_column'] or None)
+        except (IOError, OSError, ValueError, KeyError, TypeError, IndexError) as e:
+            raise ScriptError(_("Failed to read features: %s") % e)
+        if not len(columns):
+            raise ScriptError(_("No features found"))
+        engine.AddFeatures(columns)
+
+        gcore.message(_("Burning %d features...") % len(columns))
+        if not engine.Export(progress=lambda cells, total, text: gcore.percent(cells, total, 5)):
+            raise ScriptError(_("No features in the computational region"))
+    except (ScriptError, CalledModuleError, ExportCancelled) as e:
+        if created:
+            # new raster map has no cells until features are written
+            _removeMap(name)
+        gcore.fatal(str(e))
+    finally:
+        engine.CleanUp()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,49 +1,142 @@
 # -*- coding: utf-8 -*-
 import os
-import tempfile
 import wx
-import uuid
+import math
+import multiprocessing
 from wx.lib.newevent import NewEvent
 
 from grass.script import core as gcore
-from grass.script import raster as grast
 from grass.exceptions import CalledModuleError, ScriptError
 from grass.pydispatch.signal import Signal
 
 from core.gcmd import GError, GMessage
 from core.settings import UserSettings
 from core.gthread import gThread
-from rdigit.dialogs import NewRasterDialog
+from core.rastercache import RasterMetadata
+from mapwin.graphics import GraphicsSetItem
+from rdigit.dialogs import NewRasterDialog, TargetRasterDialog
+from rdigit.engine import DigitizerEngine
+from rdigit.preview import FeaturePreview
+from rdigit.autosave import AutosavePolicy
+from rdigit.export import ExportCancelled
+from rdigit.selection import FeatureIndex, HitFeature, FeatureInPolygon, BBoxContains
+from rdigit.importer import LoadFeatures, ReadFile, ReadVector
+from rdigit.fill import FloodFill, RunsToCoords
+from rdigit.brush import BrushStroke
+from rdigit.simplify import StreamSimplifier
+from rdigit.rasterizer import haveNumpy, RasterGrid, FeatureRasterizer, ReadRasterWindow, \
+    CanAccessRasters
 
 updateProgress, EVT_UPDATE_PROGRESS = NewEvent()
 
 
+class FeatureGraphicsItem(GraphicsSetItem):
+    """Graphics item whose geometry, cell value and width
+    are kept in FeatureStore."""
+    def __init__(self, store, fid, penName=None):
+        GraphicsSetItem.__init__(self, coords=None, penName=penName)
+        self._store = store
+        self._fid = fid
+
+    def GetFeatureId(self):
+        return self._fid
+
+    def SetCoords(self, coords):
+        self._store.SetCoords(self._fid, coords)
+
+    def GetCoords(self):
+        return self._store.GetCoords(self._fid)
+
+    def GetPropertyVal(self, propName):
+        if propName == 'cellValue':
+            return self._store.GetValue(self._fid)
+        elif propName == 'widthValue':
+            return self._store.GetWidth(self._fid)
+        return GraphicsSetItem.GetPropertyVal(self, propName)
+
+    def SetPropertyVal(self, propName, propVal):
+        if propName == 'cellValue':
+            self._store.SetValue(self._fid, propVal)
+            return True
+        elif propName == 'widthValue':
+            self._store.SetWidth(self._fid, propVal)
+            return True
+        return GraphicsSetItem.SetPropertyVal(self, propName, propVal)
+
+
 class RDigitController(wx.EvtHandler):
+    """Digitizing in map window, features and saving are handled
+    by DigitizerEngine."""
     def __init__(self, giface, mapWindow):
         wx.EvtHandler.__init__(self)
         self._giface = giface
         self._mapWindow = mapWindow
 
         self._thread = gThread()
-        self._editedRaster = None
-        self._backgroundRaster = None
-        self._backupRasterName = None
+        # features, edited raster map and saving,
+        # all CPUs are used for rasterization by default
+        table = UserSettings.Get(group='rasterLayer', key='colorTable', subkey='selection')
+        self._engine = DigitizerEngine(workers=multiprocessing.cpu_count(), colorTable=table,
+                                       warning=self._showWarning)
+        # undone actions which can be redone: ('feature', record) or ('save', None)
+        self._redoStack = []
         self._areas = None
         self._lines = None
         self._points = None
-        self._all = []
+        # filled cells
+        self._cells = None
+        # RasterGrid of computational region
+        self._region = None
+        # preview of rasterized features
+        self._previewGraphics = None
+        self._preview = None
+        self._previewImage = None
+        self._previewRegion = None
+        # features in drawing order, changed only through the engine
+        self._store = self._engine.GetStore()
+        # feature id -> FeatureGraphicsItem
+        self._items = {}
+        # spatial index of finished features, ids of selected features
+        self._index = None
+        self._selected = set()
+        # start of box selection and vertices of lasso
+        self._selectStart = None
+        self._lasso = []
+        self._selectionGraphics = None
         self._drawing = False
         self._running = False
+        # number of exports queued or running in the background
+        self._pendingExports = 0
+        self._autosave = AutosavePolicy()
+        self._autosaveTimer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, self._onAutosaveTimer, self._autosaveTimer)
         self._drawColor = wx.GREEN
         self._drawTransparency = 100
         self._graphicsType = 'area'
         self._currentCellValue = None
         self._currentWidthValue = None
+        # flood fill settings, raster map filled is 'edited' (including
+        # unsaved features) or 'background'
+        self._fillConnectivity = 4
+        self._fillTolerance = 0
+        self._fillSource = 'edited'
+        # simplification of digitized lines and areas, tolerance
+        # in 'pixels' or 'cells' and maximum number of vertices of feature
+        self._simplifyTolerance = 1
+        self._simplifyUnits = 'pixels'
+        self._vertexBudget = 1000
+        self._simplifier = None
+        # brush stroke being painted, footprint shape, id and bounds of its drawing
+        self._stroke = None
+        self._strokeBounds = None
+        self._brushShape = 'circle'
+        self._brushId = wx.NewId()
 
         self._oldMouseUse = None
         self._oldCursor = None
 
         self.newRasterCreated = Signal('RDigitController:newRasterCreated')
+        self.targetRasterCreated = Signal('RDigitController:targetRasterCreated')
         self.newFeatureCreated = Signal('RDigitController:newFeatureCreated')
         self.uploadMapCategories = Signal('RDigitController:uploadMapCategories')
         self.quitDigitizer = Signal('RDigitController:quitDigitizer')
@@ -52,12 +145,14 @@ class RDigitController(wx.EvtHandler):
     def _connectAll(self):
         self._mapWindow.mouseLeftDown.connect(self._start)
         self._mapWindow.mouseLeftUp.connect(self._addPoint)
+        self._mapWindow.mouseDragging.connect(self._paint)
         self._mapWindow.mouseRightUp.connect(self._finish)
         self._mapWindow.Unbind(wx.EVT_CONTEXT_MENU)
 
     def _disconnectAll(self):
         self._mapWindow.mouseLeftDown.disconnect(self._start)
         self._mapWindow.mouseLeftUp.disconnect(self._addPoint)
+        self._mapWindow.mouseDragging.disconnect(self._paint)
         self._mapWindow.mouseRightUp.connect(self._finish)
         self._mapWindow.Bind(wx.EVT_CONTEXT_MENU, self._mapWindow.OnContextMenu)
 
@@ -65,72 +160,133 @@ class RDigitController(wx.EvtHandler):
         if self._running:
             return
 
-        if not self._editedRaster:
+        if not self._engine.GetEditedRaster():
             GMessage(parent=self._mapWindow, message=_("Please select first the raster map"))
             return
+        self._autosave.Input()
+        if self._graphicsType in ('select', 'lasso'):
+            if self._graphicsType == 'select' and not self._drawing:
+                self._selectStart = (x, y)
+            return
+        if self._graphicsType == 'brush':
+            self._startStroke(x, y)
+            return
         if not self._drawing:
-            if self._graphicsType == 'area':
-                item = self._areas.AddItem(coords=[])
-                item.SetPropertyVal('penName', 'pen1')
-                self._all.append(item)
-            elif self._graphicsType == 'line':
-                item = self._lines.AddItem(coords=[])
-                item.SetPropertyVal('penName', 'pen1')
-                self._all.append(item)
-            elif self._graphicsType == 'point':
-                item = self._points.AddItem(coords=[])
-                item.SetPropertyVal('penName', 'pen1')
-                self._all.append(item)
+            if self._graphicsType not in ('area', 'line', 'point'):
+                return
+            fid = self._engine.StartFeature(self._graphicsType)
+            item = FeatureGraphicsItem(self._store, fid, penName='pen1')
+            self._getGraphicsSet(self._graphicsType).AppendItem(item)
+            self._items[fid] = item
             self._drawing = True
+            self._simplifier = self._createSimplifier()
+
+    def _getGraphicsSet(self, ftype):
+        return {'area': self._areas, 'line': self._lines, 'point': self._points,
+                'cells': self._cells}[ftype]
+
+    def _getGraphicsSets(self):
+        return (self._areas, self._lines, self._points, self._cells)
 
     def _addPoint(self, x, y):
         if self._running:
             return
 
+        if self._graphicsType in ('select', 'lasso'):
+            self._addSelectionPoint(x, y)
+            return
+        if self._graphicsType == 'fill':
+            self._fill(x, y)
+            return
+        if self._graphicsType == 'brush':
+            self._finishStroke()
+            return
         if not self._drawing:
             return
 
+        self._autosave.Input()
+        fid = self._store.GetLast()
         if self._graphicsType == 'area':
-            area = self._areas.GetItem(-1)
-            coords = area.GetCoords() + [[x, y]]
-            area.SetCoords(coords)
+            self._addVertex(fid, x, y)
             self.showNotification.emit(text=_("Right click to finish area"))
         elif self._graphicsType == 'line':
-            line = self._lines.GetItem(-1)
-            coords = line.GetCoords() + [[x, y]]
-            line.SetCoords(coords)
+            self._addVertex(fid, x, y)
             self.showNotification.emit(text=_("Right click to finish line"))
         elif self._graphicsType == 'point':
-            point = self._points.GetItem(-1)
-            point.SetCoords([x, y])
+            self._store.SetCoords(fid, [x, y])
             self._finish(x, y)
         # draw
         self._mapWindow.ClearLines()
+        self._previewGraphics.Draw(pdc=self._mapWindow.pdcTmp)
+        self._cells.Draw(pdc=self._mapWindow.pdcTmp)
         self._lines.Draw(pdc=self._mapWindow.pdcTmp)
         self._areas.Draw(pdc=self._mapWindow.pdcTmp)
         self._points.Draw(pdc=self._mapWindow.pdcTmp)
         self._mapWindow.Refresh()
 
+    def SetSimplification(self, tolerance=None, units=None, budget=None):
+        """Sets simplification of lines and areas while they are digitized.
+        Vertices never move by more than half a cell.
+
+        :param tolerance: maximum distance of removed vertices (0 to disable)
+        :param units: units of tolerance, 'pixels' or 'cells'
+        :param budget: maximum number of vertices of feature (0 for unlimited),
+                       tolerance is increased up to half a cell to keep it
+        """
+        if tolerance is not None:
+            self._simplifyTolerance = tolerance
+        if units is not None:
+            self._simplifyUnits = units
+        if budget is not None:
+            self._vertexBudget = budget
+
+    def _createSimplifier(self):
+        """Returns StreamSimplifier for new feature or None"""
+        if self._graphicsType not in ('area', 'line') or \
+                not (self._simplifyTolerance or self._vertexBudget):
+            return None
+        if self._simplifyUnits == 'cells':
+            tolerance = self._simplifyTolerance * min(self._region.ewres, self._region.nsres)
+        else:
+            tolerance = self._simplifyTolerance * self._mapWindow.Map.region['ewres']
+        halfCell = min(self._region.ewres, self._region.nsres) / 2.
+        return StreamSimplifier(tolerance, maxTolerance=halfCell,
+                                budget=self._vertexBudget or None)
+
+    def _addVertex(self, fid, x, y):
+        """Adds vertex to the digitized feature through simplifier"""
+        change = self._simplifier.Add(x, y) if self._simplifier else 'append'
+        if change == 'append':
+            self._store.AppendVertex(fid, x, y)
+        elif change == 'move':
+            self._store.SetLastVertex(fid, x, y)
+        else:
+            self._store.SetCoords(fid, self._simplifier.GetVertices())
+
     def _finish(self, x, y):
         if self._running:
             return
 
-        if self._graphicsType == 'point':
-            item = self._points.GetItem(-1)
-        elif self._graphicsType == 'area':
-            item = self._areas.GetItem(-1)
-        elif self._graphicsType == 'line':
-            item = self._lines.GetItem(-1)
+        if self._graphicsType == 'lasso':
+            self._finishLasso()
+            return
+        if not self._drawing:
+            return
+        fid = self._store.GetLast()
+        item = self._items[fid]
 
         self._drawing = False
+        self._simplifier = None
         item.SetPropertyVal('brushName', 'done')
-        item.AddProperty('cellValue')
-        item.AddProperty('widthValue')
-        item.SetPropertyVal('cellValue', self._currentCellValue)
-        item.SetPropertyVal('widthValue', self._currentWidthValue)
+        self._engine.FinishFeature(fid, self._currentCellValue, self._currentWidthValue)
+        self._index.Insert(fid, self._store.GetBBox(fid))
+        self._clearRedo()
+        self._autosave.Changed()
         self.newFeatureCreated.emit()
 
         self._mapWindow.ClearLines()
+        self._previewGraphics.Draw(pdc=self._mapWindow.pdcTmp)
+        self._cells.Draw(pdc=self._mapWindow.pdcTmp)
         self._points.Draw(pdc=self._mapWindow.pdcTmp)
         self._areas.Draw(pdc=self._mapWindow.pdcTmp)
         self._lines.Draw(pdc=self._mapWindow.pdcTmp)
@@ -138,6 +294,14 @@ class RDigitController(wx.EvtHandler):
         self._mapWindow.Refresh()
 
     def SelectType(self, drawingType):
+        """Selects type of features to digitize or selection tool
+
+        :param drawingType: 'area', 'line', 'point', 'fill', 'brush',
+                            'select' (click or box), 'lasso' or None
+        """
+        self._selectStart = None
+        self._hideLasso()
+        self._cancelStroke()
         if self._graphicsType and not drawingType:
             self._mapWindow.ClearLines(pdc=self._mapWindow.pdcTmp)
             self._mapWindow.mouse['end'] = self._mapWindow.mouse['begin']
@@ -154,21 +318,449 @@ class RDigitController(wx.EvtHandler):
             self._mapWindow.pen = wx.Pen(colour='red', width=2, style=wx.SHORT_DASH)
              # change the cursor
             self._mapWindow.SetNamedCursor('pencil')
+        if drawingType:
+            # rubber band rectangle for box selection, nothing for brush
+            self._mapWindow.mouse['box'] = {'select': 'box', 'brush': None}.get(drawingType, 'line')
+            self._mapWindow.SetNamedCursor('cross' if drawingType in ('select', 'lasso', 'fill')
+                                           else 'pencil')
 
         self._graphicsType = drawingType
 
+    def _getSelectTolerance(self):
+        """Returns distance in map units for selecting by click"""
+        return 5 * self._mapWindow.Map.region['ewres']
+
+    def _addSelectionPoint(self, x, y):
+        """Selects features by click or box or adds vertex to lasso"""
+        if self._drawing:
+            return
+        if self._graphicsType == 'lasso':
+            self._lasso.append([x, y])
+            self._drawLasso()
+            self.showNotification.emit(text=_("Right click to finish selection"))
+            return
+        if self._selectStart is None:
+            return
+        x0, y0 = self._selectStart
+        self._selectStart = None
+        tolerance = self._getSelectTolerance()
+        if abs(x - x0) <= tolerance and abs(y - y0) <= tolerance:
+            fid = self._findFeature(x, y, tolerance)
+            self._setSelection([fid] if fid else [])
+        else:
+            bbox = (min(x0, x), min(y0, y), max(x0, x), max(y0, y))
+            self._setSelection([fid for fid in self._index.Query(bbox)
+                                if BBoxContains(bbox, self._index.GetBBox(fid))])
+
+    def _findFeature(self, x, y, tolerance):
+        """Returns id of the topmost feature at the point or None"""
+        found = None
+        for fid in self._index.Query((x - tolerance, y - tolerance,
+                                      x + tolerance, y + tolerance)):
+            if HitFeature(self._store.GetType(fid), self._store.GetCoords(fid),
+                          self._store.GetWidth(fid), x, y, tolerance):
+                if found is None or \
+                        self._store.GetDrawOrder(fid) > self._store.GetDrawOrder(found):
+                    found = fid
+        return found
+
+    def _finishLasso(self):
+        """Selects features with all vertices inside of lasso"""
+        polygon = self._lasso
+        self._hideLasso()
+        if len(polygon) < 3:
+            self._setSelection([])
+            return
+        xs = [x for x, y in polygon]
+        ys = [y for x, y in polygon]
+        bbox = (min(xs), min(ys), max(xs), max(ys))
+        # indexed bounding boxes include width, only vertices are tested
+        self._setSelection([fid for fid in self._index.Query(bbox)
+                            if FeatureInPolygon(self._store.GetType(fid),
+                                                self._store.GetCoords(fid), polygon)])
+
+    def _drawLasso(self):
+        item = self._selectionGraphics.GetAllItems()[0]
+        item.SetCoords(self._lasso + [self._lasso[0]])
+        item.SetPropertyVal('hide', False)
+        self._mapWindow.UpdateMap(render=False)
+
+    def _hideLasso(self):
+        if not self._lasso:
+            return
+        self._lasso = []
+        self._selectionGraphics.GetAllItems()[0].SetPropertyVal('hide', True)
+        self._mapWindow.UpdateMap(render=False)
+
+    def _setSelection(self, fids):
+        """Replaces selected features and highlights them"""
+        fids = set(fids)
+        for fid in self._selected - fids:
+            if fid in self._items:
+                self._items[fid].SetPropertyVal('penName', 'pen1')
+                self._items[fid].SetPropertyVal('brushName', 'done')
+        for fid in fids:
+            self._items[fid].SetPropertyVal('penName', 'selected')
+            self._items[fid].SetPropertyVal('brushName', 'selected')
+        self._selected = fids
+        self.showNotification.emit(text=_("%d features selected") % len(fids))
+        self._mapWindow.UpdateMap(render=False)
+
+    def GetSelected(self):
+        """Returns ids of selected features in drawing order"""
+        return sorted(self._selected, key=self._store.GetDrawOrder)
+
+    def ClearSelection(self):
+        self._setSelection([])
+
+    def _canEditSelection(self):
+        if self._running or self._drawing or not self._selected or self._isExporting():
+            return False
+        return True
+
+    def DeleteSelected(self):
+        """Removes selected features"""
+        if not self._canEditSelection():
+            return
+        fids = self.GetSelected()
+        for ftype in ('area', 'line', 'point', 'cells'):
+            items = [self._items[fid] for fid in fids if self._store.GetType(fid) == ftype]
+            if items:
+                self._getGraphicsSet(ftype).DeleteItems(items)
+        for fid in fids:
+            self._index.Remove(fid)
+            del self._items[fid]
+        self._engine.RemoveFeatures(fids)
+        self._selected = set()
+        self._clearRedo()
+        self._autosave.Changed(len(fids))
+        self._invalidatePreview()
+        self._mapWindow.UpdateMap(render=False)
+
+    def SetSelectedValue(self, value=None):
+        """Sets cell value of selected features
+
+        :param value: cell value, defaults to the current cell value
+        """
+        if value is None:
+            value = self._currentCellValue
+        if value is None or not self._canEditSelection():
+            return
+        self._engine.SetValue(self._selected, value)
+        self._clearRedo()
+        self._autosave.Changed(len(self._selected))
+        self._invalidatePreview()
+        self._mapWindow.UpdateMap(render=False)
+
+    def RaiseSelected(self):
+        """Moves selected features on top of the others"""
+        self._moveSelected(top=True)
+
+    def LowerSelected(self):
+        """Moves selected features below the others"""
+        self._moveSelected(top=False)
+
+    def _moveSelected(self, top):
+        if not self._canEditSelection():
+            return
+        moves = self._engine.MoveFeatures(self._selected, top)
+        for fid, position in moves:
+            graphicsSet = self._getGraphicsSet(self._store.GetType(fid))
+            graphicsSet.SetItemDrawOrder(self._items[fid],
+                                         len(graphicsSet.GetAllItems()) - 1 if top else 0)
+        self._clearRedo()
+        self._autosave.Changed(len(moves))
+        self._invalidatePreview()
+        self._mapWindow.UpdateMap(render=False)
+
+    def SetFillOptions(self, connectivity=None, tolerance=None, source=None):
+        """Sets flood fill options.
+
+        :param connectivity: 4 or 8 (including diagonal neighbors)
+        :param tolerance: maximum difference from value of clicked cell
+        :param source: 'edited' raster map (with unsaved features)
+                       or 'background' raster map
+        """
+        if connectivity is not None:
+            self._fillConnectivity = connectivity
+        if tolerance is not None:
+            self._fillTolerance = tolerance
+        if source is not None:
+            self._fillSource = source
+
+    def _fill(self, x, y):
+        """Adds feature covering cells connected to the clicked cell
+        and similar to it. Only the displayed part of the region is filled."""
+        if self._drawing or self._currentCellValue is None or self._isExporting():
+            return
+        if not haveNumpy or not CanAccessRasters():
+            GMessage(parent=self._mapWindow,
+                     message=_("Flood fill requires NumPy library and pygrass."))
+            return
+        region = self._mapWindow.Map.region
+        window = self._region.Window((region['w'], region['s'], region['e'], region['n']))
+        if window is None:
+            return
+        col, row = window.ToGrid(x, y)
+        col, row = int(math.floor(col)), int(math.floor(row))
+        if not (0 <= row < window.rows and 0 <= col < window.cols):
+            return
+
+        edited = self._engine.GetCurrentRaster()
+        if self._fillSource == 'background' and self._engine.GetBackgroundRaster():
+            name = self._engine.GetBackgroundRaster()
+        else:
+            name = edited
+        try:
+            data = ReadRasterWindow(name, window)
+        except Exception as e:
+            GError(parent=self._mapWindow,
+                   message=_("Failed to read raster map <%s>:\n%s") % (name, e))
+            return
+        if name == edited:
+            # features which are not saved yet
+            bbox = (window.west, window.south, window.east, window.north)
+            visible = set(self._index.Query(bbox))
+            rasterizer = FeatureRasterizer(window)
+            for fid in self._engine.GetUnsavedIds():
+                if fid in visible:
+                    rasterizer.AddFeature(self._store.GetType(fid), self._store.GetCoords(fid),
+                                          self._store.GetValue(fid), self._store.GetWidth(fid))
+            mask = rasterizer.GetMask()
+            data[mask] = rasterizer.GetValues()[mask]
+
+        runs = FloodFill(data, row, col, connectivity=self._fillConnectivity,
+                         tolerance=self._fillTolerance)
+        fid = self._engine.AddFeature('cells', RunsToCoords(window, runs),
+                                      self._currentCellValue, None)
+        self._addItems([fid])
+        self._clearRedo()
+        self._autosave.Changed()
+        self.newFeatureCreated.emit()
+        self.showNotification.emit(text=_("%d cells filled") %
+                                   sum(col1 - col0 + 1 for row, col0, col1 in runs))
+        self._mapWindow.UpdateMap(render=False)
+
+    def _drawCells(self, pdc, pen, brush, coords, drawid):
+        """Draws runs of filled cells as rectangles"""
+        pdc.ClearId(drawid)
+        pdc.SetId(drawid)
+        pdc.SetPen(wx.TRANSPARENT_PEN)
+        pdc.SetBrush(brush)
+        region = self._mapWindow.Map.region
+        res = max(region['ewres'], region['nsres'])
+        # half cell in pixels
+        dx = self._region.ewres / res / 2.
+        dy = self._region.nsres / res / 2.
+        bounds = None
+        for start, end in zip(coords[0::2], coords[1::2]):
+            x0, y0 = int(round(start[0] - dx)), int(round(start[1] - dy))
+            rect = wx.Rect(x0, y0, max(int(round(end[0] + dx)) - x0, 1),
+                           max(int(round(start[1] + dy)) - y0, 1))
+            pdc.DrawRectangleRect(rect)
+            bounds = rect if bounds is None else bounds.Union(rect)
+        if bounds:
+            pdc.SetIdBounds(drawid, bounds)
+
+    def SetBrushShape(self, shape):
+        """Sets brush footprint, 'circle' or 'square'"""
+        self._brushShape = shape
+
+    def _startStroke(self, x, y):
+        """Starts painting with brush, brush radius is the current width
+        as for buffers of lines and points"""
+        if self._drawing or self._currentCellValue is None or self._isExporting():
+            return
+        self._stroke = BrushStroke(self._region, self._brushShape,
+                                   self._currentWidthValue or 0)
+        self._paint(x, y)
+
+    def _paint(self, x, y):
+        """Paints brush at the position, only newly painted cells are drawn
+        and only the rectangle covering them is refreshed"""
+        if self._stroke is None:
+            return
+        spans = self._stroke.Paint(x, y)
+        if not spans:
+            return
+        pdc = self._mapWindow.pdcTmp
+        pdc.SetId(self._brushId)
+        pdc.SetPen(wx.TRANSPARENT_PEN)
+        pdc.SetBrush(wx.Brush(colour=self._drawColor, style=wx.SOLID))
+        grid = self._region
+        dirty = None
+        for row, col0, col1 in spans:
+            north = grid.north - row * grid.nsres
+            x0, y0 = self._mapWindow.Cell2Pixel((grid.west + col0 * grid.ewres, north))
+            x1, y1 = self._mapWindow.Cell2Pixel((grid.west + (col1 + 1) * grid.ewres,
+                                                 north - grid.nsres))
+            x0, y0 = int(math.floor(x0)), int(math.floor(y0))
+            rect = wx.Rect(x0, y0, max(int(math.ceil(x1)) - x0, 1),
+                           max(int(math.ceil(y1)) - y0, 1))
+            pdc.DrawRectangleRect(rect)
+            dirty = rect if dirty is None else dirty.Union(rect)
+        self._strokeBounds = dirty.Union(self._strokeBounds) if self._strokeBounds else dirty
+        pdc.SetIdBounds(self._brushId, self._strokeBounds)
+        self._mapWindow.RefreshRect(dirty, False)
+
+    def _finishStroke(self):
+        """Adds painted cells as new feature"""
+        stroke = self._stroke
+        self._cancelStroke()
+        if stroke is None or stroke.IsEmpty():
+            return
+        self._autosave.Input()
+        fid = self._engine.AddFeature('cells', RunsToCoords(self._region, stroke.GetRuns()),
+                                      self._currentCellValue, None)
+        self._addItems([fid])
+        self._clearRedo()
+        self._autosave.Changed()
+        self.newFeatureCreated.emit()
+        self._mapWindow.UpdateMap(render=False)
+
+    def _cancelStroke(self):
+        if self._stroke is None:
+            return
+        self._stroke = None
+        self._strokeBounds = None
+        self._mapWindow.pdcTmp.ClearId(self._brushId)
+        self._mapWindow.pdcTmp.RemoveId(self._brushId)
+        self._mapWindow.Refresh()
+
     def SetCellValue(self, value):
         self._currentCellValue = value
 
     def SetWidthValue(self, value):
         self._currentWidthValue = value
 
+    def SetAutosave(self, features=None, seconds=None):
+        """Sets when edits are saved automatically.
+
+        :param features: number of new features triggering save
+        :param seconds: age of the oldest unsaved edit triggering save
+        """
+        self._autosave.SetLimits(maxFeatures=features, maxSeconds=seconds)
+        if self._autosave.IsEnabled():
+            self._autosaveTimer.Start(1000)
+        else:
+            self._autosaveTimer.Stop()
+
+    def EnableAutosave(self, enable=True):
+        """Enables saving edits automatically after 50 new features
+        or 5 minutes (see SetAutosave)"""
+        if enable:
+            self.SetAutosave(features=50, seconds=300)
+        else:
+            self.SetAutosave()
+
+    def _onAutosaveTimer(self, event):
+        if not self._engine.GetEditedRaster() or self._running:
+            return
+        if self._autosave.IsDue(drawing=self._drawing, busy=self._pendingExports > 0):
+            self._runExport(ondone=self._autosaved)
+
+    def _autosaved(self):
+        self.showNotification.emit(text=_("Edits saved automatically"))
+        self._mapWindow.UpdateMap(render=True)
+
+    def _runExport(self, ondone):
+        """Saves finished features in background thread,
+        the feature being digitized is not saved.
+
+        Features are collected here, so that the store is not read
+        in the background thread while new features are digitized.
+        """
+        self._pendingExports += 1
+        self._autosave.Started()
+        end = len(self._store) - 1 if self._drawing else len(self._store)
+        prepared = self._engine.PrepareExport(end)
+
+        def done(event):
+            self._pendingExports -= 1
+            saved, error = event.ret
+            if isinstance(error, ExportCancelled):
+                self.showNotification.emit(text=_("Saving cancelled"))
+            elif error is not None:
+                GError(parent=self._mapWindow, message=str(error))
+            elif saved:
+                self._redoStack = []
+            ondone()
+        self._thread.Run(callable=self._exportRaster, prepared=prepared, ondone=done)
+
+    def SetUndoBudget(self, budget):
+        """Sets maximum number of bytes used for undoing saves"""
+        self._engine.SetUndoBudget(budget)
+
+    def SetWorkers(self, workers):
+        """Sets maximum number of batches rasterized in parallel"""
+        self._engine.SetWorkers(workers)
+
     def ChangeDrawColor(self, color):
         self._drawColor = color[:3] + (self._drawTransparency,)
-        for each in (self._areas, self._lines, self._points):
+        for each in self._getGraphicsSets():
             each.GetPen('pen1').SetColour(self._drawColor)
             each.GetBrush('done').SetColour(self._drawColor)
+        self._previewImage = None
+        self._mapWindow.UpdateMap(render=False)
+
+    def ShowPreview(self, show):
+        """Shows or hides features rasterized at display resolution"""
+        if show and not haveNumpy:
+            GMessage(parent=self._mapWindow,
+                     message=_("Preview requires NumPy library."))
+            return False
+        if show:
+            self._preview = FeaturePreview()
+            self._previewRegion = RasterGrid.FromRegion(gcore.region())
+        else:
+            self._preview = None
+        self._previewImage = None
         self._mapWindow.UpdateMap(render=False)
+        return True
+
+    def _invalidatePreview(self):
+        """Features have to be rasterized again for preview"""
+        if self._preview:
+            self._preview.Invalidate()
+
+    def _updatePreview(self, item, itemOrderNum):
+        """Rasterizes new features for the displayed extent,
+        called before the preview is drawn."""
+        item.SetPropertyVal('hide', True)
+        if not self._preview:
+            return
+        mapObj = self._mapWindow.Map
+        region = mapObj.region
+        grid = FeaturePreview.GetDisplayGrid(self._previewRegion,
+                                             (region['w'], region['s'], region['e'], region['n']),
+                                             width=mapObj.width, height=mapObj.height)
+        if grid is None:
+            return
+        self._preview.SetGrid(grid)
+        end = len(self._store) - 1 if self._drawing else len(self._store)
+        if self._preview.Update(self._store, end=end) or self._previewImage is None:
+            color = self._drawColor
+            if isinstance(color, wx.Colour):
+                color = color.Get()
+            rgb, alpha = self._preview.GetImageData(color, alpha=150)
+            self._previewImage = wx.ImageFromBuffer(grid.cols, grid.rows,
+                                                    rgb.tobytes(), alpha.tobytes())
+        item.SetCoords([[grid.west, grid.north], [grid.east, grid.south]])
+        item.SetPropertyVal('hide', False)
+
+    def _drawPreview(self, pdc, pen, brush, drawid, point1, point2):
+        """Draws preview image scaled to its extent"""
+        pdc.ClearId(drawid)
+        pdc.SetId(drawid)
+        x, y = int(round(point1[0])), int(round(point1[1]))
+        width = int(round(point2[0])) - x
+        height = int(round(point2[1])) - y
+        if width <= 0 or height <= 0:
+            return
+        # cells stay sharp
+        image = self._previewImage.Scale(width, height, wx.IMAGE_QUALITY_NORMAL)
+        pdc.DrawBitmap(wx.BitmapFromImage(image), x, y, True)
+        pdc.SetIdBounds(drawid, wx.Rect(x, y, width, height))
 
     def Start(self):
         """register graphics to map window,
@@ -186,6 +778,19 @@ class RDigitController(wx.EvtHandler):
         self._mapWindow.pen = wx.Pen(colour='red', width=2, style=wx.SHORT_DASH)
 
         color = self._drawColor[:3] + (self._drawTransparency,)
+        # registered first to be drawn below features
+        self._previewGraphics = self._mapWindow.RegisterGraphicsToDraw(graphicsType='rectangle',
+                                                                       setStatusFunc=self._updatePreview,
+                                                                       drawFunc=self._drawPreview,
+                                                                       mapCoords=True)
+        self._previewGraphics.AddItem(coords=[[0, 0], [0, 0]], hide=True)
+
+        self._cells = self._mapWindow.RegisterGraphicsToDraw(graphicsType='polygon',
+                                                             drawFunc=self._drawCells,
+                                                             mapCoords=True)
+        self._cells.AddPen('pen1', wx.Pen(colour=color, width=2, style=wx.SOLID))
+        self._cells.AddBrush('done', wx.Brush(colour=color, style=wx.SOLID))
+
         self._areas = self._mapWindow.RegisterGraphicsToDraw(graphicsType='polygon',
                                                              mapCoords=True)
         self._areas.AddPen('pen1', wx.Pen(colour=color, width=2, style=wx.SOLID))
@@ -201,6 +806,23 @@ class RDigitController(wx.EvtHandler):
         self._points.AddPen('pen1', wx.Pen(colour=color, width=2, style=wx.SOLID))
         self._points.AddBrush('done', wx.Brush(colour=color, style=wx.SOLID))
 
+        highlight = wx.Colour(255, 255, 0, self._drawTransparency)
+        for each in self._getGraphicsSets():
+            each.AddPen('selected', wx.Pen(colour=highlight, width=3, style=wx.SOLID))
+            each.AddBrush('selected', wx.Brush(colour=highlight, style=wx.SOLID))
+
+        self._selectionGraphics = self._mapWindow.RegisterGraphicsToDraw(graphicsType='line',
+                                                                         mapCoords=True)
+        self._selectionGraphics.AddPen('lasso', wx.Pen(colour='red', width=2,
+                                                       style=wx.SHORT_DASH))
+        self._selectionGraphics.AddItem(coords=[], penName='lasso', hide=True)
+
+        region = gcore.region()
+        self._region = RasterGrid.FromRegion(region)
+        # about 256 x 256 cells of index in the region
+        self._index = FeatureIndex(cellSize=max(region['n'] - region['s'],
+                                                region['e'] - region['w']) / 256.)
+
         # change the cursor
         self._mapWindow.SetNamedCursor('pencil')
 
@@ -209,33 +831,155 @@ class RDigitController(wx.EvtHandler):
                                _("Save raster map edits"), wx.YES_NO)
         if dlg.ShowModal() == wx.ID_YES:
             self._running = True
-            self._thread.Run(callable=self._exportRaster,
-                             ondone=lambda event: self._updateAndQuit())
+            self._runExport(ondone=self._updateAndQuit)
         else:
             self.quitDigitizer.emit()
 
     def Save(self):
-        self._thread.Run(callable=self._exportRaster,
-                         ondone=lambda event: self._update())
+        if self._isExporting():
+            return
+        self._runExport(ondone=self._update)
+
+    def _isExporting(self):
+        """Checks if features are being saved, features can't be
+        removed or reordered meanwhile."""
+        if self._pendingExports:
+            self.showNotification.emit(text=_("Saving raster map, please wait"))
+            return True
+        return False
 
     def Undo(self):
-        if len(self._all):
-            removed = self._all.pop(-1)
-            # try to remove from each, it fails quietly when theitem is not there
-            self._areas.DeleteItem(removed)
-            self._lines.DeleteItem(removed)
-            self._points.DeleteItem(removed)
+        if self._running or self._isExporting():
+            return
+        if not self._drawing and self._engine.CanUndoSave():
+            # rewrite cells changed by the last save
+            self._running = True
+            self._thread.Run(callable=self._undoSave, ondone=self._undoSaveDone)
+            return
+        if len(self._store):
+            removed = self._store.GetLast()
+            if not self._drawing:
+                self._redoStack.append(('feature', (self._store.GetType(removed),
+                                                    self._store.GetCoords(removed),
+                                                    self._store.GetValue(removed),
+                                                    self._store.GetWidth(removed))))
+            self._index.Remove(removed)
+            self._selected.discard(removed)
+            self._getGraphicsSet(self._store.GetType(removed)).DeleteItem(self._items.pop(removed))
+            if self._engine.RemoveLast(finished=not self._drawing):
+                # removed feature is already in the edited raster
+                self._autosave.Changed()
             self._drawing = False
+            self._invalidatePreview()
             self._mapWindow.UpdateMap(render=False)
 
+    def Redo(self):
+        if self._running or self._drawing or not self._redoStack or self._isExporting():
+            return
+        action, record = self._redoStack.pop()
+        if action == 'save':
+            self._running = True
+            self._thread.Run(callable=self._redoSave,
+                             ondone=lambda event: self._update())
+            return
+        ftype, coords, value, width = record
+        fid = self._engine.AddFeature(ftype, coords, value, width)
+        self._addItems([fid])
+        self._autosave.Changed()
+        self._mapWindow.UpdateMap(render=False)
+
+    def ImportFeatures(self, columns):
+        """Appends many features at once, display is updated
+        only when all of them were added.
+
+        :param columns: FeatureColumns (see importer.LoadFeatures)
+
+        :return: number of added features
+        """
+        if self._running or self._drawing or not len(columns) or self._isExporting():
+            return 0
+        fids = self._engine.AddFeatures(columns)
+        self._addItems(fids)
+        self._clearRedo()
+        self._autosave.Changed(len(fids))
+        self._invalidatePreview()
+        self._mapWindow.UpdateMap(render=False)
+        return len(fids)
+
+    def _addItems(self, fids):
+        """Adds graphics of finished features"""
+        for fid in fids:
+            item = FeatureGraphicsItem(self._store, fid, penName='pen1')
+            item.SetPropertyVal('brushName', 'done')
+            self._getGraphicsSet(self._store.GetType(fid)).AppendItem(item)
+            self._items[fid] = item
+            self._index.Insert(fid, self._store.GetBBox(fid))
+
+    def LoadFeatures(self, source, valueColumn=None, widthColumn=None):
+        """Imports features from vector map or GeoJSON or WKT file.
+
+        Features are read in background thread. Features get the current
+        cell value and width unless they are read from attributes.
+
+        :param source: name of vector map or path to file
+        :param valueColumn: attribute with cell value
+        :param widthColumn: attribute with width
+        """
+        if not self._engine.GetEditedRaster():
+            GMessage(parent=self._mapWindow, message=_("Please select first the raster map"))
+            return
+        if self._running or self._drawing or self._isExporting():
+            return
+
+        def read():
+            try:
+                features = ReadFile(source) if os.path.isfile(source) else ReadVector(source)
+                return LoadFeatures(features, value=self._currentCellValue,
+                                    width=self._currentWidthValue,
+                                    valueColumn=valueColumn, widthColumn=widthColumn), None
+            except (IOError, OSError, ValueError, KeyError, TypeError, IndexError,
+                    ScriptError, CalledModuleError) as e:
+                return None, e
+
+        def done(event):
+            self._running = False
+            columns, error = event.ret
+            if error is not None:
+                GError(parent=self._mapWindow,
+                       message=_("Failed to import features from <%s>:\n%s") % (source, error))
+                return
+            count = self.ImportFeatures(columns)
+            self.showNotification.emit(text=_("%d features imported") % count)
+
+        self.showNotification.emit(text=_("Importing features..."))
+        self._running = True
+        self._thread.Run(callable=read, ondone=done)
+
+    def _undoSave(self):
+        """Writes back cells of edited raster map before the last save,
+        runs in background thread"""
+        self._engine.UndoSave(progress=self._getRowProgress())
+
+    def _undoSaveDone(self, event):
+        self._redoStack.append(('save', None))
+        self._update()
+
+    def _redoSave(self):
+        """Writes again cells of edited raster map changed by undone save"""
+        self._engine.RedoSave(progress=self._getRowProgress())
+
+    def _clearRedo(self):
+        self._redoStack = []
+        self._engine.ClearRedo()
+
     def CleanUp(self, restore=True):
         """
         :param restore: if restore previous cursor, mouse['use']
         """
-        try:
-            gcore.run_command('g.remove', type='rast', flags='f', name=self._backupRasterName, quiet=True)
-        except CalledModuleError:
-            pass
+        self._autosaveTimer.Stop()
+        self._cancelStroke()
+        self._engine.CleanUp()
+        self._redoStack = []
 
         self._mapWindow.ClearLines(pdc=self._mapWindow.pdcTmp)
         self._mapWindow.mouse['end'] = self._mapWindow.mouse['begin']
@@ -243,9 +987,12 @@ class RDigitController(wx.EvtHandler):
         if self._graphicsType:
             self._disconnectAll()
         # unregister
+        self._mapWindow.UnregisterGraphicsToDraw(self._previewGraphics)
+        self._mapWindow.UnregisterGraphicsToDraw(self._selectionGraphics)
         self._mapWindow.UnregisterGraphicsToDraw(self._areas)
         self._mapWindow.UnregisterGraphicsToDraw(self._lines)
         self._mapWindow.UnregisterGraphicsToDraw(self._points)
+        self._mapWindow.UnregisterGraphicsToDraw(self._cells)
         #self._registeredGraphics = None
         self._mapWindow.UpdateMap(render=False)
 
@@ -257,19 +1004,28 @@ class RDigitController(wx.EvtHandler):
     def _updateAndQuit(self):
         self._running = False
         self._mapWindow.UpdateMap(render=True)
+        if self._engine.HasJob():
+            # saving was cancelled or failed, keep digitizing
+            return
         self.quitDigitizer.emit()
 
     def _update(self):
         self._running = False
         self._mapWindow.UpdateMap(render=True)
 
+    def _showWarning(self, message):
+        wx.CallAfter(GError, parent=self._mapWindow, message=message)
+
     def SelectOldMap(self, name):
+        state = self._readJournal(name)
         try:
-            self._backupRaster(name)
-        except ScriptError:
-            GError(parent=self._mapWindow, message=_("Failed to create backup copy of edited raster map."))
+            self._engine.SelectMap(name, state)
+        except ScriptError as e:
+            GError(parent=self._mapWindow, message=str(e))
             return False
-        self._editedRaster = name
+        self._redoStack = []
+        if state:
+            self._resumeSession()
         return True
 
     def SelectNewMap(self):
@@ -279,8 +1035,8 @@ class RDigitController(wx.EvtHandler):
                 self._createNewMap(mapName=dlg.GetMapName(),
                                    backgroundMap=dlg.GetBackgroundMapName(),
                                    mapType=dlg.GetMapType())
-            except ScriptError:
-                GError(parent=self._mapWindow, message=_("Failed to create new raster map."))
+            except ScriptError as e:
+                GError(parent=self._mapWindow, message=str(e))
                 return False
             finally:
                 dlg.Destroy()
@@ -290,131 +1046,119 @@ class RDigitController(wx.EvtHandler):
             return False
 
     def _createNewMap(self, mapName, backgroundMap, mapType):
-        name = mapName.split('@')[0]
-        background = backgroundMap.split('@')[0]
-        types = {'CELL': 'int', 'FCELL': 'float', 'DCELL': 'double'}
-        if background:
-            back = background
-        else:
-            back = 'null()'
-        try:
-            grast.mapcalc(exp="{name} = {mtype}({back})".format(name=name, mtype=types[mapType],
-                                                                back=back),
-                          overwrite=True, quiet=True)
-            if background:
-                self._backgroundRaster = backgroundMap
-                if mapType == 'CELL':
-                    values = gcore.read_command('r.describe', flags='1n',
-                                                map=backgroundMap, quiet=True).strip()
-                    if values:
-                        self.uploadMapCategories.emit(values=values.split('\n'))
-        except CalledModuleError:
-            raise ScriptError
-        self._backupRaster(name)
-
-        name = name + '@' + gcore.gisenv()['MAPSET']
-        self._editedRaster = name
+        """Creates new raster map (see DigitizerEngine.CreateMap)"""
+        name = self._engine.CreateMap(mapName, backgroundMap, mapType)
+        self._redoStack = []
+        if backgroundMap and mapType == 'CELL':
+            values = RasterMetadata.GetCategories(backgroundMap)
+            if values:
+                self.uploadMapCategories.emit(values=values)
         self.newRasterCreated.emit(name=name)
 
-    def _backupRaster(self, name):
-        name = name.split('@')[0]
-        backup = name + '_backupcopy_' + str(os.getpid())
-        try:
-            gcore.run_command('g.copy', rast=[name, backup], quiet=True)
-        except CalledModuleError:
-            raise ScriptError
-
-        self._backupRasterName = backup
-
-    def _exportRaster(self):
-        if not self._editedRaster:
-            return
-
-        if len(self._all) < 1:
-            return
-        tempRaster = 'tmp_rdigit_rast_' + str(os.getpid())
-        text = []
-        rastersToPatch = []
-        i = 0
-        lastCellValue = lastWidthValue = None
-        evt = updateProgress(range=len(self._all), value=0, text=_("Rasterizing..."))
-        wx.PostEvent(self, evt)
-        lastCellValue = self._all[0].GetPropertyVal('cellValue')
-        lastWidthValue = self._all[0].GetPropertyVal('widthValue')
-        for item in self._all:
-            if item.GetPropertyVal('widthValue') and \
-                (lastCellValue != item.GetPropertyVal('cellValue') or
-                lastWidthValue != item.GetPropertyVal('widthValue')):
-                if text:
-                    out = self._rasterize(text, lastWidthValue, tempRaster)
-                    rastersToPatch.append(out)
-                    text = []
-                self._writeItem(item, text)
-                out = self._rasterize(text, item.GetPropertyVal('widthValue'),
-                                      tempRaster)
-                rastersToPatch.append(out)
-                text = []
+    def AddTargetMap(self):
+        """Asks for raster map where features are saved together with
+        the edited raster map (see DigitizerEngine.AddTarget)"""
+        if self._running or self._isExporting():
+            return
+        if not self._engine.GetEditedRaster():
+            GMessage(parent=self._mapWindow, message=_("Please select first the raster map"))
+            return
+        dlg = TargetRasterDialog(parent=self._mapWindow)
+        if dlg.ShowModal() == wx.ID_OK:
+            try:
+                name = self._engine.AddTarget(dlg.GetMapName(), rules=dlg.GetRules(),
+                                              mapType=dlg.GetMapType())
+            except ScriptError as e:
+                GError(parent=self._mapWindow, message=str(e))
             else:
-                self._writeItem(item, text)
-            lastCellValue = item.GetPropertyVal('cellValue')
-            lastWidthValue = item.GetPropertyVal('widthValue')
+                # saves before can't be undone or redone for the new map
+                self._clearRedo()
+                if dlg.GetMapType():
+                    self.targetRasterCreated.emit(name=name)
+                self.showNotification.emit(text=_("Features will be saved also to <%s>") % name)
+        dlg.Destroy()
 
-            i += 1
-            evt = updateProgress(range=len(self._all), value=i, text=_("Rasterizing..."))
-            wx.PostEvent(self, evt)
-        if text:
-            out = self._rasterize(text, item.GetPropertyVal('widthValue'),
-                                  tempRaster)
-            rastersToPatch.append(out)
-
-        gcore.run_command('r.patch', input=sorted(rastersToPatch, reverse=True) + [self._backupRasterName],
-                          output=self._editedRaster, overwrite=True, quiet=True)
-        gcore.run_command('g.remove', type='rast', flags='f', name=rastersToPatch + [tempRaster],
-                          quiet=True)
+    def RemoveTargetMap(self, name):
+        """Stops saving features to the target raster map"""
+        if self._running or self._isExporting():
+            return
+        self._engine.RemoveTarget(name)
+
+    def GetTargetMaps(self):
+        """Returns names of raster maps where features are saved
+        together with the edited raster map"""
+        return [name for name, rules in self._engine.GetTargets()]
+
+    def _readJournal(self, name):
+        """Reads journal of interrupted session of the raster map
+        if the user wants to recover it.
+
+        :return: JournalState or None
+        """
+        journal = self._engine.FindJournal(name)
+        if journal is None:
+            return None
+        dlg = wx.MessageDialog(self._mapWindow,
+                               _("Unsaved edits of raster map <%s> from an interrupted "
+                                 "session were found. Do you want to recover them?") % name,
+                               _("Recover raster map edits"), wx.YES_NO)
+        recover = dlg.ShowModal() == wx.ID_YES
+        dlg.Destroy()
+        if not recover:
+            return None
+        state = journal.Read()
+        if state is None:
+            GError(parent=self._mapWindow, message=_("Failed to read journal of edits."))
+        return state
+
+    def _resumeSession(self):
+        """Replaces graphics of features by graphics of resumed features"""
+        for each in self._getGraphicsSets():
+            each.DeleteItems(each.GetAllItems())
+        self._items = {}
+        self._index.Clear()
+        self._selected = set()
+        self._drawing = False
+        self._addItems(self._store.GetIds())
+        self._invalidatePreview()
+        self._mapWindow.UpdateMap(render=False)
+
+    def _exportRaster(self, prepared):
+        """Saves features to edited raster map, runs in background thread,
+        the result is shown in _runExport.
+
+        :param prepared: features to save (see DigitizerEngine.PrepareExport)
+
+        :return: tuple (saved, error), error is ExportCancelled or ScriptError
+        """
+        if prepared is None:
+            return False, None
         try:
-            if not self._backgroundRaster:
-                table = UserSettings.Get(group='rasterLayer', key='colorTable', subkey='selection')
-                gcore.run_command('r.colors', color=table, map=self._editedRaster, quiet=True)
-            else:
-                gcore.run_command('r.colors', map=self._editedRaster,
-                                  raster=self._backgroundRaster, quiet=True)
-        except CalledModuleError:
-            GError(parent=self._mapWindow,
-                   message=_("Failed to set default color table for edited raster map"))
-
-    def _writeFeature(self, item, vtype, text):
-        coords = item.GetCoords()
-        if vtype == 'P':
-            coords = [coords]
-        cellValue = item.GetPropertyVal('cellValue')
-        record = '{vtype}\n'.format(vtype=vtype)
-        for coord in coords:
-            record += ' '.join([str(c) for c in coord])
-            record += '\n'
-        record += '= {cellValue}\n'.format(cellValue=cellValue)
-
-        text.append(record)
-
-    def _writeItem(self, item, text):
-        if item in self._areas.GetAllItems():
-            self._writeFeature(item, vtype='A', text=text)
-        elif item in self._lines.GetAllItems():
-            self._writeFeature(item, vtype='L', text=text)
-        elif item in self._points.GetAllItems():
-            self._writeFeature(item, vtype='P', text=text)
-
-    def _rasterize(self, text, bufferDist, tempRaster):
-        output = 'x' + str(uuid.uuid4())[:8]
-        asciiFile = tempfile.NamedTemporaryFile(delete=False)
-        asciiFile.write('\n'.join(text))
-        asciiFile.close()
-        if bufferDist:
-            gcore.run_command('r.in.poly', input=asciiFile.name, output=tempRaster,
-                              overwrite=True, quiet=True)
-            gcore.run_command('r.grow', input=tempRaster, output=output,
-                              flags='m', radius=bufferDist, quiet=True)
-        else:
-            gcore.run_command('r.in.poly', input=asciiFile.name, output=output,
-                              quiet=True)
-        os.unlink(asciiFile.name)
-        return output
+            return self._engine.Export(prepared=prepared,
+                                       progress=self._getExportProgress()), None
+        except (ExportCancelled, ScriptError) as e:
+            return False, e
+
+    def CancelExport(self):
+        """Cancels running save, rasterized parts are kept for next save"""
+        if self._pendingExports:
+            self._engine.CancelExport()
+
+    def _getExportProgress(self):
+        """Returns function reporting progress of export"""
+        def progress(cells, total, text):
+            evt = updateProgress(range=1000, value=int(1000 * cells / max(total, 1)),
+                                 text=text)
+            wx.PostEvent(self, evt)
+        return progress
+
+    def _getRowProgress(self):
+        """Returns function reporting progress of writing rows"""
+        rows = int(gcore.region()['rows'])
+        step = max(1, rows // 100)
+
+        def progress(row):
+            if row % step == 0 or row == rows:
+                evt = updateProgress(range=rows, value=row, text=_("Writing raster map..."))
+                wx.PostEvent(self, evt)
+        return progress
@@ -4,7 +4,9 @@
 @brief rdigit dialogs.
 
 Classes:
- - dialogs
+ - dialogs::NewRasterDialog
+ - dialogs::TargetRasterDialog
+ - dialogs::VectorImportDialog
 
 (C) 2014 by the GRASS Development Team
 This program is free software under the GNU General Public
@@ -19,10 +21,29 @@ import wx
 from core.utils import _
 from gui_core.gselect import Select
 from core.gcmd import GWarning
+from core.gthread import gThread
+from core.rastercache import RasterMetadata
+from rdigit.targets import ValueMapping
 
 import grass.script.core as gcore
-import grass.script.raster as grast
-from grass.exceptions import CalledModuleError
+
+
+def ConfirmOverwrite(parent, mapName):
+    """Asks user if raster map in the current mapset can be overwritten
+
+    :return: True if the map does not exist or can be overwritten
+    """
+    found = gcore.find_file(name=mapName, mapset=gcore.gisenv()['MAPSET'])
+    if not found or found['mapset'] != gcore.gisenv()['MAPSET']:
+        return True
+    dlgOverwrite = wx.MessageDialog(
+        parent, message=_("Raster map <%s> already exists "
+                          "in the current mapset. "
+                          "Do you want to overwrite it?") % mapName,
+        caption=_("Overwrite?"), style=wx.YES_NO | wx.YES_DEFAULT | wx.ICON_QUESTION)
+    overwrite = dlgOverwrite.ShowModal() == wx.ID_YES
+    dlgOverwrite.Destroy()
+    return overwrite
 
 
 class NewRasterDialog(wx.Dialog):
@@ -31,6 +52,9 @@ class NewRasterDialog(wx.Dialog):
         self.SetTitle(_("Create new raster map"))
         self._name = None
         self._type = None
+        # delayed lookup of background map metadata
+        self._lookup = None
+        self._thread = gThread()
 
         # create widgets
         self._mapSelect = Select(parent=self, type='rast')
@@ -72,33 +96,32 @@ class NewRasterDialog(wx.Dialog):
         mainSizer.Fit(self)
 
     def OnBackgroundMap(self, event):
+        """Looks up type of background map when user stops typing"""
+        if self._lookup:
+            self._lookup.Stop()
+        self._lookup = wx.CallLater(300, self._lookupBackgroundMap)
+
+    def _lookupBackgroundMap(self):
         value = self._backgroundSelect.GetValue()
-        try:
-            ret = grast.raster_info(value)
-            self._typeChoice.SetStringSelection(ret['datatype'])
-        except CalledModuleError:
+        if not value:
             return
+        self._thread.Run(callable=RasterMetadata.GetInfo, name=value,
+                         ondone=self._onBackgroundMapInfo)
+
+    def _onBackgroundMapInfo(self, event):
+        # ignore results for closed dialog or outdated text
+        if not self or not event.ret or event.kwds['name'] != self._backgroundSelect.GetValue():
+            return
+        self._typeChoice.SetStringSelection(event.ret['datatype'])
 
     def OnOK(self, event):
+        if self._lookup:
+            self._lookup.Stop()
         mapName = self.GetMapName()
         if not mapName:
             GWarning(parent=self.GetParent(), message=_("Please specify name for a new raster map"))
-        else:
-            found = gcore.find_file(name=mapName, mapset=gcore.gisenv()['MAPSET'])
-            if found and found['mapset'] == gcore.gisenv()['MAPSET']:
-                dlgOverwrite = wx.MessageDialog(
-                    self.GetParent(), message=_("Raster map <%s> already exists "
-                                                "in the current mapset. "
-                                                "Do you want to overwrite it?") % mapName,
-                    caption=_("Overwrite?"), style=wx.YES_NO | wx.YES_DEFAULT | wx.ICON_QUESTION)
-                if not dlgOverwrite.ShowModal() == wx.ID_YES:
-                    dlgOverwrite.Destroy()
-                    return
-                else:
-                    dlgOverwrite.Destroy()
-                    self.EndModal(wx.ID_OK)
-            else:
-                self.EndModal(wx.ID_OK)
+        elif ConfirmOverwrite(self.GetParent(), mapName):
+            self.EndModal(wx.ID_OK)
 
     def GetMapName(self):
         return self._mapSelect.GetValue()
@@ -110,6 +133,125 @@ class NewRasterDialog(wx.Dialog):
         return self._typeChoice.GetStringSelection()
 
 
+class TargetRasterDialog(wx.Dialog):
+    """Selects raster map saved together with the edited raster map
+    and values of features in it"""
+    def __init__(self, parent):
+        wx.Dialog.__init__(self, parent)
+        self.SetTitle(_("Save features also to raster map"))
+
+        # create widgets
+        self._mapSelect = Select(parent=self, type='rast')
+        self._newCheck = wx.CheckBox(self, label=_("Create new raster map of type:"))
+        self._typeChoice = wx.Choice(self, choices=['CELL', 'FCELL', 'DCELL'])
+        self._typeChoice.SetSelection(0)
+        self._typeChoice.Enable(False)
+        self._newCheck.Bind(wx.EVT_CHECKBOX,
+                            lambda evt: self._typeChoice.Enable(self._newCheck.IsChecked()))
+        self._rules = wx.TextCtrl(self, value='* = 1', size=(300, 100), style=wx.TE_MULTILINE)
+        self._mapSelect.SetFocus()
+
+        btnCancel = wx.Button(parent=self, id=wx.ID_CANCEL)
+        btnOK = wx.Button(parent=self, id=wx.ID_OK)
+        btnOK.SetDefault()
+        btnOK.Bind(wx.EVT_BUTTON, self.OnOK)
+
+        # do layout
+        mainSizer = wx.BoxSizer(wx.VERTICAL)
+        sizer = wx.GridBagSizer(hgap=10, vgap=10)
+        sizer.Add(wx.StaticText(self, label=_("Raster map in the current mapset:")),
+                  pos=(0, 0), span=(1, 2), flag=wx.ALIGN_CENTER_VERTICAL)
+        sizer.Add(self._mapSelect, pos=(1, 0), span=(1, 2))
+        sizer.Add(self._newCheck, pos=(2, 0), flag=wx.ALIGN_CENTER_VERTICAL)
+        sizer.Add(self._typeChoice, pos=(2, 1), flag=wx.EXPAND)
+        sizer.Add(wx.StaticText(self, label=_("Cell values of features (rules as in r.reclass, "
+                                              "e.g. '1 2 = 1', '* = NULL'),\n"
+                                              "no rules for the same values as in edited map:")),
+                  pos=(3, 0), span=(1, 2), flag=wx.ALIGN_CENTER_VERTICAL)
+        sizer.Add(self._rules, pos=(4, 0), span=(1, 2), flag=wx.EXPAND)
+
+        mainSizer.Add(sizer, proportion=1, flag=wx.EXPAND | wx.ALL, border=10)
+
+        btnSizer = wx.StdDialogButtonSizer()
+        btnSizer.AddButton(btnCancel)
+        btnSizer.AddButton(btnOK)
+        btnSizer.Realize()
+
+        mainSizer.Add(btnSizer, flag=wx.EXPAND | wx.ALL, border=10)
+
+        self.SetSizer(mainSizer)
+        mainSizer.Fit(self)
+
+    def OnOK(self, event):
+        mapName = self.GetMapName()
+        if not mapName:
+            GWarning(parent=self.GetParent(), message=_("Please specify name of raster map"))
+            return
+        try:
+            ValueMapping(self.GetRules())
+        except ValueError as e:
+            GWarning(parent=self.GetParent(), message=str(e))
+            return
+        if not self.GetMapType() or ConfirmOverwrite(self.GetParent(), mapName):
+            self.EndModal(wx.ID_OK)
+
+    def GetMapName(self):
+        return self._mapSelect.GetValue()
+
+    def GetMapType(self):
+        """Returns type of new raster map or None for existing map"""
+        if self._newCheck.IsChecked():
+            return self._typeChoice.GetStringSelection()
+        return None
+
+    def GetRules(self):
+        return self._rules.GetValue()
+
+
+class VectorImportDialog(wx.Dialog):
+    """Selects vector map with features to import"""
+    def __init__(self, parent):
+        wx.Dialog.__init__(self, parent)
+        self.SetTitle(_("Import features from vector map"))
+
+        # create widgets
+        self._mapSelect = Select(parent=self, type='vector')
+        self._mapSelect.SetFocus()
+
+        btnCancel = wx.Button(parent=self, id=wx.ID_CANCEL)
+        btnOK = wx.Button(parent=self, id=wx.ID_OK)
+        btnOK.SetDefault()
+        btnOK.Bind(wx.EVT_BUTTON, self.OnOK)
+
+        # do layout
+        mainSizer = wx.BoxSizer(wx.VERTICAL)
+        sizer = wx.BoxSizer(wx.VERTICAL)
+        sizer.Add(wx.StaticText(self, label=_("Vector map with areas, lines or points:")),
+                  flag=wx.BOTTOM, border=10)
+        sizer.Add(self._mapSelect, flag=wx.EXPAND)
+
+        mainSizer.Add(sizer, proportion=1, flag=wx.EXPAND | wx.ALL, border=10)
+
+        btnSizer = wx.StdDialogButtonSizer()
+        btnSizer.AddButton(btnCancel)
+        btnSizer.AddButton(btnOK)
+        btnSizer.Realize()
+
+        mainSizer.Add(btnSizer, flag=wx.EXPAND | wx.ALL, border=10)
+
+        self.SetSizer(mainSizer)
+        mainSizer.Fit(self)
+
+    def OnOK(self, event):
+        if not self.GetMapName():
+            GWarning(parent=self.GetParent(), message=_("Please specify name of vector map"))
+            return
+        self.EndModal(wx.ID_OK)
+
+    def GetMapName(self):
+        return self._mapSelect.GetValue()
+
+
 if __name__ == '__main__':
     app = wx.App()
     dlg = NewRasterDialog(None)
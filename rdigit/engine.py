@@ -0,0 +1,875 @@
+"""
+@package rdigit.engine
+
+@brief Digitized features and their saving into raster map, without GUI.
+
+Classes:
+ - engine::DigitizerEngine
+
+(C) 2014 by the GRASS Development Team
+This program is free software under the GNU General Public
+License (>=v2). Read the file COPYING that comes with GRASS
+for details.
+
+@author Anna Petrasova <kratochanna gmail.com>
+"""
+
+import os
+import shutil
+from collections import OrderedDict
+from timeit import default_timer as timer
+
+from grass.script import core as gcore
+from grass.script import raster as grast
+from grass.exceptions import CalledModuleError, ScriptError
+
+from core.debug import Debug
+from core.rastercache import RasterMetadata
+from rdigit.store import FeatureStore
+from rdigit.backup import TileBackup
+from rdigit.journal import EditJournal, SavedCountAfterMove
+from rdigit.history import SaveHistory
+from rdigit.export import ExportJob, ExportTarget, ExportCancelled
+from rdigit.targets import ValueMapping, TargetRaster
+from rdigit.rasterizer import haveNumpy, RasterGrid, UnionBBox, BBoxIntersects, \
+    CanAccessRasters, TerminatePool
+
+
+class DigitizerEngine:
+    """Features in drawing order and state of the edited raster map.
+
+    Engine knows which features were already written into the edited
+    raster map, keeps backup of its original cells, journal of edits
+    and history of saves, and exports features. Features can be written
+    also into target raster maps with mapped values (see AddTarget),
+    they are saved together with the edited raster map. It does not depend
+    on wxPython, it is used by the GUI (controller::RDigitController)
+    and by the command line (rdigit.burn).
+
+    Failures are reported by ScriptError, problems which do not stop
+    saving are passed to warning function.
+    """
+    def __init__(self, workers=1, colorTable='rainbow', warning=None, method=None):
+        """
+        :param workers: maximum number of batches rasterized in parallel
+        :param colorTable: color table of new raster maps without background
+        :param warning: function called with warning message
+        :param method: 'modules' to always save by r.in.poly and r.grow,
+                       None to save in process when NumPy and pygrass
+                       are available
+        """
+        self._store = FeatureStore()
+        self._editedRaster = None
+        self._backgroundRaster = None
+        self._backupRasterName = None
+        # range of values covered by color table of edited raster map,
+        # None when the table has to be set
+        self._colorRange = None
+        self._colorTable = colorTable
+        # raster map with content of new edited raster map
+        # which was not written yet (None when it was written)
+        self._sourceRaster = None
+        # type of new edited raster map, None for existing map
+        self._mapType = None
+        # original content of edited raster map is null
+        # (new map without background), no backup is needed then
+        self._nullBackup = False
+        # TileBackup of edited raster map (when the map is written in process)
+        self._backup = None
+        # EditJournal of the session
+        self._journal = None
+        # SaveHistory for undoing saves, maximum size of stored changes
+        self._history = None
+        self._undoBudget = 512 * 1024 * 1024
+        # number of features already written to edited raster
+        self._savedCount = 0
+        # ids of saved features changed since last save
+        self._dirty = set()
+        # bounding box of removed saved features, edited raster has to be
+        # rebuilt there from backup on next save
+        self._removedBBox = None
+        # ExportJob being run or cancelled
+        self._job = None
+        # TargetRaster instances written together with edited raster map
+        self._targets = []
+        self._workers = workers
+        self._warning = warning or gcore.warning
+        self._method = method
+        # seconds spent in stages of the last save
+        self._exportTimes = OrderedDict()
+
+    def GetStore(self):
+        """Returns FeatureStore, features should be added
+        and removed through the engine."""
+        return self._store
+
+    def GetEditedRaster(self):
+        return self._editedRaster
+
+    def GetBackgroundRaster(self):
+        """Returns background raster map of new raster map or None"""
+        return self._backgroundRaster
+
+    def GetCurrentRaster(self):
+        """Returns raster map with the current content of edited raster map,
+        which differs from it when the new map was not written yet."""
+        return self._sourceRaster or self._editedRaster
+
+    def GetTargets(self):
+        """Returns list of (name, rules) of target raster maps"""
+        return [(target.name, target.mapping.GetRules()) for target in self._targets]
+
+    def GetSavedCount(self):
+        return self._savedCount
+
+    def GetExportTimes(self):
+        """Returns dictionary of seconds spent in stages of the last save,
+        prepare (collecting features), stages of ExportJob (see
+        ExportJob.GetTimes) and color (updating color tables)"""
+        return OrderedDict(self._exportTimes)
+
+    def HasJob(self):
+        """Checks if there is unfinished (cancelled or failed) save"""
+        return self._job is not None
+
+    def SetWorkers(self, workers):
+        self._workers = max(1, int(workers))
+
+    def SetColorTable(self, colorTable):
+        self._colorTable = colorTable
+
+    def SetUndoBudget(self, budget):
+        """Sets maximum number of bytes used for undoing saves
+        (of each raster map)"""
+        self._undoBudget = budget
+        for history in self._getHistories():
+            history.SetBudget(budget)
+
+    def _getSessionPath(self, name):
+        """Returns path (without extension) of journal and backup tiles
+        of edited raster map, kept in the current mapset."""
+        env = gcore.gisenv()
+        return os.path.join(env['GISDBASE'], env['LOCATION_NAME'], env['MAPSET'],
+                            '.rdigit', name.split('@')[0])
+
+    def FindJournal(self, name):
+        """Returns journal of interrupted session of the raster map or None
+
+        Journal of the current session is not returned.
+        """
+        journal = EditJournal(self._getSessionPath(name) + '.journal')
+        if not journal.Exists() or \
+                (self._journal and self._journal.GetPath() == journal.GetPath()):
+            return None
+        return journal
+
+    def SelectMap(self, name, state=None, session=True):
+        """Starts editing of existing raster map (or new raster map
+        of resumed session).
+
+        :param name: fully qualified name of raster map in the current mapset
+        :param state: JournalState of resumed session, its features
+                      replace the current ones
+        :param session: False for no backup, journal and history
+                        (features can't be removed then)
+        """
+        self._discardTargets()
+        self._discardBackup()
+        newMap = state is not None and state.mapType is not None
+        if session and not newMap:
+            self._backup, self._backupRasterName = self._backupRaster(name, state)
+        self._editedRaster = name
+        self._backgroundRaster = None
+        self._sourceRaster = None
+        self._mapType = None
+        self._nullBackup = False
+        if newMap:
+            # resumed new map, its background (or null) is the original content
+            # and the content until it is written
+            self._backupRasterName = self._backgroundRaster = state.backupRaster
+            self._nullBackup = state.nullBackup
+            self._mapType = state.mapType
+            if not state.written:
+                self._sourceRaster = state.backupRaster
+        self._colorRange = self._getMapRange(name)
+        self._resetSaveState()
+        if state:
+            self._resumeSession(state)
+        if session:
+            self._startJournal(name, resume=state is not None)
+            self._startHistory(name)
+
+    def CreateMap(self, mapName, backgroundMap, mapType, session=True):
+        """Creates new raster map without writing its cells.
+
+        Only a null map of the computational region is created, it is
+        overwritten on the first save (see Export) by the map of the given
+        type. Until then, background map is used as its content. Background
+        map serves as the backup, map without background needs no backup
+        (its original cells are null).
+
+        :param session: False for no journal and history
+
+        :return: fully qualified name of the map
+        """
+        self._discardTargets()
+        name = mapName.split('@')[0]
+        self._backgroundRaster = backgroundMap or None
+        self._colorRange = None
+        try:
+            self._createNullMap(name, mapType)
+        except CalledModuleError:
+            raise ScriptError(_("Failed to create new raster map."))
+        self._discardBackup()
+        self._backupRasterName = backgroundMap or None
+        self._nullBackup = not backgroundMap
+
+        name = name + '@' + gcore.gisenv()['MAPSET']
+        self._editedRaster = name
+        self._sourceRaster = backgroundMap or None
+        self._mapType = mapType
+        self._resetSaveState()
+        if session:
+            self._startJournal(name)
+            self._startHistory(name)
+        return name
+
+    def _createNullMap(self, name, mapType):
+        """Creates null raster map of the computational region,
+        no other raster map is read"""
+        types = {'CELL': 'int', 'FCELL': 'float', 'DCELL': 'double'}
+        grast.mapcalc(exp="{name} = {mtype}(null())".format(name=name, mtype=types[mapType]),
+                      overwrite=True, quiet=True)
+
+    def _backupRaster(self, name, state=None):
+        """Prepares backup of edited raster map.
+
+        When the map can be written in process, original tiles are saved
+        only before they are overwritten for the first time. Otherwise
+        the whole map is copied.
+
+        :param state: JournalState of resumed session, its backup is reused
+
+        :return: tuple (TileBackup, name of backup raster map), one of them is None
+        """
+        if self._writesInProcess():
+            path = self._getSessionPath(name) + '.tiles'
+            if state:
+                grid = RasterGrid(*state.region)
+            else:
+                shutil.rmtree(path, ignore_errors=True)
+                grid = RasterGrid.FromRegion(gcore.region())
+            return TileBackup(grid, path=path), None
+        if state and state.backupRaster and \
+                gcore.find_file(state.backupRaster, element='cell')['name']:
+            return None, state.backupRaster
+        name = name.split('@')[0]
+        backup = name + '_backupcopy_' + str(os.getpid())
+        try:
+            gcore.run_command('g.copy', rast=[name, backup], quiet=True)
+        except CalledModuleError:
+            raise ScriptError(_("Failed to create backup copy of edited raster map."))
+
+        return None, backup
+
+    def _removeBackup(self, backup, name):
+        """Removes TileBackup and backup raster map"""
+        if backup:
+            backup.Discard()
+        # background map of new raster map is not removed
+        if name and ('_backupcopy_' in name or name.startswith('tmp_rdigit_')):
+            try:
+                gcore.run_command('g.remove', type='rast', flags='f',
+                                  name=name, quiet=True)
+            except CalledModuleError:
+                pass
+
+    def _discardBackup(self):
+        self._removeBackup(self._backup, self._backupRasterName)
+        self._backup = None
+        self._backupRasterName = None
+
+    def _resumeSession(self, state):
+        """Replaces current features by features of journal"""
+        self._store.Clear()
+        fids = self._store.Extend(state.types, state.values, state.widths,
+                                  state.counts, state.coords, state.bboxes)
+        self._savedCount = state.savedCount
+        self._dirty = set(fids[i] for i in state.dirty)
+        for ftype, bbox, width in state.removedFeatures:
+            self._removedBBox = UnionBBox(self._removedBBox,
+                                          (bbox[0] - width, bbox[1] - width,
+                                           bbox[2] + width, bbox[3] + width))
+
+    def _startJournal(self, name, resume=False):
+        """Starts journal of edits of the raster map, current features
+        are recorded in new journal."""
+        self._discardJournal()
+        journal = EditJournal(self._getSessionPath(name) + '.journal')
+        try:
+            if resume:
+                journal.Append()
+            else:
+                grid = self._backup.GetGrid() if self._backup else \
+                    RasterGrid.FromRegion(gcore.region())
+                journal.Create(grid, backupRaster=self._backupRasterName,
+                               mapType=self._mapType, nullBackup=self._nullBackup)
+                for fid in self._store.GetIds():
+                    journal.AddFeature(self._store.GetType(fid), self._store.GetCoords(fid),
+                                       self._store.GetValue(fid), self._store.GetWidth(fid))
+        except (IOError, OSError) as e:
+            Debug.msg(1, "DigitizerEngine._startJournal(): %s" % e)
+            return
+        self._journal = journal
+
+    def _discardJournal(self):
+        if self._journal:
+            self._journal.Discard()
+            self._journal = None
+
+    def _startHistory(self, name):
+        self._discardHistory()
+        self._history = self._createHistory(name)
+
+    def _createHistory(self, name):
+        """Returns history of saves of the raster map, saves can be undone
+        only when the raster map is written in process (None otherwise)."""
+        if self._writesInProcess():
+            return SaveHistory(self._getSessionPath(name) + '.history',
+                               budget=self._undoBudget)
+        return None
+
+    def _writesInProcess(self):
+        """Checks if raster maps are written in process"""
+        return self._method != 'modules' and haveNumpy and CanAccessRasters()
+
+    def _getHistories(self):
+        """Returns histories of saves of edited raster map and targets"""
+        return [history for history in [self._history] +
+                [target.history for target in self._targets] if history]
+
+    def _discardHistory(self):
+        if self._history:
+            self._history.Discard()
+            self._history = None
+
+    def _resetSaveState(self):
+        self._savedCount = 0
+        self._dirty.clear()
+        self._removedBBox = None
+
+    def AddTarget(self, name, rules='', mapType=None, session=True):
+        """Adds raster map written together with the edited raster map.
+
+        Features are rasterized once for all raster maps, cell values
+        in the target raster map are given by rules (see targets.ValueMapping).
+        All features are written into all raster maps on the next save.
+
+        :param name: name of raster map in the current mapset
+        :param rules: rules of value mapping, empty for the same values
+        :param mapType: type of new (null) raster map, None for existing map
+        :param session: False for no backup and history
+
+        :return: fully qualified name of the map
+        """
+        if not self._editedRaster:
+            raise ScriptError(_("No raster map is edited."))
+        try:
+            mapping = ValueMapping(rules)
+        except ValueError as e:
+            raise ScriptError(str(e))
+        mapset = gcore.gisenv()['MAPSET']
+        name = name.split('@')[0]
+        fullName = name + '@' + mapset
+        if fullName in [self._editedRaster] + [target.name for target in self._targets]:
+            raise ScriptError(_("Raster map <%s> is already edited.") % fullName)
+        target = TargetRaster(fullName, mapping)
+        if mapType:
+            try:
+                self._createNullMap(name, mapType)
+            except CalledModuleError:
+                raise ScriptError(_("Failed to create new raster map."))
+            target.nullBackup = True
+        else:
+            if not gcore.find_file(name, element='cell', mapset=mapset)['name']:
+                raise ScriptError(_("Raster map <%s> not found in the current mapset.")
+                                  % fullName)
+            if session:
+                target.backup, target.backupRasterName = self._backupRaster(fullName)
+            target.colorRange = self._getMapRange(fullName)
+        if session:
+            target.history = self._createHistory(fullName)
+        self._targets.append(target)
+        # features already saved are not in the target yet
+        self._savedCount = 0
+        return fullName
+
+    def RemoveTarget(self, name):
+        """Stops writing into target raster map, the map is kept"""
+        for target in self._targets:
+            if target.name == name:
+                self._targets.remove(target)
+                self._discardTarget(target)
+                return
+
+    def _discardTarget(self, target):
+        self._removeBackup(target.backup, target.backupRasterName)
+        if target.history:
+            target.history.Discard()
+
+    def _discardTargets(self):
+        for target in self._targets:
+            self._discardTarget(target)
+        self._targets = []
+
+    def StartFeature(self, ftype):
+        """Adds empty feature being digitized, its vertices are added
+        by FeatureStore.AppendVertex or SetCoords.
+
+        :return: feature id
+        """
+        return self._store.AddFeature(ftype)
+
+    def FinishFeature(self, fid, value, width):
+        """Finishes the feature being digitized"""
+        self._store.SetValue(fid, value)
+        self._store.SetWidth(fid, width)
+        if self._journal:
+            self._journal.AddFeature(self._store.GetType(fid), self._store.GetCoords(fid),
+                                     value, width)
+
+    def AddFeature(self, ftype, coords, value, width):
+        """Adds finished feature
+
+        :return: feature id
+        """
+        fid = self._store.AddFeature(ftype, coords, value=value, width=width)
+        if self._journal:
+            self._journal.AddFeature(ftype, coords, value, width)
+        return fid
+
+    def AddFeatures(self, columns):
+        """Adds many finished features at once
+
+        :param columns: FeatureColumns (see importer.LoadFeatures)
+
+        :return: list of feature ids
+        """
+        fids = self._store.Extend(columns.types, columns.values, columns.widths,
+                                  columns.counts, columns.coords, columns.bboxes)
+        if self._journal:
+            self._journal.AddFeatures(columns)
+        return fids
+
+    def RemoveLast(self, finished=True):
+        """Removes the last feature.
+
+        :param finished: False when the feature is being digitized
+
+        :return: True if the feature was already saved
+        """
+        removed = self._store.GetLast()
+        saved = False
+        if len(self._store) <= self._savedCount:
+            # removed feature is already in the edited raster
+            self._savedCount = len(self._store) - 1
+            self._removedBBox = UnionBBox(self._removedBBox, self._store.GetBBox(removed))
+            saved = True
+        self._dirty.discard(removed)
+        if self._journal and finished:
+            # unfinished feature is not in the journal
+            self._journal.Undo()
+        self._store.Remove(removed)
+        return saved
+
+    def RemoveFeatures(self, fids):
+        """Removes finished features"""
+        fids = sorted(fids, key=self._store.GetDrawOrder)
+        positions = [self._store.GetDrawOrder(fid) for fid in fids]
+        for fid, position in zip(fids, positions):
+            if position < self._savedCount:
+                # removed feature is already in the edited raster
+                self._removedBBox = UnionBBox(self._removedBBox, self._store.GetBBox(fid))
+        self._savedCount -= len([position for position in positions
+                                 if position < self._savedCount])
+        if self._journal:
+            # positions of the following features change with each removal
+            for position in reversed(positions):
+                self._journal.Remove(position)
+        for fid in fids:
+            self._dirty.discard(fid)
+        self._store.RemoveFeatures(fids)
+
+    def SetValue(self, fids, value):
+        """Sets cell value of finished features"""
+        for fid in sorted(fids, key=self._store.GetDrawOrder):
+            position = self._store.GetDrawOrder(fid)
+            self._store.SetValue(fid, value)
+            if position < self._savedCount:
+                self._dirty.add(fid)
+            if self._journal:
+                self._journal.SetValue(position, value)
+
+    def MoveFeatures(self, fids, top):
+        """Moves finished features on top of (or below) the others,
+        their mutual order is kept.
+
+        :return: list of (feature id, new position) in order of moving
+        """
+        fids = sorted(fids, key=self._store.GetDrawOrder)
+        if not top:
+            # the lowest is moved last
+            fids.reverse()
+        moves = []
+        for fid in fids:
+            position = self._store.GetDrawOrder(fid)
+            newPosition = len(self._store) - 1 if top else 0
+            self._store.SetDrawOrder(fid, newPosition)
+            self._savedCount = SavedCountAfterMove(self._savedCount, position, newPosition)
+            if newPosition < self._savedCount:
+                self._dirty.add(fid)
+            if self._journal:
+                self._journal.SetDrawOrder(position, newPosition)
+            moves.append((fid, newPosition))
+        return moves
+
+    def _getFirstUnsaved(self):
+        """Returns position of the first feature which has to be exported"""
+        start = self._savedCount
+        for fid in self._dirty:
+            if fid in self._store:
+                start = min(start, self._store.GetDrawOrder(fid))
+        return start
+
+    def GetUnsavedIds(self):
+        """Returns ids of features (in drawing order) not written
+        to edited raster map in their current state and order"""
+        return self._store.GetIds(self._getFirstUnsaved())
+
+    def _getFeaturesToExport(self, end):
+        """Returns ids of features which have to be rasterized, raster map
+        over which the features are patched and bounding box of the change.
+
+        Only features added after the last save are exported, the edited
+        raster map is used as the base. When a saved feature was changed,
+        all features drawn after it are exported again to keep drawing order.
+        When a saved feature was removed, edited raster map is rebuilt
+        from backup within the bounding box, using all features overlapping it,
+        base is None in this case.
+
+        :param end: number of features (in drawing order) to consider
+        """
+        start = self._getFirstUnsaved()
+        bbox = self._removedBBox
+        for fid in self._store.GetIds(start, end):
+            bbox = UnionBBox(bbox, self._store.GetBBox(fid))
+        if bbox is None:
+            return [], None, None
+        if (self._removedBBox or start == 0) and self._canRebuild():
+            features = [fid for fid in self._store.GetIds(0, end)
+                        if BBoxIntersects(self._store.GetBBox(fid), bbox)]
+            return features, None, bbox
+        return self._store.GetIds(start, end), self._editedRaster, bbox
+
+    def _canRebuild(self):
+        """Checks if all written raster maps have backup"""
+        return all(backup or name or null for backup, name, null in
+                   [(self._backup, self._backupRasterName, self._nullBackup)] +
+                   [(target.backup, target.backupRasterName, target.nullBackup)
+                    for target in self._targets])
+
+    def _getExportTargets(self, base, window, record):
+        """Returns ExportTarget for each target raster map
+
+        :param base: base of export, None when rebuilding from backup
+        :param record: True to record changes in history of saves
+        """
+        targets = []
+        for target in self._targets:
+            targets.append(ExportTarget(target.name, target.mapping,
+                                        base=None if base is None else target.name,
+                                        backupRaster=target.backupRasterName,
+                                        backup=target.backup if record else None,
+                                        delta=target.history.NewDelta(window)
+                                        if record and target.history else None))
+        return targets
+
+    def PrepareExport(self, end=None):
+        """Collects features to save.
+
+        Has to be called from the thread which edits features, Export
+        can then run in other thread while new features are digitized.
+
+        :param end: number of features (in drawing order) to save,
+                    defaults to all
+
+        :return: tuple (end, base, bbox, records) passed to Export
+                 or None if there is nothing to save
+        """
+        if not self._editedRaster:
+            return None
+        if end is None:
+            end = len(self._store)
+        features, base, bbox = self._getFeaturesToExport(end)
+        if bbox is None:
+            return None
+        records = [(self._store.GetType(fid), self._store.GetCoords(fid),
+                    self._store.GetValue(fid), self._store.GetWidth(fid)) for fid in features]
+        return end, base, bbox, records
+
+    def Export(self, end=None, progress=None, prepared=None):
+        """Saves features to edited raster map.
+
+        When the previous export was cancelled and the same features
+        are exported, its job continues. ExportCancelled is raised
+        when the export was cancelled.
+
+        :param end: number of features (in drawing order) to save,
+                    defaults to all
+        :param progress: function called with number of processed cells,
+                         total number of cells and description of stage
+        :param prepared: result of PrepareExport, features are collected
+                         now when not given (end is ignored otherwise)
+
+        :return: True if the raster map (and targets) were written
+        """
+        self._exportTimes = OrderedDict()
+        if prepared is None:
+            start = timer()
+            prepared = self.PrepareExport(end)
+            self._exportTimes['prepare'] = timer() - start
+        if prepared is None:
+            return False
+        end, base, bbox, records = prepared
+        grid = RasterGrid.FromRegion(gcore.region())
+        if self._backup and not self._backup.MatchesGrid(grid):
+            raise ScriptError(_("Computational region changed since the raster map "
+                                "was selected, edits can not be saved."))
+        window = grid.Window(bbox)
+        if window is None:
+            # edits are outside of computational region
+            return False
+
+        job = self._job
+        if not job or not job.Matches(records, base, window, self._editedRaster,
+                                      outside=self._sourceRaster):
+            if job:
+                job.CleanUp()
+            job = ExportJob(records, base=base, window=window, region=grid,
+                            output=self._editedRaster, outside=self._sourceRaster,
+                            workers=self._workers, mapType=self._mapType)
+        self._job = job
+
+        if self._history:
+            # tiles are backed up and saves recorded only when writing in process
+            delta = self._history.NewDelta(window, state=(self._savedCount, set(self._dirty),
+                                                          self._removedBBox))
+            targets = self._getExportTargets(base, window, record=True)
+            try:
+                self._runJob(job, 'numpy', backupRaster=self._backupRasterName,
+                             backup=self._backup, delta=delta, progress=progress,
+                             targets=targets)
+            except Exception:
+                delta.Discard()
+                for target in targets:
+                    if target.delta:
+                        target.delta.Discard()
+                raise
+            recorded = self._history.Push(delta)
+            for target, exported in zip(self._targets, targets):
+                if target.history:
+                    recorded = target.history.Push(exported.delta) and recorded
+            if not recorded:
+                # saves of all raster maps are undone together
+                for history in self._getHistories():
+                    history.Clear()
+        elif self._writesInProcess():
+            targets = self._getExportTargets(base, window, record=False)
+            try:
+                self._runJob(job, 'numpy', backupRaster=self._backupRasterName,
+                             progress=progress, targets=targets)
+            except ScriptError as e:
+                if job.HasWritten():
+                    raise
+                # nothing was written yet, try modules instead
+                Debug.msg(1, "DigitizerEngine.Export(): "
+                             "in-process rasterization failed: %s" % e)
+                self._runJob(job, 'modules', backupRaster=self._backupRasterName,
+                             progress=progress, targets=targets)
+        else:
+            self._runJob(job, 'modules', backupRaster=self._backupRasterName, progress=progress,
+                         targets=self._getExportTargets(base, window, record=False))
+        self._exportTimes.update(job.GetTimes())
+        job.CleanUp()
+        self._job = None
+
+        self._sourceRaster = None
+        for history in self._getHistories():
+            history.ClearRedo()
+        self._savedCount = end
+        self._dirty.clear()
+        self._removedBBox = None
+        if self._journal:
+            self._journal.Save(end)
+        start = timer()
+        self._updateColorTable(job.GetValueRange())
+        if self._targets:
+            values = set(record[2] for record in records if record[2] is not None)
+            for target in self._targets:
+                mapped = [value for value in map(target.mapping.Map, values)
+                          if value is not None]
+                if mapped:
+                    target.colorRange = self._coverValues(target.name, None, target.colorRange,
+                                                          (min(mapped), max(mapped)))
+        self._exportTimes['color'] = timer() - start
+        return True
+
+    def _runJob(self, job, method, **kwargs):
+        """Runs export job, failures are raised as ScriptError
+        (ExportCancelled when cancelled)"""
+        try:
+            job.Run(method, **kwargs)
+        except (ExportCancelled, ScriptError):
+            raise
+        except Exception as e:
+            # CalledModuleError, pygrass errors
+            raise ScriptError(_("Failed to save raster map <%(name)s>: %(error)s") %
+                              {'name': self._editedRaster, 'error': e})
+
+    def CancelExport(self):
+        """Cancels running save, rasterized parts are kept for next save"""
+        if self._job:
+            self._job.Cancel()
+
+    def CanUndoSave(self):
+        """Checks if the last save can be undone, i.e. there are no
+        unsaved changes"""
+        return (len(self._store) <= self._savedCount and not self._dirty and
+                self._removedBBox is None and
+                self._history is not None and self._history.CanUndo() and
+                all(target.history and target.history.CanUndo() for target in self._targets))
+
+    def CanRedoSave(self):
+        return (self._history is not None and self._history.CanRedo() and
+                all(target.history and target.history.CanRedo() for target in self._targets))
+
+    def UndoSave(self, progress=None):
+        """Writes back cells of edited raster map before the last save,
+        features of the save become unsaved.
+
+        :param progress: function called with number of processed rows
+        """
+        delta = self._history.Undo()
+        delta.Apply(self._editedRaster, 'before', progress=progress)
+        for target in self._targets:
+            target.history.Undo().Apply(target.name, 'before', progress=progress)
+        self._savedCount, dirty, self._removedBBox = delta.state
+        self._dirty = set(dirty)
+        if self._journal:
+            self._journal.Save(self._savedCount)
+
+    def RedoSave(self, progress=None):
+        """Writes again cells of edited raster map changed by undone save"""
+        delta = self._history.Redo()
+        delta.Apply(self._editedRaster, 'after', progress=progress)
+        for target in self._targets:
+            target.history.Redo().Apply(target.name, 'after', progress=progress)
+        self._savedCount = len(self._store)
+        self._dirty.clear()
+        self._removedBBox = None
+        if self._journal:
+            self._journal.Save(self._savedCount)
+
+    def ClearRedo(self):
+        """Forgets undone saves"""
+        for history in self._getHistories():
+            history.ClearRedo()
+
+    def _getMapRange(self, name):
+        """Returns (min, max) of raster map or None when it has no values"""
+        valueRange = RasterMetadata.GetRange(name)
+        if not valueRange or valueRange[0] is None or valueRange[1] is None:
+            return None
+        return valueRange
+
+    def _updateColorTable(self, valueRange):
+        """Keeps color table of edited raster map covering saved values.
+
+        :param valueRange: (min, max) of saved values
+        """
+        self._colorRange = self._coverValues(self._editedRaster, self._backgroundRaster,
+                                             self._colorRange, valueRange)
+
+    def _coverValues(self, name, background, covered, valueRange):
+        """Keeps color table of raster map covering saved values.
+
+        Rules are changed only when saved values are outside of the range
+        covered by the table, no statistics of the raster map are computed.
+        Default color table is stretched to the range of the map, table
+        of background map is copied and extended by the end colors.
+
+        :param background: background raster map of new raster map or None
+        :param covered: range of values covered by the table, None when
+                        the table has to be set
+        :param valueRange: (min, max) of saved values
+
+        :return: range of values covered by the table
+        """
+        if valueRange is None:
+            return covered
+        if covered and covered[0] <= valueRange[0] and valueRange[1] <= covered[1]:
+            return covered
+        original = covered
+        try:
+            if not background:
+                self._setDefaultColorTable(name)
+                return self._getMapRange(name)
+            if covered is None:
+                gcore.run_command('r.colors', map=name, raster=background, quiet=True)
+                covered = self._getMapRange(background)
+            if covered is None or valueRange[0] < covered[0] or valueRange[1] > covered[1]:
+                self._extendColorTable(name, valueRange)
+                if covered:
+                    valueRange = (min(valueRange[0], covered[0]), max(valueRange[1], covered[1]))
+                covered = valueRange
+        except CalledModuleError:
+            self._warning(_("Failed to set default color table for edited raster map"))
+            return original
+        return covered
+
+    def _setDefaultColorTable(self, name):
+        gcore.run_command('r.colors', color=self._colorTable, map=name, quiet=True)
+
+    def _extendColorTable(self, name, valueRange):
+        """Adds rules for values outside of color table of raster map,
+        colors of the lowest and the highest rule are used."""
+        rules = gcore.read_command('r.colors.out', map=name).strip().splitlines()
+        points = []
+        for rule in rules:
+            try:
+                points.append((float(rule.split()[0]), rule.split()[1]))
+            except (ValueError, IndexError):
+                # nv and default rules
+                pass
+        if not points:
+            self._setDefaultColorTable(name)
+            return
+        low, high = min(points), max(points)
+        if valueRange[0] < low[0]:
+            rules.insert(0, '{v} {color}'.format(v=valueRange[0], color=low[1]))
+        if valueRange[1] > high[0]:
+            rules.append('{v} {color}'.format(v=valueRange[1], color=high[1]))
+        gcore.write_command('r.colors', map=name, rules='-',
+                            stdin='\n'.join(rules) + '\n', quiet=True)
+
+    def CleanUp(self):
+        """Removes unfinished save, backup, journal and history
+        and stops worker processes"""
+        if self._job:
+            self._job.CleanUp()
+            self._job = None
+        TerminatePool()
+        self._discardTargets()
+        self._discardBackup()
+        self._discardJournal()
+        self._discardHistory()
@@ -0,0 +1,579 @@
+"""
+@package rdigit.export
+
+@brief Export of digitized features into raster map.
+
+Classes:
+ - export::ExportCancelled
+ - export::ExportTarget
+ - export::ExportJob
+
+(C) 2014 by the GRASS Development Team
+This program is free software under the GNU General Public
+License (>=v2). Read the file COPYING that comes with GRASS
+for details.
+
+@author Anna Petrasova <kratochanna gmail.com>
+"""
+
+import os
+import uuid
+import threading
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+from timeit import default_timer as timer
+
+from grass.script import core as gcore
+from grass.exceptions import CalledModuleError
+
+from core.rastercache import RasterMetadata
+from rdigit.planner import BatchPlanner
+from rdigit.rasterizer import FeatureBBox, UnionBBox, PatchRaster, RasterizeBatches
+
+
+def GetTempName():
+    """Returns unique name for temporary raster map"""
+    return 'tmp_rdigit_{pid}_{uid}'.format(pid=os.getpid(), uid=uuid.uuid4().hex[:12])
+
+
+class ExportCancelled(Exception):
+    """Export was cancelled by user"""
+    pass
+
+
+class ExportTarget:
+    """Additional raster map written by ExportJob from the same
+    rasterized features, with cell values given by value mapping."""
+    def __init__(self, output, mapping, base=None, outside=None, backupRaster=None,
+                 backup=None, delta=None):
+        """
+        :param output: name of the raster map (fully qualified)
+        :param mapping: targets.ValueMapping
+        :param base: raster map used within window, None for backup
+                     (as base of the job)
+        :param outside: raster map used outside of window, defaults to output
+        :param backupRaster: backup raster map (see ExportJob.Run)
+        :param backup: TileBackup (method 'numpy')
+        :param delta: SaveDelta recording changed cells (method 'numpy')
+        """
+        self.output = output
+        self.mapping = mapping
+        self.base = base
+        self.outside = outside or output
+        self.backupRaster = backupRaster
+        self.backup = backup
+        self.delta = delta
+
+    def GetBase(self):
+        """Returns base raster map, None when cells are restored by TileBackup
+        (or are null)"""
+        if self.base is None and not self.backup:
+            return self.backupRaster
+        return self.base
+
+
+class ExportJob:
+    """Rasterization of features and patching them into edited raster map.
+
+    Features are grouped into batches (see planner.BatchPlanner) which
+    are rasterized either in process (NumPy) or by r.in.poly and r.grow.
+    The result is written into a temporary raster map which replaces
+    the edited raster map only when everything succeeded.
+
+    Features are rasterized once for all written raster maps, targets
+    (see ExportTarget) differ only in the values written into the cells.
+
+    Job can be cancelled from other thread, running modules are killed.
+    Rasterized batches are kept, so when the cancelled job is run again,
+    only the remaining batches are rasterized. CleanUp has to be called
+    when the job is not needed anymore.
+    """
+    def __init__(self, records, base, window, region, output, outside=None, workers=1,
+                 mapType=None):
+        """
+        :param records: list of tuples (ftype, coords, value, width)
+                        in drawing order
+        :param base: raster map used within window, None for backup
+                     (null cells without backup)
+        :param window: RasterGrid of the changed part of the region
+        :param region: RasterGrid of the computational region
+        :param output: name of the edited raster map (fully qualified)
+        :param outside: raster map used outside of window, defaults to output
+                        (differs for new map which was not written yet)
+        :param workers: maximum number of batches rasterized in parallel
+        :param mapType: type of the edited raster map (new map which was
+                        not written yet), defaults to its current type
+        """
+        self._records = records
+        self._base = base
+        self._window = window
+        self._region = region
+        self._output = output
+        self._outside = outside or output
+        self._workers = workers
+        self._mapType = mapType
+
+        # seconds spent in stages of the job, summed over runs
+        self._times = OrderedDict()
+        start = timer()
+        self._batches = self._planBatches()
+        # number of cells of each batch, used for progress
+        self._costs = []
+        for indices, width in self._batches:
+            bbox = None
+            for i in indices:
+                bbox = UnionBBox(bbox, FeatureBBox(self._records[i][0], self._records[i][1], width))
+            part = window.Window(bbox) if bbox else None
+            self._costs.append(part.rows * part.cols if part else 1)
+        self._addTime('plan', start)
+
+        # method of rasterized batches and their results
+        self._method = None
+        self._results = [None] * len(self._batches)
+        # range of values written by the last run
+        self._valueRange = None
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._processes = []
+        self._progress = None
+        # number of raster maps written by the current run
+        self._outputs = 1
+        # some written raster map was already replaced
+        self._renamed = False
+
+    def _planBatches(self):
+        """Groups features into batches rasterized together
+        (by single r.in.poly and r.grow run). Buffered features are grouped
+        by cell value and width, other features can be rasterized together
+        regardless of cell value.
+
+        :return: list of (feature indices, width)
+        """
+        planner = BatchPlanner(grid=self._region)
+        for i, (ftype, coords, value, width) in enumerate(self._records):
+            if width:
+                key = ('grow', value, width)
+            else:
+                key = ('plain',)
+            planner.AddFeature(i, key=key, bbox=FeatureBBox(ftype, coords, width))
+        batches = []
+        for batch in planner.GetBatches():
+            width = batch.key[2] if batch.key[0] == 'grow' else None
+            batches.append((batch.features, width))
+        return batches
+
+    def Matches(self, records, base, window, output, outside=None):
+        """Checks if job exports the same features into the same window"""
+        return (self._records == records and self._base == base and
+                self._output == output and self._outside == (outside or output) and
+                (window.north, window.south, window.east, window.west) ==
+                (self._window.north, self._window.south, self._window.east, self._window.west))
+
+    def GetWindow(self):
+        return self._window
+
+    def _addTime(self, stage, start):
+        self._times[stage] = self._times.get(stage, 0) + timer() - start
+
+    def GetTimes(self):
+        """Returns dictionary of seconds spent in stages of the job:
+        plan (grouping features into batches), rasterize (batches including
+        buffers), patch (writing raster maps including backup and changes
+        for undo) and rename (replacing written raster maps)"""
+        return OrderedDict(self._times)
+
+    def HasWritten(self):
+        """Checks if some written raster map was left replaced by the last
+        failed run (it could not be put back), run can't be repeated
+        by other method then"""
+        return self._renamed
+
+    def GetValueRange(self):
+        """Returns range (min, max) of values written by the last run or None"""
+        return self._valueRange
+
+    def Cancel(self):
+        """Cancels the job, running modules are killed"""
+        self._cancelled.set()
+        with self._lock:
+            for proc in self._processes:
+                try:
+                    proc.kill()
+                except OSError:
+                    pass
+
+    def IsCancelled(self):
+        return self._cancelled.is_set()
+
+    def _checkCancelled(self):
+        if self._cancelled.is_set():
+            raise ExportCancelled()
+
+    def _report(self, text, written=0):
+        """Reports cells of rasterized batches and written rows"""
+        if not self._progress:
+            return
+        rasterized = sum(cost for cost, result in zip(self._costs, self._results)
+                         if result is not None)
+        total = sum(self._costs) + self._outputs * self._region.rows * self._region.cols
+        self._progress(rasterized + written * self._region.cols, total, text)
+
+    def Run(self, method='numpy', backupRaster=None, backup=None, delta=None,
+            progress=None, targets=()):
+        """Runs (or continues cancelled) export.
+
+        :param method: 'numpy' for rasterizing in process,
+                       'modules' for r.in.poly and r.grow
+        :param backupRaster: backup raster map used when base is None
+                             (method 'modules' or no TileBackup)
+        :param backup: TileBackup (method 'numpy')
+        :param delta: SaveDelta recording changed cells (method 'numpy')
+        :param progress: function called with number of processed cells,
+                         total number of cells and description of stage
+        :param targets: list of ExportTarget written in addition to output
+        """
+        self._cancelled.clear()
+        self._progress = progress
+        self._renamed = False
+        self._outputs = 1 + len(targets)
+        if method != self._method:
+            self._discardResults()
+            self._method = method
+        base = self._base
+        if base is None and not backup:
+            base = backupRaster
+        if method == 'numpy':
+            self._runNumpy(base, backup, delta, targets)
+        else:
+            self._runModules(base, targets)
+
+    def _rename(self, names):
+        """Replaces written raster maps by patched ones when all were patched.
+
+        Written raster maps are renamed to temporary names first,
+        when replacing any of them fails (or the job is cancelled),
+        all of them are put back.
+
+        :param names: list of (patched, output)
+        """
+        self._checkCancelled()
+        start = timer()
+        # (temporary name, output) of written raster maps moved aside
+        kept = []
+        replaced = []
+        try:
+            for patched, output in names:
+                name, mapset = (output.split('@') + [''])[:2]
+                if gcore.find_file(name, element='cell', mapset=mapset)['name']:
+                    temp = GetTempName()
+                    self._runModule('g.rename', rast=[name, temp], quiet=True)
+                    kept.append((temp, name))
+            for patched, output in names:
+                # the module can finish even when the job is cancelled
+                replaced.append(output.split('@')[0])
+                self._runModule('g.rename', rast=[patched, replaced[-1]], quiet=True)
+        except Exception:
+            self._rollBack(kept, replaced)
+            raise
+        self._removeRasters([temp for temp, name in kept])
+        self._addTime('rename', start)
+
+    def _rollBack(self, kept, replaced):
+        """Puts back written raster maps moved aside by _rename"""
+        try:
+            self._removeRasters(replaced)
+            for temp, name in kept:
+                gcore.run_command('g.rename', rast=[temp, name], quiet=True)
+        except CalledModuleError:
+            # some raster map stays replaced
+            self._renamed = True
+
+    def _runNumpy(self, base, backup, delta, targets):
+        batches = []
+        for indices, width in self._batches:
+            batches.append(([self._records[i][:3] for i in indices], width))
+
+        def rasterized(count):
+            self._checkCancelled()
+            self._report(_("Rasterizing..."))
+
+        self._report(_("Rasterizing..."))
+        start = timer()
+        rasterizer = RasterizeBatches(self._window, batches, workers=self._workers,
+                                      progress=rasterized, results=self._results)
+        self._addTime('rasterize', start)
+        self._valueRange = rasterizer.GetRange()
+        step = max(1, self._region.rows // 100)
+
+        def writer(done):
+            # rows written into previous raster maps
+            def written(row):
+                if row % step == 0 or row == self._region.rows:
+                    self._checkCancelled()
+                    self._report(_("Writing raster map..."), written=done + row)
+            return written
+
+        names = [(GetTempName(), self._output)]
+        try:
+            start = timer()
+            PatchRaster(rasterizer, base=base, output=names[0][0], outside=self._outside,
+                        backup=backup, delta=delta, progress=writer(0), mtype=self._mapType)
+            for target in targets:
+                names.append((GetTempName(), target.output))
+                PatchRaster(rasterizer, base=target.GetBase(), output=names[-1][0],
+                            outside=target.outside, backup=target.backup, delta=target.delta,
+                            mapping=target.mapping,
+                            progress=writer((len(names) - 1) * self._region.rows))
+            self._addTime('patch', start)
+            self._rename(names)
+        except Exception:
+            self._removeRasters([patched for patched, output in names])
+            raise
+
+    def _startModule(self, module, **kwargs):
+        self._checkCancelled()
+        proc = gcore.start_command(module, **kwargs)
+        with self._lock:
+            self._processes.append(proc)
+        return proc
+
+    def _waitModule(self, proc, module):
+        returncode = proc.wait()
+        with self._lock:
+            self._processes.remove(proc)
+        self._checkCancelled()
+        if returncode != 0:
+            raise CalledModuleError(module=module, code=None, returncode=returncode)
+
+    def _runModule(self, module, **kwargs):
+        self._waitModule(self._startModule(module, **kwargs), module)
+
+    def _getMapType(self):
+        """Returns type of the edited raster map"""
+        return self._mapType or RasterMetadata.GetInfo(self._output)['datatype']
+
+    def _patch(self, inputs, tempRasters, env=None):
+        """Patches raster maps (the first has priority) in the window.
+
+        :param tempRasters: list of temporary raster maps, the patched
+                            raster map is added to it
+
+        :return: r.mapcalc expression of patched raster maps
+        """
+        if not inputs:
+            return 'null()'
+        if len(inputs) == 1:
+            return inputs[0]
+        patched = GetTempName()
+        tempRasters.append(patched)
+        self._runModule('r.patch', input=inputs, output=patched,
+                        overwrite=True, quiet=True, env=env)
+        return patched
+
+    def _runModules(self, base, targets):
+        """Rasterizes features using r.in.poly, r.grow and r.patch.
+
+        Rasterization runs in the region of the window only.
+        When base is not the edited raster map, base (null cells when None)
+        is used within the window and edited raster map (or outside map)
+        outside of it. Patched raster map is cast to the type of edited
+        raster map. Targets are written by r.mapcalc from patched features.
+        """
+        window = self._window
+        cast = {'CELL': 'int', 'FCELL': 'float', 'DCELL': 'double'}
+        mapType = self._getMapType()
+        env = os.environ.copy()
+        env['GRASS_REGION'] = gcore.region_env(n=window.north, s=window.south,
+                                               e=window.east, w=window.west,
+                                               nsres=window.nsres, ewres=window.ewres)
+        todo = [i for i, result in enumerate(self._results) if result is None]
+
+        def rasterize(index):
+            indices, width = self._batches[index]
+            try:
+                return index, self._rasterize(indices, width, mapType, env=env), None
+            except Exception as e:
+                return index, None, e
+
+        self._report(_("Rasterizing..."))
+        # each batch runs its own modules, threads only wait for them,
+        # all batches are waited for so that no temporary map is left
+        # behind when one of them fails
+        start = timer()
+        pool = ThreadPool(processes=max(1, min(self._workers, len(todo))))
+        error = None
+        try:
+            for index, raster, e in pool.imap_unordered(rasterize, todo):
+                if e is not None:
+                    if error is None or isinstance(error, ExportCancelled):
+                        error = e
+                    continue
+                self._results[index] = raster
+                self._report(_("Rasterizing..."))
+        finally:
+            pool.close()
+            pool.join()
+            self._addTime('rasterize', start)
+        if error is not None:
+            if not isinstance(error, ExportCancelled):
+                # rasterized batches are kept only for cancelled job
+                self._discardResults()
+            raise error
+        rastersToPatch = list(self._results)
+        values = [record[2] for record in self._records if record[2] is not None]
+        self._valueRange = (min(values), max(values)) if values else None
+
+        # r.patch gives priority to the first input, last drawn goes first
+        patched = GetTempName()
+        tempRasters = [patched]
+        names = [(patched, self._output)]
+        try:
+            self._report(_("Writing raster map..."))
+            start = timer()
+            if base == self._output and self._outside == self._output:
+                # temporary maps are null outside of the window
+                self._runModule('r.patch', input=list(reversed(rastersToPatch)) + [base],
+                                output=patched, overwrite=True, quiet=True)
+            else:
+                # patch in the window and take edited raster outside of it
+                windowRaster = self._patch(list(reversed(rastersToPatch)) +
+                                           ([base] if base else []), tempRasters, env=env)
+                exp = "{out} = {cast}(if(x() > {w} && x() < {e} && y() > {s} && y() < {n}, " \
+                      "{window}, {edited}))".format(out=patched, cast=cast[mapType],
+                                                    window=windowRaster, edited=self._outside,
+                                                    w=window.west, e=window.east,
+                                                    s=window.south, n=window.north)
+                self._runModule('r.mapcalc', expression=exp, overwrite=True, quiet=True)
+            self._report(_("Writing raster map..."), written=self._region.rows)
+
+            if targets and rastersToPatch:
+                # features only, null elsewhere
+                features = self._patch(list(reversed(rastersToPatch)), tempRasters, env=env)
+            for target in targets:
+                output = GetTempName()
+                tempRasters.append(output)
+                names.append((output, target.output))
+                targetBase = target.GetBase() or 'null()'
+                if rastersToPatch:
+                    inside = "if(isnull({f}), {base}, {mapped})".format(
+                        f=features, base=targetBase,
+                        mapped=target.mapping.GetExpression(features))
+                else:
+                    inside = targetBase
+                mtype = RasterMetadata.GetInfo(target.outside)['datatype']
+                exp = "{out} = {cast}(if(x() > {w} && x() < {e} && y() > {s} && y() < {n}, " \
+                      "{inside}, {outside}))".format(out=output, cast=cast[mtype],
+                                                     inside=inside, outside=target.outside,
+                                                     w=window.west, e=window.east,
+                                                     s=window.south, n=window.north)
+                self._runModule('r.mapcalc', expression=exp, overwrite=True, quiet=True)
+                self._report(_("Writing raster map..."), written=len(names) * self._region.rows)
+            self._addTime('patch', start)
+            self._rename(names)
+            for output, name in names:
+                tempRasters.remove(output)
+        finally:
+            self._removeRasters(tempRasters)
+
+    def _writeFeature(self, index, vtype):
+        """Generates lines of r.in.poly record of the feature"""
+        ftype, coords, value, width = self._records[index]
+        if ftype == 'cells':
+            for line in self._writeCells(coords, value):
+                yield line
+            return
+        if vtype == 'P':
+            coords = [coords]
+        yield '{vtype}\n'.format(vtype=vtype)
+        for coord in coords:
+            yield '{x} {y}\n'.format(x=coord[0], y=coord[1])
+        yield '= {cellValue}\n'.format(cellValue=value)
+
+    def _writeCells(self, coords, value):
+        """Generates r.in.poly records of runs of cells, runs are lines
+        through centers of cells, single cells are points."""
+        for start, end in zip(coords[0::2], coords[1::2]):
+            if start == end:
+                yield 'P\n{x} {y}\n'.format(x=start[0], y=start[1])
+            else:
+                yield 'L\n{x0} {y}\n{x1} {y}\n'.format(x0=start[0], x1=end[0], y=start[1])
+            yield '= {cellValue}\n'.format(cellValue=value)
+
+    def _writeFeatures(self, indices):
+        """Generates lines of r.in.poly input for features"""
+        vtypes = {'area': 'A', 'line': 'L', 'point': 'P', 'cells': None}
+        for i in indices:
+            for line in self._writeFeature(i, vtype=vtypes[self._records[i][0]]):
+                yield line
+
+    def _runRInPoly(self, indices, output, mapType, env=None, chunkSize=65536):
+        """Runs r.in.poly reading features from standard input.
+
+        Records are generated lazily and written in chunks of
+        limited size, so memory does not depend on number
+        of features or vertices.
+        """
+        proc = self._startModule('r.in.poly', input='-', output=output, type=mapType,
+                                 overwrite=True, quiet=True, env=env,
+                                 stdin=gcore.PIPE)
+        chunk = []
+        size = 0
+        try:
+            for line in self._writeFeatures(indices):
+                chunk.append(line)
+                size += len(line)
+                if size >= chunkSize:
+                    self._checkCancelled()
+                    # records are ASCII, encoding gives str on Python 2
+                    # and bytes on Python 3
+                    proc.stdin.write(''.join(chunk).encode('ascii'))
+                    chunk = []
+                    size = 0
+            if chunk:
+                proc.stdin.write(''.join(chunk).encode('ascii'))
+        except (IOError, OSError):
+            # module was killed
+            pass
+        finally:
+            try:
+                proc.stdin.close()
+            except (IOError, OSError):
+                pass
+            self._waitModule(proc, 'r.in.poly')
+
+    def _rasterize(self, indices, bufferDist, mapType, env=None):
+        output = GetTempName()
+        try:
+            if bufferDist:
+                tempRaster = GetTempName()
+                try:
+                    self._runRInPoly(indices, output=tempRaster, mapType=mapType, env=env)
+                    self._runModule('r.grow', input=tempRaster, output=output,
+                                    flags='m', radius=bufferDist, quiet=True, env=env)
+                finally:
+                    self._removeRasters([tempRaster])
+            else:
+                self._runRInPoly(indices, output=output, mapType=mapType, env=env)
+        except Exception:
+            self._removeRasters([output])
+            raise
+        return output
+
+    def _removeRasters(self, names):
+        names = [name for name in names if name]
+        if not names:
+            return
+        try:
+            gcore.run_command('g.remove', type='rast', flags='f', name=names, quiet=True)
+        except CalledModuleError:
+            pass
+
+    def _discardResults(self):
+        if self._method == 'modules':
+            self._removeRasters([result for result in self._results if result])
+        self._results = [None] * len(self._batches)
+
+    def CleanUp(self):
+        """Removes temporary raster maps of rasterized batches"""
+        self._discardResults()
+
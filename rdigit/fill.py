@@ -0,0 +1,90 @@
+"""
+@package rdigit.fill
+
+@brief Flood fill of raster cells for raster digitizer.
+
+Filled cells are kept as runs of cells in rows (feature type 'cells'),
+each run is given by centers of its first and last cell, so a filled
+patch needs two vertices per row instead of its outline.
+
+(C) 2014 by the GRASS Development Team
+This program is free software under the GNU General Public
+License (>=v2). Read the file COPYING that comes with GRASS
+for details.
+
+@author Anna Petrasova <kratochanna gmail.com>
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    pass
+
+
+def FloodFill(data, row, col, connectivity=4, tolerance=0):
+    """Finds cells connected to the seed cell with similar values.
+
+    Scanline fill, each run of cells is filled at once and only
+    the starts of runs in the neighboring rows are queued.
+    Cells are similar when their value differs from the value of the seed
+    cell by at most tolerance, null (NaN) cells are similar to null seed only.
+
+    :param data: 2D array of cell values
+    :param row: row of the seed cell
+    :param col: column of the seed cell
+    :param connectivity: 4 or 8 (including diagonal neighbors)
+    :param tolerance: maximum difference of values
+
+    :return: list of runs (row, first column, last column)
+    """
+    rows, cols = data.shape
+    seed = data[row, col]
+    if np.isnan(seed):
+        match = np.isnan(data)
+    else:
+        with np.errstate(invalid='ignore'):
+            match = np.abs(data - seed) <= tolerance
+    filled = np.zeros(data.shape, dtype=bool)
+    diagonal = 1 if connectivity == 8 else 0
+    runs = []
+    stack = [(row, col)]
+    while stack:
+        r, c = stack.pop()
+        if filled[r, c]:
+            continue
+        line = match[r] & ~filled[r]
+        blocked = np.flatnonzero(~line[:c][::-1])
+        c0 = c - blocked[0] if blocked.size else 0
+        blocked = np.flatnonzero(~line[c + 1:])
+        c1 = c + blocked[0] if blocked.size else cols - 1
+        filled[r, c0:c1 + 1] = True
+        runs.append((r, int(c0), int(c1)))
+        lo = max(c0 - diagonal, 0)
+        hi = min(c1 + diagonal, cols - 1)
+        for nr in (r - 1, r + 1):
+            if nr < 0 or nr >= rows:
+                continue
+            candidates = match[nr, lo:hi + 1] & ~filled[nr, lo:hi + 1]
+            # first cell of each run of candidates
+            starts = np.flatnonzero(candidates[1:] & ~candidates[:-1]) + 1
+            if candidates[0]:
+                stack.append((nr, lo))
+            stack.extend((nr, lo + int(start)) for start in starts)
+    runs.sort()
+    return runs
+
+
+def RunsToCoords(grid, runs):
+    """Converts runs of cells to coordinates of feature of type 'cells'
+
+    :param grid: RasterGrid of the array the runs were found in
+    :param runs: list of (row, first column, last column)
+
+    :return: list of [x, y], centers of the first and the last cell of each run
+    """
+    coords = []
+    for row, col0, col1 in runs:
+        y = grid.north - (row + 0.5) * grid.nsres
+        coords.append([grid.west + (col0 + 0.5) * grid.ewres, y])
+        coords.append([grid.west + (col1 + 0.5) * grid.ewres, y])
+    return coords
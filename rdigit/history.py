@@ -0,0 +1,286 @@
+"""
+@package rdigit.history
+
+@brief Undo and redo of saves of edited raster map.
+
+Classes:
+ - history::SaveDelta
+ - history::SaveHistory
+
+(C) 2014 by the GRASS Development Team
+This program is free software under the GNU General Public
+License (>=v2). Read the file COPYING that comes with GRASS
+for details.
+
+@author Anna Petrasova <kratochanna gmail.com>
+"""
+
+import os
+import shutil
+import zlib
+
+try:
+    import numpy as np
+except ImportError:
+    pass
+
+
+def _equal(a, b):
+    if a.dtype.kind == 'f':
+        # null cells are NaN
+        return bool(np.all((a == b) | (np.isnan(a) & np.isnan(b))))
+    return np.array_equal(a, b)
+
+
+class SaveDelta:
+    """Cells changed by one save.
+
+    Values before and after the save are captured for the window
+    of the save while the rows are streamed (see rasterizer.PatchRaster).
+    The window is split into tiles, only tiles with changed cells are
+    stored, compressed, in a file.
+
+    State of the digitizer before the save (number of saved features,
+    changed features etc.) is kept in attribute state.
+    """
+    def __init__(self, window, path, tileSize=256, state=None):
+        """
+        :param window: RasterGrid of the saved window
+        :param path: file for storing tiles
+        :param tileSize: number of rows and columns of a tile
+        :param state: digitizer state before the save (any object)
+        """
+        self.state = state
+        self._window = window
+        self._path = path
+        self._tileSize = tileSize
+        self._file = None
+        self._dtype = None
+        # (row0, row1, col0, col1, offset, size of before, size of after)
+        self._tiles = []
+        self._size = 0
+        # rows of the current band of tiles
+        self._band = None
+        self._rowStart = None
+        self._before = []
+        self._after = []
+        # decompressed tiles of one band used for applying
+        self._cachedBand = None
+        self._cache = []
+
+    def GetSize(self):
+        """Returns number of bytes stored"""
+        return self._size
+
+    def IsEmpty(self):
+        return not self._tiles
+
+    def _bandOf(self, row):
+        return row // self._tileSize
+
+    def CaptureRow(self, row, before, after):
+        """Stores row of the window before and after the save.
+
+        :param row: row index in the region
+        :param before: values of the window columns before the save
+        :param after: values of the window columns after the save
+        """
+        self._dtype = before.dtype
+        band = self._bandOf(row)
+        if band != self._band:
+            self._flush()
+            self._band = band
+            self._rowStart = row
+        self._before.append(before.copy())
+        self._after.append(after.copy())
+        if row == self._window.rowOffset + self._window.rows - 1:
+            self._flush()
+
+    def _flush(self):
+        if not self._before:
+            return
+        before = np.vstack(self._before)
+        after = np.vstack(self._after)
+        self._before = []
+        self._after = []
+        row0 = self._rowStart
+        row1 = row0 + before.shape[0]
+        colOffset = self._window.colOffset
+        size = self._tileSize
+        col = colOffset
+        while col < colOffset + self._window.cols:
+            end = min((col // size + 1) * size, colOffset + self._window.cols)
+            b = before[:, col - colOffset:end - colOffset]
+            a = after[:, col - colOffset:end - colOffset]
+            if not _equal(b, a):
+                self._writeTile(row0, row1, col, end, b, a)
+            col = end
+
+    def _writeTile(self, row0, row1, col0, col1, before, after):
+        if self._file is None:
+            self._file = open(self._path, 'w+b')
+        before = zlib.compress(np.ascontiguousarray(before).tobytes(), 1)
+        after = zlib.compress(np.ascontiguousarray(after).tobytes(), 1)
+        self._file.seek(0, os.SEEK_END)
+        offset = self._file.tell()
+        self._file.write(before)
+        self._file.write(after)
+        self._tiles.append((row0, row1, col0, col1, offset, len(before), len(after)))
+        self._size += len(before) + len(after)
+
+    def Finish(self):
+        """Finishes capturing, the file is closed until the delta is applied"""
+        self._flush()
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _readTile(self, tile, which):
+        row0, row1, col0, col1, offset, before, after = tile
+        if which == 'before':
+            self._file.seek(offset)
+            data = self._file.read(before)
+        else:
+            self._file.seek(offset + before)
+            data = self._file.read(after)
+        data = zlib.decompress(data)
+        return np.frombuffer(data, dtype=self._dtype).reshape((row1 - row0, col1 - col0))
+
+    def ApplyRow(self, row, data, which):
+        """Replaces changed cells of row with values before or after the save.
+
+        :param row: row index
+        :param data: row of the raster map, modified in place
+        :param which: 'before' or 'after'
+        """
+        band = (self._bandOf(row), which)
+        if band != self._cachedBand:
+            self._cache = [(tile, self._readTile(tile, which)) for tile in self._tiles
+                           if self._bandOf(tile[0]) == band[0]]
+            self._cachedBand = band
+        for tile, values in self._cache:
+            row0, row1, col0, col1 = tile[:4]
+            if row0 <= row < row1:
+                data[col0:col1] = values[row - row0]
+        return data
+
+    def Apply(self, name, which, progress=None):
+        """Writes values before or after the save to raster map.
+
+        :param name: name of the edited raster map
+        :param which: 'before' (undo) or 'after' (redo)
+        :param progress: function called with number of processed rows
+        """
+        from rdigit.rasterizer import RewriteRaster
+
+        if self.IsEmpty():
+            return
+        self._file = open(self._path, 'rb')
+        try:
+            RewriteRaster(name, lambda i, data: self.ApplyRow(i, data, which),
+                          progress=progress)
+        finally:
+            self._file.close()
+            self._file = None
+            self._cachedBand = None
+            self._cache = []
+
+    def Discard(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+        if os.path.exists(self._path):
+            os.remove(self._path)
+        self._tiles = []
+        self._size = 0
+
+
+class SaveHistory:
+    """Stacks of saves which can be undone and redone.
+
+    Total size of stored deltas is limited by budget,
+    the oldest saves are forgotten first.
+    """
+    def __init__(self, path, budget=512 * 1024 * 1024, tileSize=256):
+        """
+        :param path: directory for storing deltas
+        :param budget: maximum number of bytes of stored deltas
+        :param tileSize: number of rows and columns of a tile
+        """
+        self._path = path
+        self._budget = budget
+        self._tileSize = tileSize
+        self._undo = []
+        self._redo = []
+        self._count = 0
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+    def SetBudget(self, budget):
+        self._budget = budget
+        self._trim()
+
+    def NewDelta(self, window, state=None):
+        """Returns new SaveDelta for capturing save of window"""
+        self._count += 1
+        return SaveDelta(window, os.path.join(self._path, 'save_{0}'.format(self._count)),
+                         tileSize=self._tileSize, state=state)
+
+    def _getSize(self):
+        return sum(delta.GetSize() for delta in self._undo + self._redo)
+
+    def _trim(self):
+        while self._undo and self._getSize() > self._budget:
+            self._undo.pop(0).Discard()
+
+    def Push(self, delta):
+        """Adds finished save, saves which were undone can't be redone anymore.
+
+        Save larger than budget is not recorded and all older saves
+        are forgotten, because undoing them would skip it.
+
+        :return: True if the save can be undone
+        """
+        self.ClearRedo()
+        if delta.GetSize() > self._budget:
+            delta.Discard()
+            self.Clear()
+            return False
+        self._undo.append(delta)
+        self._trim()
+        return True
+
+    def CanUndo(self):
+        return bool(self._undo)
+
+    def CanRedo(self):
+        return bool(self._redo)
+
+    def Undo(self):
+        """Moves the last save to redo stack and returns it"""
+        delta = self._undo.pop()
+        self._redo.append(delta)
+        return delta
+
+    def Redo(self):
+        """Moves the last undone save back to undo stack and returns it"""
+        delta = self._redo.pop()
+        self._undo.append(delta)
+        return delta
+
+    def ClearRedo(self):
+        for delta in self._redo:
+            delta.Discard()
+        self._redo = []
+
+    def Clear(self):
+        """Forgets all saves"""
+        for delta in self._undo + self._redo:
+            delta.Discard()
+        self._undo = []
+        self._redo = []
+
+    def Discard(self):
+        """Forgets all saves and removes the directory"""
+        self.Clear()
+        shutil.rmtree(self._path, ignore_errors=True)
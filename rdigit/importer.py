@@ -0,0 +1,343 @@
+"""
+@package rdigit.importer
+
+@brief Reading features from vector maps and files for raster digitizer.
+
+Classes:
+ - importer::FeatureColumns
+
+Features are read from GRASS vector map (exported to GeoJSON
+by v.out.ogr), GeoJSON or WKT file. Areas are imported without holes.
+Features of GeoJSON feature collections are parsed one by one,
+so that the whole file is not held in memory.
+
+(C) 2014 by the GRASS Development Team
+This program is free software under the GNU General Public
+License (>=v2). Read the file COPYING that comes with GRASS
+for details.
+
+@author Anna Petrasova <kratochanna gmail.com>
+"""
+
+import os
+import re
+import json
+import shutil
+import tempfile
+from array import array
+
+from grass.script import core as gcore
+from grass.script import vector as gvector
+from grass.exceptions import CalledModuleError, ScriptError
+
+
+class FeatureColumns:
+    """Features in columns accepted by FeatureStore.Extend
+    and EditJournal.AddFeatures."""
+    def __init__(self):
+        self.types = []
+        self.values = []
+        self.widths = []
+        self.counts = []
+        self.coords = array('d')
+        self.bboxes = array('d')
+
+    def __len__(self):
+        return len(self.types)
+
+    def Add(self, ftype, coords, value=None, width=None):
+        """Appends feature.
+
+        :param coords: list of [x, y] or [x, y] for point
+        """
+        if not coords:
+            return
+        if ftype == 'point':
+            coords = [coords]
+        xs = [vertex[0] for vertex in coords]
+        ys = [vertex[1] for vertex in coords]
+        flat = [0.0] * (2 * len(coords))
+        flat[0::2] = xs
+        flat[1::2] = ys
+        self.coords.extend(flat)
+        self.bboxes.extend((min(xs), min(ys), max(xs), max(ys)))
+        self.types.append(ftype)
+        self.values.append(value)
+        self.widths.append(width or 0)
+        self.counts.append(len(coords))
+
+
+def _ring(coords):
+    """Returns polygon ring without the closing vertex"""
+    coords = [vertex[:2] for vertex in coords]
+    if len(coords) > 1 and coords[0] == coords[-1]:
+        coords.pop()
+    return coords
+
+
+def _splitGeometry(geometry):
+    """Yields (ftype, coords) of parts of GeoJSON geometry"""
+    if not geometry:
+        return
+    gtype = geometry['type']
+    coords = geometry.get('coordinates')
+    if gtype == 'Point':
+        if coords:
+            yield 'point', coords[:2]
+    elif gtype == 'MultiPoint':
+        for point in coords:
+            yield 'point', point[:2]
+    elif gtype == 'LineString':
+        yield 'line', [vertex[:2] for vertex in coords]
+    elif gtype == 'MultiLineString':
+        for line in coords:
+            yield 'line', [vertex[:2] for vertex in line]
+    elif gtype == 'Polygon':
+        if coords:
+            yield 'area', _ring(coords[0])
+    elif gtype == 'MultiPolygon':
+        for polygon in coords:
+            if polygon:
+                yield 'area', _ring(polygon[0])
+    elif gtype == 'GeometryCollection':
+        for part in geometry['geometries']:
+            for each in _splitGeometry(part):
+                yield each
+
+
+_featuresKey = re.compile(r'"features"\s*:\s*\[')
+
+
+def _readGeoJSONObjects(f, chunkSize=65536):
+    """Yields GeoJSON features (or other GeoJSON object) read from file.
+
+    Features of feature collection are decoded one by one while the file
+    is read in chunks. Collection with features not starting in the first
+    chunk (after other members) is decoded whole.
+    """
+    text = f.read(chunkSize)
+    match = _featuresKey.search(text)
+    if not match or not text.lstrip().startswith('{'):
+        data = json.loads(text + f.read())
+        if data.get('type') == 'FeatureCollection':
+            for feature in data.get('features', []):
+                yield feature
+        else:
+            yield data
+        return
+    decoder = json.JSONDecoder()
+    text = text[match.end():]
+    pos = 0
+    eof = False
+    while True:
+        while pos < len(text) and text[pos] in ' \t\r\n,':
+            pos += 1
+        if pos < len(text) and text[pos] == ']':
+            return
+        try:
+            feature, end = decoder.raw_decode(text, pos)
+        except ValueError:
+            if eof:
+                raise
+            # feature continues in the next chunk
+            chunk = f.read(chunkSize)
+            eof = not chunk
+            text = text[pos:] + chunk
+            pos = 0
+            continue
+        yield feature
+        pos = end
+
+
+def ReadGeoJSON(path):
+    """Yields (ftype, coords, properties) of features in GeoJSON file"""
+    with open(path) as f:
+        for feature in _readGeoJSONObjects(f):
+            if feature.get('type') != 'Feature':
+                # bare geometry
+                feature = {'geometry': feature}
+            properties = feature.get('properties') or {}
+            for ftype, coords in _splitGeometry(feature.get('geometry')):
+                yield ftype, coords, properties
+
+
+_wktToken = re.compile(r'\s*(?:([A-Za-z]+)|([-+0-9.eE]+)|(\()|(\))|(,))')
+_wktTypes = {'POINT': 'Point', 'MULTIPOINT': 'MultiPoint',
+             'LINESTRING': 'LineString', 'MULTILINESTRING': 'MultiLineString',
+             'POLYGON': 'Polygon', 'MULTIPOLYGON': 'MultiPolygon',
+             'GEOMETRYCOLLECTION': 'GeometryCollection'}
+
+
+class _WKTParser:
+    """Parses WKT geometries into GeoJSON-like dictionaries"""
+    def __init__(self, text):
+        self._tokens = []
+        pos = 0
+        text = text.strip()
+        while pos < len(text):
+            match = _wktToken.match(text, pos)
+            if not match or match.end() == pos:
+                raise ValueError(_("Invalid WKT at position %d") % pos)
+            pos = match.end()
+            self._tokens.append([group for group in match.groups() if group is not None][0])
+        self._pos = 0
+
+    def _peek(self):
+        return self._tokens[self._pos] if self._pos < len(self._tokens) else None
+
+    def _next(self):
+        token = self._peek()
+        if token is None:
+            raise ValueError(_("Unexpected end of WKT"))
+        self._pos += 1
+        return token
+
+    def Geometries(self):
+        while self._peek() is not None:
+            yield self._geometry()
+
+    def _geometry(self):
+        name = self._next().upper()
+        if name not in _wktTypes:
+            raise ValueError(_("Unsupported WKT geometry <%s>") % name)
+        # dimension suffixes Z, M, ZM
+        while self._peek() and self._peek().upper() in ('Z', 'M', 'ZM'):
+            self._next()
+        if self._peek() and self._peek().upper() == 'EMPTY':
+            self._next()
+            if name == 'GEOMETRYCOLLECTION':
+                return {'type': 'GeometryCollection', 'geometries': []}
+            return {'type': _wktTypes[name], 'coordinates': []}
+        if name == 'GEOMETRYCOLLECTION':
+            geometries = []
+            self._expect('(')
+            while True:
+                geometries.append(self._geometry())
+                if self._next() == ')':
+                    break
+            return {'type': 'GeometryCollection', 'geometries': geometries}
+        coords = self._group()
+        if name == 'POINT':
+            coords = coords[0]
+        elif name == 'MULTIPOINT':
+            # both MULTIPOINT (1 2, 3 4) and MULTIPOINT ((1 2), (3 4))
+            coords = [point[0] if isinstance(point[0], list) else point for point in coords]
+        return {'type': _wktTypes[name], 'coordinates': coords}
+
+    def _expect(self, token):
+        if self._next() != token:
+            raise ValueError(_("Invalid WKT, '%s' expected") % token)
+
+    def _group(self):
+        """Parses parenthesized list of coordinates or groups"""
+        self._expect('(')
+        items = []
+        while True:
+            if self._peek() == '(':
+                items.append(self._group())
+            else:
+                vertex = []
+                while self._peek() not in (',', ')', None):
+                    vertex.append(float(self._next()))
+                items.append(vertex)
+            if self._next() == ')':
+                return items
+
+
+def ReadWKT(path):
+    """Yields (ftype, coords, properties) of geometries in WKT file,
+    properties are empty."""
+    with open(path) as f:
+        text = f.read()
+    for geometry in _WKTParser(text).Geometries():
+        for ftype, coords in _splitGeometry(geometry):
+            yield ftype, coords, {}
+
+
+def ReadFile(path):
+    """Reads GeoJSON or WKT file (recognized by extension .wkt or .txt)"""
+    if os.path.splitext(path)[1].lower() in ('.wkt', '.txt'):
+        return ReadWKT(path)
+    return ReadGeoJSON(path)
+
+
+def _exportVector(name, vtype, path):
+    """Exports features of type(s) vtype of vector map into GeoJSON file
+
+    :return: path or None when no file was written
+    """
+    gcore.run_command('v.out.ogr', input=name, type=vtype, output=path,
+                      format='GeoJSON', overwrite=True, quiet=True)
+    return path if os.path.exists(path) else None
+
+
+def ReadVector(name):
+    """Yields (ftype, coords, attributes) of areas, lines and points
+    of vector map.
+
+    The map is exported by a single v.out.ogr run into temporary GeoJSON
+    file which is parsed feature by feature. Types which are present
+    in the map (according to its topology) but were not written
+    (v.out.ogr can write only one type into a layer) are exported
+    separately.
+    """
+    if not gcore.find_file(name, element='vector')['name']:
+        raise ScriptError(_("Vector map <%s> not found") % name)
+    info = gvector.vector_info_topo(name)
+    # areas are exported only with centroids
+    present = [vtype for vtype, key in (('point', 'points'), ('line', 'lines'),
+                                        ('area', 'centroids')) if info.get(key)]
+    if not present:
+        return
+    directory = tempfile.mkdtemp(prefix='rdigit')
+    try:
+        seen = set()
+        try:
+            path = _exportVector(name, ','.join(present),
+                                 os.path.join(directory, 'features.geojson'))
+        except CalledModuleError:
+            # combination of types is not supported, types are exported separately
+            path = None
+        if path:
+            for feature in ReadGeoJSON(path):
+                seen.add(feature[0])
+                yield feature
+        for vtype in present:
+            if vtype in seen:
+                continue
+            try:
+                path = _exportVector(name, vtype,
+                                     os.path.join(directory, vtype + '.geojson'))
+            except CalledModuleError:
+                raise ScriptError(_("Failed to export vector map <%s>") % name)
+            if path:
+                for feature in ReadGeoJSON(path):
+                    yield feature
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def _toFloat(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def LoadFeatures(features, value=None, width=None, valueColumn=None, widthColumn=None):
+    """Collects features into columns.
+
+    :param features: iterable of (ftype, coords, properties)
+    :param value: cell value of features (when valueColumn is not given)
+    :param width: width of features (when widthColumn is not given)
+    :param valueColumn: property (attribute) with cell value
+    :param widthColumn: property (attribute) with width
+
+    :return: FeatureColumns
+    """
+    columns = FeatureColumns()
+    for ftype, coords, properties in features:
+        featureValue = _toFloat(properties.get(valueColumn)) if valueColumn else value
+        featureWidth = _toFloat(properties.get(widthColumn)) if widthColumn else width
+        columns.Add(ftype, coords, featureValue, featureWidth)
+    return columns
@@ -0,0 +1,381 @@
+"""
+@package rdigit.journal
+
+@brief Append-only journal of raster digitizer edits.
+
+Classes:
+ - journal::EditJournal
+ - journal::JournalState
+
+Every finished feature, undo, change of a feature and save
+is appended to a binary file after a header describing the edited
+raster map (region, backup, type of new map which was not written yet),
+so that unsaved features can be recovered after the GUI crashed.
+Records are collected in memory and written and synced in batches
+by a background thread.
+
+(C) 2014 by the GRASS Development Team
+This program is free software under the GNU General Public
+License (>=v2). Read the file COPYING that comes with GRASS
+for details.
+
+@author Anna Petrasova <kratochanna gmail.com>
+"""
+
+import os
+import struct
+import threading
+from array import array
+
+from rdigit.store import FEATURE_TYPES
+
+
+MAGIC = b'RDJ2'
+# north, south, east, west, rows, cols, length of backup raster name,
+# type of new raster map (index in MAP_TYPES + 1, 0 for existing map), null backup
+_header = struct.Struct('<4d2iHBB')
+MAP_TYPES = ('CELL', 'FCELL', 'DCELL')
+_op = struct.Struct('<B')
+# type, has value, value, width, west, south, east, north, number of vertices
+_add = struct.Struct('<BBdd4dI')
+_save = struct.Struct('<I')
+# position of feature in drawing order
+_remove = struct.Struct('<I')
+# position, has value, value
+_value = struct.Struct('<IBd')
+# position, new position
+_order = struct.Struct('<II')
+
+OP_ADD, OP_UNDO, OP_SAVE, OP_REMOVE, OP_VALUE, OP_ORDER = 1, 2, 3, 4, 5, 6
+
+
+def _toBytes(values):
+    """Returns content of array('d') as bytes (Python 2 and 3)"""
+    if hasattr(values, 'tobytes'):
+        return values.tobytes()
+    return values.tostring()
+
+
+def _extendFromBytes(values, data):
+    """Appends bytes to array('d') (Python 2 and 3)"""
+    if hasattr(values, 'frombytes'):
+        values.frombytes(data)
+    else:
+        values.fromstring(data)
+
+
+def SavedCountAfterMove(savedCount, old, new):
+    """Returns number of saved features (saved features are the first
+    ones in drawing order) after feature was moved from position old
+    to position new. Moved feature itself has to be exported again
+    if it ends up among the saved ones."""
+    if old < savedCount <= new:
+        return savedCount - 1
+    if new < savedCount <= old:
+        return savedCount + 1
+    return savedCount
+
+
+class JournalState:
+    """Result of replaying journal.
+
+    Features are kept in columns (see FeatureStore.Extend),
+    removedFeatures are saved features undone or removed after the last
+    save, given as (type, bbox, width), dirty are positions of saved
+    features changed after the last save.
+
+    For new raster map, mapType is its type and written tells if it was
+    saved since the journal was created (its content is the backup raster
+    map, or null cells when nullBackup, until then).
+    """
+    def __init__(self):
+        self.region = None
+        self.backupRaster = None
+        self.mapType = None
+        self.nullBackup = False
+        self.written = False
+        self.types = []
+        self.values = []
+        self.widths = []
+        self.counts = []
+        self.coords = array('d')
+        self.bboxes = array('d')
+        self.savedCount = 0
+        self.removedFeatures = []
+        self.dirty = []
+
+    def __len__(self):
+        return len(self.types)
+
+
+class EditJournal:
+    """Append-only journal of digitizer edits stored in a file.
+
+    Appending only packs the record into a buffer, the buffer is written
+    and synced to disk by a background thread every syncInterval seconds
+    or when Sync is called.
+    """
+    def __init__(self, path, syncInterval=1.0):
+        self._path = path
+        self._syncInterval = syncInterval
+        self._buffer = bytearray()
+        self._lock = threading.Lock()
+        self._wakeUp = threading.Event()
+        self._closed = threading.Event()
+        self._file = None
+        self._thread = None
+
+    def GetPath(self):
+        return self._path
+
+    def Exists(self):
+        return os.path.exists(self._path)
+
+    def Create(self, grid, backupRaster=None, mapType=None, nullBackup=False):
+        """Starts new journal, existing one is overwritten.
+
+        :param grid: RasterGrid of the computational region
+        :param backupRaster: name of backup raster map if any
+        :param mapType: type of new raster map which was not written yet,
+                        None for existing raster map
+        :param nullBackup: original content of raster map is null
+        """
+        name = (backupRaster or '').encode('utf-8')
+        directory = os.path.dirname(self._path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._file = open(self._path, 'wb')
+        self._buffer += MAGIC
+        self._buffer += _header.pack(grid.north, grid.south, grid.east, grid.west,
+                                     grid.rows, grid.cols, len(name),
+                                     MAP_TYPES.index(mapType) + 1 if mapType else 0,
+                                     bool(nullBackup))
+        self._buffer += name
+        self._startThread()
+        self.Sync()
+
+    def Append(self):
+        """Continues existing journal"""
+        self._file = open(self._path, 'ab')
+        self._startThread()
+
+    def _startThread(self):
+        self._closed.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while not self._closed.is_set():
+            self._wakeUp.wait(self._syncInterval)
+            self._wakeUp.clear()
+            self._write()
+
+    def _write(self):
+        with self._lock:
+            if not self._buffer or self._file is None:
+                return
+            data = bytes(self._buffer)
+            del self._buffer[:]
+            self._file.write(data)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def AddFeature(self, ftype, coords, value, width):
+        """Records finished feature.
+
+        :param coords: list of [x, y] or [x, y] for point
+        """
+        if ftype == 'point':
+            coords = [coords] if coords else []
+        flat = array('d')
+        for x, y in coords:
+            flat.extend((x, y))
+        if coords:
+            xs, ys = flat[0::2], flat[1::2]
+            bbox = (min(xs), min(ys), max(xs), max(ys))
+        else:
+            bbox = (0, 0, 0, 0)
+        with self._lock:
+            self._buffer += _op.pack(OP_ADD)
+            self._buffer += _add.pack(FEATURE_TYPES.index(ftype), value is not None,
+                                      value if value is not None else 0, width or 0,
+                                      bbox[0], bbox[1], bbox[2], bbox[3], len(coords))
+            self._buffer += _toBytes(flat)
+
+    def AddFeatures(self, columns):
+        """Records many finished features.
+
+        :param columns: features with attributes types, values, widths,
+                        counts, coords and bboxes (see FeatureStore.Extend)
+        """
+        coords = _toBytes(columns.coords)
+        bboxes = columns.bboxes
+        records = bytearray()
+        start = 0
+        for i, ftype in enumerate(columns.types):
+            value = columns.values[i]
+            count = columns.counts[i]
+            records += _op.pack(OP_ADD)
+            records += _add.pack(FEATURE_TYPES.index(ftype), value is not None,
+                                 value if value is not None else 0, columns.widths[i] or 0,
+                                 bboxes[4 * i], bboxes[4 * i + 1],
+                                 bboxes[4 * i + 2], bboxes[4 * i + 3], count)
+            records += coords[start:start + 16 * count]
+            start += 16 * count
+        with self._lock:
+            self._buffer += records
+
+    def Undo(self):
+        """Records removal of the last feature"""
+        with self._lock:
+            self._buffer += _op.pack(OP_UNDO)
+
+    def Remove(self, position):
+        """Records removal of feature at position in drawing order"""
+        with self._lock:
+            self._buffer += _op.pack(OP_REMOVE) + _remove.pack(position)
+
+    def SetValue(self, position, value):
+        """Records change of cell value of feature at position"""
+        with self._lock:
+            self._buffer += _op.pack(OP_VALUE) + _value.pack(position, value is not None,
+                                                            value if value is not None else 0)
+
+    def SetDrawOrder(self, position, newPosition):
+        """Records move of feature in drawing order"""
+        with self._lock:
+            self._buffer += _op.pack(OP_ORDER) + _order.pack(position, newPosition)
+
+    def Save(self, count):
+        """Records that first count features were written to raster map
+        and syncs the journal."""
+        with self._lock:
+            self._buffer += _op.pack(OP_SAVE) + _save.pack(count)
+        self.Sync()
+
+    def Sync(self):
+        """Writes and syncs buffered records immediately"""
+        self._write()
+
+    def Close(self):
+        if self._file is None:
+            return
+        self._closed.set()
+        self._wakeUp.set()
+        self._thread.join()
+        self._write()
+        self._file.close()
+        self._file = None
+
+    def Discard(self):
+        """Closes and removes the journal"""
+        self.Close()
+        with self._lock:
+            del self._buffer[:]
+        if os.path.exists(self._path):
+            os.remove(self._path)
+
+    def Read(self):
+        """Replays journal.
+
+        Incomplete record at the end (interrupted write) is ignored.
+
+        :return: JournalState or None if the journal is not valid
+        """
+        with open(self._path, 'rb') as f:
+            data = f.read()
+        if data[:len(MAGIC)] != MAGIC or len(data) < len(MAGIC) + _header.size:
+            return None
+        state = JournalState()
+        pos = len(MAGIC)
+        header = _header.unpack_from(data, pos)
+        pos += _header.size
+        state.region = header[:6]
+        state.backupRaster = data[pos:pos + header[6]].decode('utf-8') or None
+        state.mapType = MAP_TYPES[header[7] - 1] if header[7] else None
+        state.nullBackup = bool(header[8])
+        pos += header[6]
+
+        # features still present: [add fields, vertices position, value, dirty]
+        features = []
+        savedCount = 0
+        removed = []
+        size = len(data)
+        unpackAdd = _add.unpack_from
+        addSize = _add.size
+        while pos < size:
+            op = _op.unpack_from(data, pos)[0]
+            pos += 1
+            if op == OP_ADD:
+                if pos + addSize > size:
+                    break
+                record = unpackAdd(data, pos)
+                pos += addSize
+                end = pos + 16 * record[-1]
+                if end > size:
+                    break
+                features.append([record, pos, record[2] if record[1] else None, False])
+                pos = end
+            elif op == OP_UNDO:
+                if not features:
+                    continue
+                record = features.pop()[0]
+                if len(features) < savedCount:
+                    savedCount = len(features)
+                    removed.append((FEATURE_TYPES[record[0]], record[4:8], record[3]))
+            elif op == OP_REMOVE:
+                if pos + _remove.size > size:
+                    break
+                index = _remove.unpack_from(data, pos)[0]
+                pos += _remove.size
+                if index >= len(features):
+                    continue
+                record = features.pop(index)[0]
+                if index < savedCount:
+                    savedCount -= 1
+                    removed.append((FEATURE_TYPES[record[0]], record[4:8], record[3]))
+            elif op == OP_VALUE:
+                if pos + _value.size > size:
+                    break
+                index, hasValue, value = _value.unpack_from(data, pos)
+                pos += _value.size
+                if index >= len(features):
+                    continue
+                features[index][2] = value if hasValue else None
+                features[index][3] = True
+            elif op == OP_ORDER:
+                if pos + _order.size > size:
+                    break
+                index, newIndex = _order.unpack_from(data, pos)
+                pos += _order.size
+                if index >= len(features) or newIndex >= len(features):
+                    continue
+                feature = features.pop(index)
+                features.insert(newIndex, feature)
+                savedCount = SavedCountAfterMove(savedCount, index, newIndex)
+                feature[3] = True
+            elif op == OP_SAVE:
+                if pos + _save.size > size:
+                    break
+                savedCount = min(_save.unpack_from(data, pos)[0], len(features))
+                pos += _save.size
+                state.written = True
+                removed = []
+                for feature in features:
+                    feature[3] = False
+            else:
+                break
+
+        for index, (record, start, value, dirty) in enumerate(features):
+            state.types.append(FEATURE_TYPES[record[0]])
+            state.values.append(value)
+            state.widths.append(record[3])
+            state.counts.append(record[-1])
+            state.bboxes.extend(record[4:8])
+            _extendFromBytes(state.coords, data[start:start + 16 * record[-1]])
+            if dirty and index < savedCount:
+                state.dirty.append(index)
+        state.savedCount = savedCount
+        state.removedFeatures = removed
+        return state
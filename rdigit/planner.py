@@ -0,0 +1,91 @@
+"""
+@package rdigit.planner
+
+@brief Grouping of digitized features into rasterization batches.
+
+Classes:
+ - planner::FeatureBatch
+ - planner::BatchPlanner
+
+(C) 2014 by the GRASS Development Team
+This program is free software under the GNU General Public
+License (>=v2). Read the file COPYING that comes with GRASS
+for details.
+
+@author Anna Petrasova <kratochanna gmail.com>
+"""
+
+from rdigit.rasterizer import UnionBBox, BBoxIntersects
+
+
+class FeatureBatch:
+    """Features rasterized together, in drawing order."""
+    def __init__(self, key):
+        self.key = key
+        self.features = []
+        self.bboxes = []
+        self.bbox = None
+
+    def Add(self, feature, bbox):
+        self.features.append(feature)
+        self.bboxes.append(bbox)
+        self.bbox = UnionBBox(self.bbox, bbox)
+
+    def Overlaps(self, bbox):
+        """Checks if any feature of the batch overlaps bbox"""
+        if not BBoxIntersects(self.bbox, bbox):
+            return False
+        for each in self.bboxes:
+            if BBoxIntersects(each, bbox):
+                return True
+        return False
+
+
+class BatchPlanner:
+    """Groups features with the same key (e.g. cell value and width)
+    into batches while keeping the result of last-drawn-wins order.
+
+    Feature can join an earlier batch with the same key only when
+    it does not overlap any feature of the batches created after
+    that batch, so moving it back in drawing order does not change
+    the result. Batches are returned in the order in which they
+    have to be patched (later batches overwrite earlier ones).
+
+    Bounding boxes are compared snapped to cells of the grid, features
+    with disjoint bounding boxes can still write the same cell.
+    """
+    def __init__(self, grid=None, maxLookback=64):
+        """
+        :param grid: RasterGrid features are rasterized to,
+                     None to compare bounding boxes as they are
+        :param maxLookback: maximum number of batches searched back,
+                            limits planning time for many batches
+        """
+        self._batches = []
+        self._grid = grid
+        self._maxLookback = maxLookback
+
+    def AddFeature(self, feature, key, bbox):
+        """Adds feature, features have to be added in drawing order.
+
+        :param feature: feature (any object)
+        :param key: features with equal keys can be rasterized together
+        :param bbox: bounding box of the feature including buffer width
+        """
+        if bbox and self._grid:
+            bbox = self._grid.SnapBBox(bbox)
+        searched = 0
+        for batch in reversed(self._batches):
+            if batch.key == key:
+                batch.Add(feature, bbox)
+                return
+            searched += 1
+            if searched >= self._maxLookback or batch.Overlaps(bbox):
+                break
+        batch = FeatureBatch(key)
+        batch.Add(feature, bbox)
+        self._batches.append(batch)
+
+    def GetBatches(self):
+        """Returns list of FeatureBatch instances"""
+        return self._batches
@@ -0,0 +1,118 @@
+"""
+@package rdigit.preview
+
+@brief Preview of rasterized features at display resolution.
+
+Classes:
+ - preview::FeaturePreview
+
+(C) 2014 by the GRASS Development Team
+This program is free software under the GNU General Public
+License (>=v2). Read the file COPYING that comes with GRASS
+for details.
+
+@author Anna Petrasova <kratochanna gmail.com>
+"""
+
+import math
+
+from rdigit.rasterizer import FeatureRasterizer
+
+try:
+    import numpy as np
+except ImportError:
+    pass
+
+
+class FeaturePreview:
+    """Features rasterized for display.
+
+    Grid of the preview is aligned to the cells of the computational
+    region and covers the displayed extent. When there are more cells
+    than pixels, blocks of cells are merged, so the preview has about
+    the resolution of the display. Features are rasterized incrementally,
+    only features added since the last update are burned in.
+    """
+    def __init__(self):
+        self._grid = None
+        self._rasterizer = None
+        # number of features (in drawing order) already rasterized
+        self._count = 0
+        self._changed = False
+
+    @staticmethod
+    def GetDisplayGrid(region, bbox, width, height):
+        """Returns grid for displayed extent.
+
+        :param region: RasterGrid of the computational region
+        :param bbox: displayed extent (west, south, east, north)
+        :param width: width of display in pixels
+        :param height: height of display in pixels
+
+        :return: RasterGrid or None if the extent is outside of region
+        """
+        window = region.Window(bbox)
+        if window is None:
+            return None
+        factor = max(1, int(math.ceil(window.rows / float(max(height, 1)))),
+                     int(math.ceil(window.cols / float(max(width, 1)))))
+        if factor > 1:
+            window = window.Coarsen(factor)
+        return window
+
+    def GetGrid(self):
+        return self._grid
+
+    def SetGrid(self, grid):
+        """Sets grid, features are rasterized again if it changed"""
+        if self._grid and grid and \
+                (grid.north, grid.south, grid.east, grid.west, grid.rows, grid.cols) == \
+                (self._grid.north, self._grid.south, self._grid.east, self._grid.west,
+                 self._grid.rows, self._grid.cols):
+            return
+        self._grid = grid
+        self.Invalidate()
+
+    def Invalidate(self):
+        """Forgets rasterized features (e.g. when a feature was removed)"""
+        self._rasterizer = FeatureRasterizer(self._grid) if self._grid else None
+        self._count = 0
+        self._changed = True
+
+    def Update(self, store, end=None):
+        """Rasterizes features added to store since the last update.
+
+        :param store: FeatureStore
+        :param end: number of features to show (e.g. without the feature
+                    being digitized), defaults to all
+
+        :return: True if preview changed
+        """
+        if self._rasterizer is None:
+            return False
+        if end is None:
+            end = len(store)
+        if end < self._count:
+            self.Invalidate()
+        for fid in store.GetIds(self._count, end):
+            if store.GetNumberOfVertices(fid):
+                self._rasterizer.AddFeature(store.GetType(fid), store.GetCoords(fid),
+                                            store.GetValue(fid), store.GetWidth(fid))
+                self._changed = True
+        self._count = end
+        changed = self._changed
+        self._changed = False
+        return changed
+
+    def GetImageData(self, color, alpha):
+        """Returns RGB and alpha arrays of the preview.
+
+        :param color: (red, green, blue) of rasterized cells
+        :param alpha: opacity (0-255) of rasterized cells
+        """
+        mask = self._rasterizer.GetMask()
+        rgb = np.zeros(mask.shape + (3,), dtype=np.uint8)
+        rgb[mask] = color[:3]
+        opacity = np.zeros(mask.shape, dtype=np.uint8)
+        opacity[mask] = alpha
+        return rgb, opacity
@@ -0,0 +1,800 @@
+"""
+@package rdigit.rasterizer
+
+@brief In-process rasterization of digitized features.
+
+Features are burned into NumPy arrays aligned to the computational
+region and the result is patched over the base raster map row by row,
+so that saving does not need r.in.poly, r.grow and r.patch runs.
+
+Classes:
+ - rasterizer::RasterGrid
+ - rasterizer::FeatureRasterizer
+
+Independent batches of features can be rasterized in parallel
+in a pool of worker processes (see RasterizeBatches), the pool is
+kept for following saves until TerminatePool is called.
+
+(C) 2014 by the GRASS Development Team
+This program is free software under the GNU General Public
+License (>=v2). Read the file COPYING that comes with GRASS
+for details.
+
+@author Anna Petrasova <kratochanna gmail.com>
+"""
+
+import math
+import threading
+import multiprocessing
+
+try:
+    import numpy as np
+    haveNumpy = True
+except ImportError:
+    haveNumpy = False
+
+
+class RasterGrid:
+    """Cell grid of a computational region (or of a part of it)."""
+    def __init__(self, north, south, east, west, rows, cols):
+        self.north = float(north)
+        self.south = float(south)
+        self.east = float(east)
+        self.west = float(west)
+        self.rows = int(rows)
+        self.cols = int(cols)
+        self.nsres = (self.north - self.south) / self.rows
+        self.ewres = (self.east - self.west) / self.cols
+        # position of the grid in the parent grid (see Window)
+        self.rowOffset = 0
+        self.colOffset = 0
+
+    @staticmethod
+    def FromRegion(region):
+        """Creates grid from region dictionary (see grass.script.region)"""
+        return RasterGrid(north=region['n'], south=region['s'],
+                          east=region['e'], west=region['w'],
+                          rows=region['rows'], cols=region['cols'])
+
+    def ToGrid(self, east, north):
+        """Converts map coordinates to fractional (column, row) coordinates.
+        Cell (row, col) covers [col, col + 1) x [row, row + 1).
+        """
+        return (east - self.west) / self.ewres, (self.north - north) / self.nsres
+
+    def GetShape(self):
+        return self.rows, self.cols
+
+    def Expand(self, rows, cols):
+        """Returns grid larger by given number of rows and columns
+        on each side (not clipped)."""
+        grid = RasterGrid(north=self.north + rows * self.nsres,
+                          south=self.south - rows * self.nsres,
+                          east=self.east + cols * self.ewres,
+                          west=self.west - cols * self.ewres,
+                          rows=self.rows + 2 * rows, cols=self.cols + 2 * cols)
+        grid.nsres = self.nsres
+        grid.ewres = self.ewres
+        grid.rowOffset = self.rowOffset - rows
+        grid.colOffset = self.colOffset - cols
+        return grid
+
+    def Coarsen(self, factor):
+        """Returns grid with blocks of factor x factor cells merged
+        into one cell, covering at least extent of this grid."""
+        rows = int(math.ceil(self.rows / float(factor)))
+        cols = int(math.ceil(self.cols / float(factor)))
+        return RasterGrid(north=self.north,
+                          south=self.north - rows * factor * self.nsres,
+                          east=self.west + cols * factor * self.ewres,
+                          west=self.west, rows=rows, cols=cols)
+
+    def SnapBBox(self, bbox, margin=1):
+        """Returns bounding box extended to edges of cells of this grid
+        and by margin cells on each side (not clipped).
+
+        Features with snapped bounding boxes not overlapping
+        cannot write the same cell.
+        """
+        west, south, east, north = bbox
+        col0 = math.floor((west - self.west) / self.ewres) - margin
+        col1 = math.ceil((east - self.west) / self.ewres) + margin
+        row0 = math.floor((self.north - north) / self.nsres) - margin
+        row1 = math.ceil((self.north - south) / self.nsres) + margin
+        return (self.west + col0 * self.ewres, self.north - row1 * self.nsres,
+                self.west + col1 * self.ewres, self.north - row0 * self.nsres)
+
+    def Window(self, bbox):
+        """Returns part of the grid covering bounding box.
+
+        Window is aligned to the cells of this grid and clipped to it.
+        Row and column offsets of the window are relative to the
+        top-level grid.
+
+        :param bbox: tuple (west, south, east, north)
+
+        :return: RasterGrid instance or None if bbox is outside
+        """
+        west, south, east, north = bbox
+        # one cell margin for features touching cell edges
+        col0 = max(int(math.floor((west - self.west) / self.ewres)) - 1, 0)
+        col1 = min(int(math.ceil((east - self.west) / self.ewres)) + 1, self.cols)
+        row0 = max(int(math.floor((self.north - north) / self.nsres)) - 1, 0)
+        row1 = min(int(math.ceil((self.north - south) / self.nsres)) + 1, self.rows)
+        if col0 >= col1 or row0 >= row1:
+            return None
+        window = RasterGrid(north=self.north - row0 * self.nsres,
+                            south=self.north - row1 * self.nsres,
+                            east=self.west + col1 * self.ewres,
+                            west=self.west + col0 * self.ewres,
+                            rows=row1 - row0, cols=col1 - col0)
+        window.nsres = self.nsres
+        window.ewres = self.ewres
+        window.rowOffset = self.rowOffset + row0
+        window.colOffset = self.colOffset + col0
+        return window
+
+
+def FeatureBBox(ftype, coords, width=None):
+    """Returns bounding box (west, south, east, north) of feature
+    including its buffer width or None for empty feature."""
+    if not coords:
+        return None
+    if ftype == 'point':
+        xs, ys = [coords[0]], [coords[1]]
+    else:
+        xs = [c[0] for c in coords]
+        ys = [c[1] for c in coords]
+    width = width or 0
+    return (min(xs) - width, min(ys) - width,
+            max(xs) + width, max(ys) + width)
+
+
+def UnionBBox(bbox1, bbox2):
+    """Returns union of two bounding boxes, any of them can be None"""
+    if bbox1 is None:
+        return bbox2
+    if bbox2 is None:
+        return bbox1
+    return (min(bbox1[0], bbox2[0]), min(bbox1[1], bbox2[1]),
+            max(bbox1[2], bbox2[2]), max(bbox1[3], bbox2[3]))
+
+
+def BBoxIntersects(bbox1, bbox2):
+    """Checks if two bounding boxes overlap"""
+    if bbox1 is None or bbox2 is None:
+        return False
+    return not (bbox1[2] < bbox2[0] or bbox2[2] < bbox1[0] or
+                bbox1[3] < bbox2[1] or bbox2[3] < bbox1[1])
+
+
+def _polygonMask(grid, coords):
+    """Scanline fill of polygon. Cells with center inside are filled.
+
+    :return: tuple (row offset, column offset, boolean mask) or None
+    """
+    if len(coords) < 3:
+        return None
+    pts = np.array(coords, dtype=np.float64)
+    xs = (pts[:, 0] - grid.west) / grid.ewres
+    ys = (grid.north - pts[:, 1]) / grid.nsres
+    x0, y0 = xs, ys
+    x1, y1 = np.roll(xs, -1), np.roll(ys, -1)
+    # rows whose center lies in [min(y0, y1), max(y0, y1))
+    ymin = np.minimum(y0, y1)
+    ymax = np.maximum(y0, y1)
+    rlo = np.maximum(np.ceil(ymin - 0.5), 0).astype(np.int64)
+    rhi = np.minimum(np.ceil(ymax - 0.5) - 1, grid.rows - 1).astype(np.int64)
+    counts = np.maximum(rhi - rlo + 1, 0)
+    total = int(counts.sum())
+    if total == 0:
+        return None
+    edges = np.repeat(np.arange(len(counts)), counts)
+    starts = np.cumsum(counts) - counts
+    rows = rlo[edges] + (np.arange(total) - starts[edges])
+    yc = rows + 0.5
+    e0x, e0y, e1x, e1y = x0[edges], y0[edges], x1[edges], y1[edges]
+    xc = e0x + (yc - e0y) * (e1x - e0x) / (e1y - e0y)
+    order = np.lexsort((xc, rows))
+    rows = rows[order]
+    xc = xc[order]
+    # pairs of crossings enclose the inner spans (even-odd rule)
+    spanRows = rows[0::2]
+    c0 = np.ceil(xc[0::2] - 0.5).astype(np.int64)
+    c1 = np.floor(xc[1::2] - 0.5).astype(np.int64)
+    c0 = np.maximum(c0, 0)
+    c1 = np.minimum(c1, grid.cols - 1)
+    valid = c0 <= c1
+    if not valid.any():
+        return None
+    spanRows, c0, c1 = spanRows[valid], c0[valid], c1[valid]
+    row0, row1 = spanRows.min(), spanRows.max()
+    col0, col1 = c0.min(), c1.max()
+    width = col1 - col0 + 1
+    diff = np.zeros((row1 - row0 + 1, width + 1), dtype=np.int32)
+    np.add.at(diff, (spanRows - row0, c0 - col0), 1)
+    np.add.at(diff, (spanRows - row0, c1 + 1 - col0), -1)
+    mask = np.cumsum(diff, axis=1)[:, :width] > 0
+    return int(row0), int(col0), mask
+
+
+def _cellsMask(grid, rows, cols):
+    """Creates window mask from lists of cell indices, cells outside
+    of grid are ignored.
+    """
+    inside = (rows >= 0) & (rows < grid.rows) & (cols >= 0) & (cols < grid.cols)
+    if not inside.any():
+        return None
+    rows, cols = rows[inside], cols[inside]
+    row0, col0 = rows.min(), cols.min()
+    mask = np.zeros((rows.max() - row0 + 1, cols.max() - col0 + 1), dtype=bool)
+    mask[rows - row0, cols - col0] = True
+    return int(row0), int(col0), mask
+
+
+def _lineMask(grid, coords):
+    """Rasterizes polyline, consecutive vertices are connected
+    by 8-connected cell segments.
+    """
+    if len(coords) == 1:
+        return _pointMask(grid, coords[0])
+    if not coords:
+        return None
+    pts = np.array(coords, dtype=np.float64)
+    cols = np.floor((pts[:, 0] - grid.west) / grid.ewres).astype(np.int64)
+    rows = np.floor((grid.north - pts[:, 1]) / grid.nsres).astype(np.int64)
+    dc = np.diff(cols)
+    dr = np.diff(rows)
+    steps = np.maximum(np.abs(dc), np.abs(dr))
+    counts = steps + 1
+    total = int(counts.sum())
+    segs = np.repeat(np.arange(len(steps)), counts)
+    starts = np.cumsum(counts) - counts
+    t = np.arange(total) - starts[segs]
+    frac = t / np.maximum(steps[segs], 1).astype(np.float64)
+    lineCols = np.floor(cols[segs] + frac * dc[segs] + 0.5).astype(np.int64)
+    lineRows = np.floor(rows[segs] + frac * dr[segs] + 0.5).astype(np.int64)
+    return _cellsMask(grid, lineRows, lineCols)
+
+
+def _pointMask(grid, coords):
+    """Rasterizes point to the cell it falls into."""
+    col = int(math.floor((coords[0] - grid.west) / grid.ewres))
+    row = int(math.floor((grid.north - coords[1]) / grid.nsres))
+    return _cellsMask(grid, np.array([row]), np.array([col]))
+
+
+def _runsMask(grid, coords):
+    """Rasterizes runs of cells, each run is given by centers
+    of its first and last cell.
+    """
+    if len(coords) < 2:
+        return None
+    pts = np.array(coords[:len(coords) // 2 * 2], dtype=np.float64)
+    rows = np.floor((grid.north - pts[0::2, 1]) / grid.nsres).astype(np.int64)
+    c0 = np.floor((pts[0::2, 0] - grid.west) / grid.ewres).astype(np.int64)
+    c1 = np.floor((pts[1::2, 0] - grid.west) / grid.ewres).astype(np.int64)
+    c0 = np.maximum(c0, 0)
+    c1 = np.minimum(c1, grid.cols - 1)
+    valid = (rows >= 0) & (rows < grid.rows) & (c0 <= c1)
+    if not valid.any():
+        return None
+    rows, c0, c1 = rows[valid], c0[valid], c1[valid]
+    row0, col0 = rows.min(), c0.min()
+    width = c1.max() - col0 + 1
+    diff = np.zeros((rows.max() - row0 + 1, width + 1), dtype=np.int32)
+    np.add.at(diff, (rows - row0, c0 - col0), 1)
+    np.add.at(diff, (rows - row0, c1 + 1 - col0), -1)
+    mask = np.cumsum(diff, axis=1)[:, :width] > 0
+    return int(row0), int(col0), mask
+
+
+def FeatureMask(grid, ftype, coords):
+    """Rasterizes single feature into boolean mask.
+
+    :param grid: RasterGrid instance
+    :param ftype: feature type ('area', 'line', 'point' or 'cells')
+    :param coords: coordinates as stored in GraphicsSetItem
+
+    :return: tuple (row offset, column offset, mask) or None when
+             the feature does not cover any cell of the grid
+    """
+    if not coords:
+        return None
+    if ftype == 'area':
+        return _polygonMask(grid, coords)
+    elif ftype == 'line':
+        return _lineMask(grid, coords)
+    elif ftype == 'point':
+        return _pointMask(grid, coords)
+    elif ftype == 'cells':
+        return _runsMask(grid, coords)
+    return None
+
+
+# disk kernels for growing, key is (radius, nsres, ewres)
+_diskKernels = {}
+
+
+def DiskKernel(radius, nsres, ewres):
+    """Returns disk kernel for growing by radius in map units.
+
+    Kernel is represented by half widths (in columns) of its rows,
+    row offsets go from -n to n. Cells are included when the distance
+    of cell centers is not greater than radius, as in r.grow -m.
+    Non-square cells are taken into account.
+
+    :return: list of half widths
+    """
+    key = (radius, nsres, ewres)
+    if key not in _diskKernels:
+        drMax = int(radius / nsres + 1e-9)
+        halfWidths = []
+        for dr in range(-drMax, drMax + 1):
+            rest = max(radius ** 2 - (dr * nsres) ** 2, 0)
+            halfWidths.append(int(math.sqrt(rest) / ewres + 1e-9))
+        _diskKernels[key] = halfWidths
+    return _diskKernels[key]
+
+
+def GrowMask(mask, halfWidths):
+    """Grows mask by disk kernel (see DiskKernel).
+
+    Disk is convex, so each kernel row is a horizontal dilation
+    computed from cumulative sums, shifted by the row offset.
+
+    :return: grown mask, larger by len(halfWidths) // 2 rows and
+             max(halfWidths) columns on each side
+    """
+    drMax = len(halfWidths) // 2
+    hwMax = max(halfWidths)
+    rows, cols = mask.shape
+    height, width = rows + 2 * drMax, cols + 2 * hwMax
+    padded = np.zeros((rows, width), dtype=np.int32)
+    padded[:, hwMax:hwMax + cols] = mask
+    sums = np.zeros((rows, width + 1), dtype=np.int32)
+    np.cumsum(padded, axis=1, out=sums[:, 1:])
+    index = np.arange(width)
+    dilated = {}
+    grown = np.zeros((height, width), dtype=bool)
+    for i, hw in enumerate(halfWidths):
+        if hw not in dilated:
+            right = np.minimum(index + hw + 1, width)
+            left = np.maximum(index - hw, 0)
+            dilated[hw] = (sums[:, right] - sums[:, left]) > 0
+        # kernel row offset dr = i - drMax, rows are shifted by -dr
+        shift = 2 * drMax - i
+        grown[shift:shift + rows] |= dilated[hw]
+    return grown
+
+
+class FeatureRasterizer:
+    """Burns features into value array in drawing order,
+    later features overwrite earlier ones."""
+    def __init__(self, grid):
+        self._grid = grid
+        self._values = np.zeros(grid.GetShape(), dtype=np.float64)
+        self._mask = np.zeros(grid.GetShape(), dtype=bool)
+        self._minValue = None
+        self._maxValue = None
+
+    def AddFeature(self, ftype, coords, value, width=None):
+        """Rasterizes feature.
+
+        :param ftype: 'area', 'line' or 'point'
+        :param coords: feature coordinates
+        :param value: cell value
+        :param width: buffer width in map units (lines and points)
+
+        :return: True if any cell was written
+        """
+        return self.AddFeatures([(ftype, coords)], value, width)
+
+    def AddFeatures(self, features, value, width=None):
+        """Rasterizes features with the same value and width.
+
+        :param features: list of tuples (ftype, coords)
+
+        :return: True if any cell was written
+        """
+        if value is None:
+            return False
+        if width:
+            # grow each feature in its own window, features outside
+            # of the grid can still grow into it
+            halfWidths = DiskKernel(width, self._grid.nsres, self._grid.ewres)
+            drMax = len(halfWidths) // 2
+            hwMax = max(halfWidths)
+            grid = self._grid.Expand(drMax, hwMax)
+            written = False
+            for ftype, coords in features:
+                ret = FeatureMask(grid, ftype, coords)
+                if ret is None:
+                    continue
+                row, col, local = ret
+                grown = GrowMask(local, halfWidths)
+                # position in self._grid
+                row -= 2 * drMax
+                col -= 2 * hwMax
+                r0, c0 = max(row, 0), max(col, 0)
+                r1 = min(row + grown.shape[0], self._grid.rows)
+                c1 = min(col + grown.shape[1], self._grid.cols)
+                if r0 >= r1 or c0 >= c1:
+                    continue
+                grown = grown[r0 - row:r1 - row, c0 - col:c1 - col]
+                self._values[r0:r1, c0:c1][grown] = value
+                self._mask[r0:r1, c0:c1] |= grown
+                written = True
+            if not written:
+                return False
+        else:
+            written = False
+            for ftype, coords in features:
+                if ftype == 'cells':
+                    written = self._addRuns(coords, value) or written
+                    continue
+                ret = FeatureMask(self._grid, ftype, coords)
+                if ret is None:
+                    continue
+                row, col, local = ret
+                rows = slice(row, row + local.shape[0])
+                cols = slice(col, col + local.shape[1])
+                self._values[rows, cols][local] = value
+                self._mask[rows, cols] |= local
+                written = True
+            if not written:
+                return False
+        if self._minValue is None or value < self._minValue:
+            self._minValue = value
+        if self._maxValue is None or value > self._maxValue:
+            self._maxValue = value
+        return True
+
+    def _addRuns(self, coords, value):
+        """Writes runs of cells (feature type 'cells') directly into arrays
+
+        :return: True if any cell was written
+        """
+        grid = self._grid
+        written = False
+        for start, end in zip(coords[0::2], coords[1::2]):
+            row = int(math.floor((grid.north - start[1]) / grid.nsres))
+            col0 = max(int(math.floor((start[0] - grid.west) / grid.ewres)), 0)
+            col1 = min(int(math.floor((end[0] - grid.west) / grid.ewres)), grid.cols - 1)
+            if 0 <= row < grid.rows and col0 <= col1:
+                self._values[row, col0:col1 + 1] = value
+                self._mask[row, col0:col1 + 1] = True
+                written = True
+        return written
+
+    def GetGrid(self):
+        return self._grid
+
+    def GetValues(self):
+        """Returns array of values, valid only where mask is set"""
+        return self._values
+
+    def GetMask(self):
+        """Returns boolean array of written cells"""
+        return self._mask
+
+    def GetRange(self):
+        """Returns range (min, max) of written values or None"""
+        if self._minValue is None:
+            return None
+        return self._minValue, self._maxValue
+
+    def Merge(self, other):
+        """Writes result of other rasterizer over this one.
+
+        Grid of the other rasterizer has to be a window of this grid
+        (see RasterGrid.Window).
+        """
+        grid = other.GetGrid()
+        row = grid.rowOffset - self._grid.rowOffset
+        col = grid.colOffset - self._grid.colOffset
+        rows = slice(row, row + grid.rows)
+        cols = slice(col, col + grid.cols)
+        mask = other.GetMask()
+        self._values[rows, cols][mask] = other.GetValues()[mask]
+        self._mask[rows, cols] |= mask
+        valueRange = other.GetRange()
+        if valueRange:
+            if self._minValue is None or valueRange[0] < self._minValue:
+                self._minValue = valueRange[0]
+            if self._maxValue is None or valueRange[1] > self._maxValue:
+                self._maxValue = valueRange[1]
+
+
+def _rasterizeBatch(args):
+    """Rasterizes batch in its own window (worker function).
+
+    :param args: tuple (window, features, width), features are
+                 tuples (ftype, coords, value)
+    """
+    window, features, width = args
+    rasterizer = FeatureRasterizer(window)
+    if width:
+        rasterizer.AddFeatures([(ftype, coords) for ftype, coords, value in features],
+                               value=features[0][2], width=width)
+    else:
+        for ftype, coords, value in features:
+            rasterizer.AddFeature(ftype, coords, value)
+    return rasterizer
+
+
+# smaller number of cells of batch windows is rasterized
+# in the current process, starting workers would take longer
+MIN_PARALLEL_CELLS = 250000
+
+# pool of worker processes shared by exports
+_pool = None
+_poolSize = 0
+_poolLock = threading.Lock()
+
+
+def _getPool(workers):
+    """Returns pool of worker processes, it is created when there is none
+    or it has different number of workers"""
+    global _pool, _poolSize
+    if _pool is None or _poolSize != workers:
+        _terminatePool()
+        _pool = multiprocessing.Pool(processes=workers)
+        _poolSize = workers
+    return _pool
+
+
+def _terminatePool():
+    global _pool, _poolSize
+    if _pool is not None:
+        _pool.terminate()
+        _pool = None
+        _poolSize = 0
+
+
+def TerminatePool():
+    """Stops worker processes used by RasterizeBatches"""
+    with _poolLock:
+        _terminatePool()
+
+
+def RasterizeBatches(grid, batches, workers=1, progress=None, results=None):
+    """Rasterizes batches of features, later batches overwrite
+    earlier ones. Large batches are rasterized in parallel in a pool
+    of worker processes and merged in their order.
+
+    :param grid: RasterGrid instance
+    :param batches: list of tuples (features, width), features are
+                    tuples (ftype, coords, value), buffered batches
+                    have to have the same value
+    :param workers: maximum number of worker processes, 1 for
+                    rasterizing in the current process
+    :param progress: function called with number of rasterized batches
+    :param results: list with an item (None) for each batch, results of
+                    rasterized batches are kept in it and batches which
+                    already have a result are not rasterized again
+                    (e.g. when rasterization was interrupted)
+
+    :return: FeatureRasterizer instance
+    """
+    keep = results is not None
+    if not keep:
+        results = [None] * len(batches)
+    jobs = []
+    for index, (features, width) in enumerate(batches):
+        if results[index] is not None:
+            continue
+        # features without vertices (e.g. unfinished point) are skipped
+        features = [feature for feature in features if feature[1]]
+        bbox = None
+        for ftype, coords, value in features:
+            bbox = UnionBBox(bbox, FeatureBBox(ftype, coords, width))
+        window = grid.Window(bbox) if bbox else None
+        if window:
+            jobs.append((index, (window, features, width)))
+        else:
+            # nothing to rasterize
+            results[index] = False
+
+    rasterizer = FeatureRasterizer(grid)
+    state = {'merged': 0, 'done': len(batches) - len(jobs)}
+
+    def merge():
+        # merge in the order of batches
+        while state['merged'] < len(results) and results[state['merged']] is not None:
+            if results[state['merged']]:
+                rasterizer.Merge(results[state['merged']])
+                if not keep:
+                    results[state['merged']] = False
+            state['merged'] += 1
+
+    def finished(index, result):
+        results[index] = result
+        state['done'] += 1
+        merge()
+        if progress:
+            progress(state['done'])
+
+    # batches rasterized before
+    merge()
+    cells = sum(job[0].rows * job[0].cols for index, job in jobs)
+    if min(workers, len(jobs)) > 1 and cells >= MIN_PARALLEL_CELLS:
+        with _poolLock:
+            pool = _getPool(workers)
+            try:
+                # imap keeps the order of batches
+                output = pool.imap(_rasterizeBatch, [job for index, job in jobs])
+                for (index, job), result in zip(jobs, output):
+                    finished(index, result)
+            except BaseException:
+                # stop batches still being rasterized (e.g. cancelled)
+                _terminatePool()
+                raise
+    else:
+        for index, job in jobs:
+            finished(index, _rasterizeBatch(job))
+    return rasterizer
+
+
+# null value of integer raster maps
+CELL_NULL = -2147483648
+
+
+def CanAccessRasters():
+    """Checks if raster maps can be read and written in process (pygrass)"""
+    try:
+        from grass.pygrass.raster import RasterRow
+    except (ImportError, OSError):
+        return False
+    return True
+
+
+def _openRaster(name):
+    from grass.pygrass.raster import RasterRow
+
+    name, mapset = (name.split('@') + [''])[:2]
+    raster = RasterRow(name, mapset=mapset)
+    raster.open('r')
+    return raster
+
+
+def RewriteRaster(name, rowFunc, progress=None):
+    """Rewrites raster map row by row.
+
+    :param name: name of raster map in current mapset
+    :param rowFunc: function called with row index and row,
+                    returns (modified) row
+    :param progress: function called with number of processed rows
+    """
+    from grass.pygrass.raster import RasterRow
+
+    current = _openRaster(name)
+    output = RasterRow(name.split('@')[0])
+    try:
+        output.open('w', mtype=current.mtype, overwrite=True)
+        for i in range(current.info.rows):
+            output.put_row(rowFunc(i, current.get_row(i)))
+            if progress:
+                progress(i + 1)
+    finally:
+        current.close()
+        output.close()
+
+
+def ReadRasterWindow(name, window):
+    """Reads window of raster map into array, null cells are NaN.
+    Uses current computational region.
+
+    :param name: name of raster map (fully qualified)
+    :param window: RasterGrid, window of the computational region
+    """
+    raster = _openRaster(name)
+    try:
+        data = np.empty(window.GetShape(), dtype=np.float64)
+        col0, col1 = window.colOffset, window.colOffset + window.cols
+        for i in range(window.rows):
+            data[i] = raster.get_row(window.rowOffset + i)[col0:col1]
+        if raster.mtype == 'CELL':
+            data[data == CELL_NULL] = np.nan
+    finally:
+        raster.close()
+    return data
+
+
+def _convertRow(row, mtype):
+    """Returns row converted to buffer of raster type, nulls are kept"""
+    from grass.pygrass.raster.buffer import Buffer
+
+    converted = Buffer(row.shape, mtype=mtype)
+    if mtype == 'CELL':
+        converted[:] = np.where(np.isnan(row), CELL_NULL, row)
+    else:
+        converted[:] = row
+        if row.dtype.kind == 'i':
+            converted[row == CELL_NULL] = np.nan
+    return converted
+
+
+def PatchRaster(rasterizer, base, output, outside=None, backup=None, delta=None,
+                mapping=None, progress=None, mtype=None):
+    """Writes rasterized features patched over base raster map.
+
+    Only the window of the rasterizer grid is merged, rows and columns
+    outside of it are copied unchanged. Uses current computational region.
+
+    :param rasterizer: FeatureRasterizer instance
+    :param base: name of base raster map (fully qualified) for
+                 the rasterizer window or None to use original
+                 content kept by backup (null cells without backup)
+    :param output: name of output raster map in current mapset
+    :param outside: name of raster map used outside of the rasterizer
+                    window, defaults to base
+    :param backup: TileBackup of outside raster map, tiles overwritten
+                   in the window are captured before writing
+    :param delta: SaveDelta capturing the window before and after patching
+    :param mapping: targets.ValueMapping of written values
+    :param progress: function called with number of processed rows
+    :param mtype: type of output raster map, defaults to type of outside
+                  raster map (rows are converted when they differ)
+    """
+    from grass.pygrass.raster import RasterRow
+
+    if outside is None or outside == base:
+        outside = base
+    grid = rasterizer.GetGrid()
+    row0, col0 = grid.rowOffset, grid.colOffset
+    row1, col1 = row0 + grid.rows, col0 + grid.cols
+    values = rasterizer.GetValues()
+    if mapping:
+        # NaN for null
+        values = mapping.Apply(values)
+    mask = rasterizer.GetMask()
+
+    outsideMap = _openRaster(outside)
+    baseMap = _openRaster(base) if base and base != outside else outsideMap
+    outMap = RasterRow(output.split('@')[0])
+    try:
+        mtype = mtype or outsideMap.mtype
+        outMap.open('w', mtype=mtype, overwrite=True)
+        null = CELL_NULL if mtype == 'CELL' else np.nan
+        if mtype == 'CELL':
+            values = np.where(np.isnan(values), CELL_NULL, values).astype(np.int32)
+        if backup:
+            backup.Prepare(grid)
+        for i in range(outsideMap.info.rows):
+            row = outsideMap.get_row(i)
+            if backup:
+                backup.CaptureRow(i, row)
+            if outsideMap.mtype != mtype:
+                row = _convertRow(row, mtype)
+            if row0 <= i < row1:
+                if delta:
+                    before = row[col0:col1].copy()
+                if base is None:
+                    if backup:
+                        row[col0:col1] = backup.RestoreRow(i, row.copy())[col0:col1]
+                    else:
+                        row[col0:col1] = null
+                if baseMap is not outsideMap:
+                    baseRow = baseMap.get_row(i)
+                    if baseMap.mtype != mtype:
+                        baseRow = _convertRow(baseRow, mtype)
+                    row[col0:col1] = baseRow[col0:col1]
+                rowMask = mask[i - row0]
+                if rowMask.any():
+                    window = row[col0:col1]
+                    window[rowMask] = values[i - row0][rowMask]
+                if delta:
+                    delta.CaptureRow(i, before, row[col0:col1])
+            outMap.put_row(row)
+            if progress:
+                progress(i + 1)
+    finally:
+        if backup:
+            backup.Finish()
+        if delta:
+            delta.Finish()
+        if baseMap is not outsideMap:
+            baseMap.close()
+        outsideMap.close()
+        outMap.close()
@@ -0,0 +1,194 @@
+"""
+@package rdigit.selection
+
+@brief Spatial index and hit testing of digitized features.
+
+Classes:
+ - selection::FeatureIndex
+
+(C) 2014 by the GRASS Development Team
+This program is free software under the GNU General Public
+License (>=v2). Read the file COPYING that comes with GRASS
+for details.
+
+@author Anna Petrasova <kratochanna gmail.com>
+"""
+
+import math
+
+from rdigit.rasterizer import BBoxIntersects
+
+
+def BBoxContains(outer, inner):
+    """Checks if bounding box inner is inside of bounding box outer"""
+    return (outer[0] <= inner[0] and outer[1] <= inner[1] and
+            inner[2] <= outer[2] and inner[3] <= outer[3])
+
+
+def PointInPolygon(x, y, polygon):
+    """Checks if point is inside of polygon (even-odd rule)
+
+    :param polygon: list of [x, y], does not have to be closed
+    """
+    inside = False
+    n = len(polygon)
+    j = n - 1
+    for i in range(n):
+        xi, yi = polygon[i]
+        xj, yj = polygon[j]
+        if (yi > y) != (yj > y) and x < (xj - xi) * (y - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+
+def _segmentDistance(x, y, x0, y0, x1, y1):
+    dx = x1 - x0
+    dy = y1 - y0
+    length = dx * dx + dy * dy
+    if length:
+        t = max(0, min(1, ((x - x0) * dx + (y - y0) * dy) / length))
+        x0 += t * dx
+        y0 += t * dy
+    return math.hypot(x - x0, y - y0)
+
+
+def DistanceToLine(x, y, coords, closed=False):
+    """Returns distance of point from polyline (or polygon boundary)"""
+    if not coords:
+        return float('inf')
+    if len(coords) == 1:
+        return math.hypot(x - coords[0][0], y - coords[0][1])
+    distance = float('inf')
+    segments = list(zip(coords[:-1], coords[1:]))
+    if closed:
+        segments.append((coords[-1], coords[0]))
+    for (x0, y0), (x1, y1) in segments:
+        distance = min(distance, _segmentDistance(x, y, x0, y0, x1, y1))
+    return distance
+
+
+def HitFeature(ftype, coords, width, x, y, tolerance):
+    """Checks if point hits feature including its width.
+
+    :param coords: list of [x, y] or [x, y] for point
+    :param tolerance: maximum distance in map units
+    """
+    if not coords:
+        return False
+    limit = (width or 0) + tolerance
+    if ftype == 'point':
+        return math.hypot(x - coords[0], y - coords[1]) <= limit
+    if ftype == 'area' and len(coords) > 2 and PointInPolygon(x, y, coords):
+        return True
+    if ftype == 'cells':
+        # runs are not connected
+        return any(DistanceToLine(x, y, coords[i:i + 2]) <= limit
+                   for i in range(0, len(coords), 2))
+    return DistanceToLine(x, y, coords, closed=ftype == 'area') <= limit
+
+
+def FeatureInPolygon(ftype, coords, polygon):
+    """Checks if all vertices of feature are inside of polygon"""
+    if not coords:
+        return False
+    if ftype == 'point':
+        coords = [coords]
+    for x, y in coords:
+        if not PointInPolygon(x, y, polygon):
+            return False
+    return True
+
+
+class FeatureIndex:
+    """Uniform grid index of feature bounding boxes.
+
+    Each feature is registered in all grid cells its bounding box
+    overlaps. Features overlapping too many cells are kept aside
+    and tested on every query, so inserting and removing a feature
+    as well as querying small extents does not depend on the number
+    of features.
+    """
+    def __init__(self, cellSize, maxCells=64):
+        """
+        :param cellSize: size of grid cell in map units
+        :param maxCells: maximum number of grid cells of a feature
+        """
+        self._cellSize = float(cellSize)
+        self._maxCells = maxCells
+        # (column, row) -> set of feature ids
+        self._cells = {}
+        # feature id -> bounding box
+        self._bboxes = {}
+        # features with too large bounding box
+        self._large = set()
+
+    def __len__(self):
+        return len(self._bboxes)
+
+    def __contains__(self, fid):
+        return fid in self._bboxes
+
+    def _getRange(self, bbox):
+        size = self._cellSize
+        return (int(math.floor(bbox[0] / size)), int(math.floor(bbox[1] / size)),
+                int(math.floor(bbox[2] / size)), int(math.floor(bbox[3] / size)))
+
+    def _getKeys(self, bbox):
+        col0, row0, col1, row1 = self._getRange(bbox)
+        return [(col, row) for col in range(col0, col1 + 1) for row in range(row0, row1 + 1)]
+
+    def Clear(self):
+        self._cells = {}
+        self._bboxes = {}
+        self._large = set()
+
+    def Insert(self, fid, bbox):
+        """Adds feature or updates its bounding box
+
+        :param bbox: (west, south, east, north), None is ignored
+        """
+        if fid in self._bboxes:
+            self.Remove(fid)
+        if bbox is None:
+            return
+        self._bboxes[fid] = bbox
+        col0, row0, col1, row1 = self._getRange(bbox)
+        if (col1 - col0 + 1) * (row1 - row0 + 1) > self._maxCells:
+            self._large.add(fid)
+            return
+        for key in self._getKeys(bbox):
+            self._cells.setdefault(key, set()).add(fid)
+
+    def Remove(self, fid):
+        bbox = self._bboxes.pop(fid, None)
+        if bbox is None:
+            return
+        if fid in self._large:
+            self._large.discard(fid)
+            return
+        for key in self._getKeys(bbox):
+            fids = self._cells[key]
+            fids.discard(fid)
+            if not fids:
+                del self._cells[key]
+
+    def GetBBox(self, fid):
+        return self._bboxes.get(fid)
+
+    def Query(self, bbox):
+        """Returns ids of features whose bounding box intersects bbox"""
+        col0, row0, col1, row1 = self._getRange(bbox)
+        candidates = set(self._large)
+        if (col1 - col0 + 1) * (row1 - row0 + 1) > len(self._cells):
+            # large extent, go through occupied cells only
+            for (col, row), fids in self._cells.items():
+                if col0 <= col <= col1 and row0 <= row <= row1:
+                    candidates.update(fids)
+        else:
+            for col in range(col0, col1 + 1):
+                for row in range(row0, row1 + 1):
+                    fids = self._cells.get((col, row))
+                    if fids:
+                        candidates.update(fids)
+        return [fid for fid in candidates if BBoxIntersects(self._bboxes[fid], bbox)]
@@ -0,0 +1,193 @@
+"""
+@package rdigit.simplify
+
+@brief Simplification of digitized lines and areas while they are drawn.
+
+Classes:
+ - simplify::StreamSimplifier
+
+(C) 2014 by the GRASS Development Team
+This program is free software under the GNU General Public
+License (>=v2). Read the file COPYING that comes with GRASS
+for details.
+
+@author Anna Petrasova <kratochanna gmail.com>
+"""
+
+import math
+
+
+def SegmentDistance(x, y, x0, y0, x1, y1):
+    """Returns distance of point from segment"""
+    dx = x1 - x0
+    dy = y1 - y0
+    length = dx * dx + dy * dy
+    if length:
+        t = max(0., min(1., ((x - x0) * dx + (y - y0) * dy) / length))
+        x0 += t * dx
+        y0 += t * dy
+    return ((x - x0) ** 2 + (y - y0) ** 2) ** 0.5
+
+
+def DouglasPeucker(points, tolerance):
+    """Simplifies polyline by Douglas-Peucker algorithm.
+
+    :param points: list of (x, y)
+    :param tolerance: maximum distance of removed vertices from the result
+
+    :return: sorted indices of kept vertices
+    """
+    if len(points) < 3:
+        return list(range(len(points)))
+    keep = [0, len(points) - 1]
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        x0, y0 = points[first]
+        x1, y1 = points[last]
+        farthest = None
+        distance = tolerance
+        for i in range(first + 1, last):
+            d = SegmentDistance(points[i][0], points[i][1], x0, y0, x1, y1)
+            if d > distance:
+                farthest = i
+                distance = d
+        if farthest is not None:
+            keep.append(farthest)
+            stack.append((first, farthest))
+            stack.append((farthest, last))
+    keep.sort()
+    return keep
+
+
+class StreamSimplifier:
+    """Removes redundant vertices of polyline as they arrive.
+
+    The last vertex always follows the last added point. It slides
+    while all points added since the previous kept vertex stay within
+    tolerance from the segment between them, otherwise it is kept
+    and a new one starts. So every added point is within tolerance
+    from the simplified polyline. Each point narrows the range
+    of directions (cone) the sliding segment can have, so adding
+    a point takes constant time.
+
+    When the number of vertices exceeds budget, all added points are
+    simplified again by Douglas-Peucker with maximum tolerance, which
+    is then used for the rest of the polyline. Budget is exceeded
+    rather than exceeding maximum tolerance.
+    """
+    def __init__(self, tolerance, maxTolerance=None, budget=None):
+        """
+        :param tolerance: distance in map units
+        :param maxTolerance: distance in map units allowed to keep budget
+                             (half cell in raster digitizer)
+        :param budget: maximum number of vertices (None for unlimited)
+        """
+        if maxTolerance is None:
+            maxTolerance = tolerance
+        self._maxTolerance = maxTolerance
+        self._tolerance = min(tolerance, maxTolerance)
+        self._budget = budget
+        # added points, needed only to simplify them again
+        self._points = [] if budget and self._tolerance < maxTolerance else None
+        # kept vertices, the last one is the start of the sliding segment
+        self._vertices = []
+        # the sliding vertex (the last added point)
+        self._last = None
+        self._resetCone()
+
+    def _resetCone(self):
+        # direction of the first point farther than tolerance and range
+        # of allowed directions relative to it, None when not restricted
+        self._direction = None
+        self._cone = None
+        # distance of the farthest point restricting the cone
+        self._reach = 0.
+
+    def GetVertices(self):
+        """Returns list of [x, y] of the simplified polyline"""
+        vertices = self._vertices + ([self._last] if self._last else [])
+        return [list(p) for p in vertices]
+
+    def GetNumberOfVertices(self):
+        return len(self._vertices) + (1 if self._last else 0)
+
+    def Add(self, x, y):
+        """Adds point.
+
+        :return: 'append' if the point is new vertex, 'move' if it replaces
+                 the last vertex, 'reset' if the whole polyline changed
+        """
+        point = (x, y)
+        if self._points is not None:
+            self._points.append(point)
+        if not self._vertices:
+            self._vertices.append(point)
+            return 'append'
+        if self._last and self._fits(point):
+            self._last = point
+            self._restrict(point)
+            return 'move'
+        if self._last:
+            self._vertices.append(self._last)
+            self._resetCone()
+        self._last = point
+        self._restrict(point)
+        if self._points is not None and self.GetNumberOfVertices() > self._budget:
+            self._compact()
+            return 'reset'
+        return 'append'
+
+    def _polar(self, point):
+        """Returns distance and direction of point from the last kept vertex"""
+        x0, y0 = self._vertices[-1]
+        dx = point[0] - x0
+        dy = point[1] - y0
+        return math.hypot(dx, dy), math.atan2(dy, dx)
+
+    def _offset(self, angle):
+        """Returns angle relative to the cone direction in range -pi..pi"""
+        offset = angle - self._direction
+        if offset > math.pi:
+            offset -= 2 * math.pi
+        elif offset < -math.pi:
+            offset += 2 * math.pi
+        return offset
+
+    def _restrict(self, point):
+        """Restricts the cone so that point is within tolerance
+        from the sliding segment"""
+        distance, angle = self._polar(point)
+        if distance <= self._tolerance:
+            return
+        self._reach = max(self._reach, distance)
+        half = math.asin(self._tolerance / distance)
+        if self._cone is None:
+            self._direction = angle
+            self._cone = (-half, half)
+            return
+        offset = self._offset(angle)
+        self._cone = (max(self._cone[0], offset - half), min(self._cone[1], offset + half))
+
+    def _fits(self, point):
+        """Checks if the sliding segment can end in point"""
+        if self._cone is None:
+            return True
+        distance, angle = self._polar(point)
+        # points restricting the cone must project onto the segment
+        if distance < self._reach:
+            return False
+        low, high = self._cone
+        return low <= self._offset(angle) <= high
+
+    def _compact(self):
+        """Simplifies all points with maximum tolerance"""
+        points = self._points
+        self._points = None
+        self._tolerance = self._maxTolerance
+        keep = DouglasPeucker(points, self._tolerance)
+        self._vertices = [points[i] for i in keep[:-1]]
+        self._last = points[keep[-1]]
+        self._resetCone()
+        for point in points[keep[-2] + 1:]:
+            self._restrict(point)
@@ -0,0 +1,318 @@
+"""
+@package rdigit.store
+
+@brief Storage of digitized features.
+
+Classes:
+ - store::FeatureStore
+
+(C) 2014 by the GRASS Development Team
+This program is free software under the GNU General Public
+License (>=v2). Read the file COPYING that comes with GRASS
+for details.
+
+@author Anna Petrasova <kratochanna gmail.com>
+"""
+
+from array import array
+
+
+# cells are runs of cells in rows, each run is given by centers
+# of its first and last cell (see fill.RunsToCoords)
+FEATURE_TYPES = ('area', 'line', 'point', 'cells')
+
+
+class FeatureStore:
+    """Columnar storage of features in drawing order.
+
+    Vertices of all features are kept in one contiguous array,
+    features are described by offsets into it together with
+    type, cell value, width and bounding box. Features are
+    identified by ids which do not change when other features
+    are removed or reordered.
+
+    Only the last feature (the one being digitized) can grow
+    in place, changing geometry of other features rewrites
+    the arrays.
+    """
+    def __init__(self):
+        self._clear()
+
+    def _clear(self):
+        # x0, y0, x1, y1, ...
+        self._coords = array('d')
+        # index of the first vertex of each feature, one extra at the end
+        self._offsets = array('l', [0])
+        self._types = array('b')
+        self._values = array('d')
+        self._hasValue = array('b')
+        self._widths = array('d')
+        # west, south, east, north of vertices
+        self._bboxes = array('d')
+        # feature ids in drawing order
+        self._ids = array('l')
+        # feature id -> drawing order
+        self._order = {}
+        self._nextId = 1
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, fid):
+        return fid in self._order
+
+    def Clear(self):
+        """Removes all features"""
+        self._clear()
+
+    def AddFeature(self, ftype, coords=None, value=None, width=None):
+        """Appends feature to the end of drawing order.
+
+        :param ftype: 'area', 'line', 'point' or 'cells'
+        :param coords: list of [x, y] or [x, y] for point
+        :param value: cell value
+        :param width: buffer width in map units
+
+        :return: feature id
+        """
+        fid = self._nextId
+        self._nextId += 1
+        self._append(fid, ftype, coords, value, width)
+        return fid
+
+    def _append(self, fid, ftype, coords, value, width):
+        self._order[fid] = len(self._ids)
+        self._ids.append(fid)
+        self._types.append(FEATURE_TYPES.index(ftype))
+        self._values.append(value if value is not None else 0)
+        self._hasValue.append(value is not None)
+        self._widths.append(width or 0)
+        self._offsets.append(self._offsets[-1])
+        self._bboxes.extend((0, 0, 0, 0))
+        if coords:
+            self.SetCoords(fid, coords)
+
+    def Extend(self, types, values, widths, counts, coords, bboxes):
+        """Appends many features at once (e.g. when loading session).
+
+        :param types: list of feature types
+        :param values: list of cell values (None for no value)
+        :param widths: list of buffer widths
+        :param counts: list of numbers of vertices
+        :param coords: array('d') of x, y of all vertices
+        :param bboxes: array('d') of west, south, east, north of vertices
+
+        :return: list of feature ids
+        """
+        first = len(self._ids)
+        fids = list(range(self._nextId, self._nextId + len(types)))
+        self._nextId += len(types)
+        self._ids.extend(fids)
+        self._order.update(zip(fids, range(first, first + len(fids))))
+        self._types.extend(FEATURE_TYPES.index(ftype) for ftype in types)
+        self._values.extend(value if value is not None else 0 for value in values)
+        self._hasValue.extend(value is not None for value in values)
+        self._widths.extend(width or 0 for width in widths)
+        offset = self._offsets[-1]
+        for count in counts:
+            offset += count
+            self._offsets.append(offset)
+        self._coords.extend(coords)
+        self._bboxes.extend(bboxes)
+        return fids
+
+    def AppendVertex(self, fid, x, y):
+        """Appends vertex to the last feature.
+
+        :return: False if the feature is not the last one
+        """
+        idx = self._order[fid]
+        if idx != len(self._ids) - 1:
+            return False
+        bbox = 4 * idx
+        if self._offsets[idx + 1] == self._offsets[idx]:
+            self._bboxes[bbox:bbox + 4] = array('d', (x, y, x, y))
+        else:
+            self._bboxes[bbox] = min(self._bboxes[bbox], x)
+            self._bboxes[bbox + 1] = min(self._bboxes[bbox + 1], y)
+            self._bboxes[bbox + 2] = max(self._bboxes[bbox + 2], x)
+            self._bboxes[bbox + 3] = max(self._bboxes[bbox + 3], y)
+        self._coords.extend((x, y))
+        self._offsets[idx + 1] += 1
+        return True
+
+    def SetLastVertex(self, fid, x, y):
+        """Moves the last vertex of the last feature,
+        bounding box is only extended.
+
+        :return: False if the feature is not the last one or has no vertices
+        """
+        idx = self._order[fid]
+        if idx != len(self._ids) - 1 or self._offsets[idx + 1] == self._offsets[idx]:
+            return False
+        bbox = 4 * idx
+        self._bboxes[bbox] = min(self._bboxes[bbox], x)
+        self._bboxes[bbox + 1] = min(self._bboxes[bbox + 1], y)
+        self._bboxes[bbox + 2] = max(self._bboxes[bbox + 2], x)
+        self._bboxes[bbox + 3] = max(self._bboxes[bbox + 3], y)
+        end = 2 * self._offsets[idx + 1]
+        self._coords[end - 2:end] = array('d', (x, y))
+        return True
+
+    def SetCoords(self, fid, coords):
+        """Replaces geometry of feature.
+
+        :param coords: list of [x, y] or [x, y] for point
+        """
+        idx = self._order[fid]
+        if self.GetType(fid) == 'point':
+            coords = [coords] if coords else []
+        flat = array('d')
+        for x, y in coords:
+            flat.extend((x, y))
+        start = 2 * self._offsets[idx]
+        end = 2 * self._offsets[idx + 1]
+        self._coords[start:end] = flat
+        shift = len(coords) - (self._offsets[idx + 1] - self._offsets[idx])
+        if shift:
+            for i in range(idx + 1, len(self._offsets)):
+                self._offsets[i] += shift
+        if coords:
+            xs = flat[0::2]
+            ys = flat[1::2]
+            bbox = (min(xs), min(ys), max(xs), max(ys))
+        else:
+            bbox = (0, 0, 0, 0)
+        self._bboxes[4 * idx:4 * idx + 4] = array('d', bbox)
+
+    def GetCoords(self, fid):
+        """Returns list of [x, y] ([x, y] for point)"""
+        idx = self._order[fid]
+        coords = self._coords[2 * self._offsets[idx]:2 * self._offsets[idx + 1]]
+        pairs = [[coords[i], coords[i + 1]] for i in range(0, len(coords), 2)]
+        if self._types[idx] == FEATURE_TYPES.index('point'):
+            return pairs[0] if pairs else []
+        return pairs
+
+    def GetNumberOfVertices(self, fid):
+        idx = self._order[fid]
+        return self._offsets[idx + 1] - self._offsets[idx]
+
+    def GetType(self, fid):
+        return FEATURE_TYPES[self._types[self._order[fid]]]
+
+    def GetValue(self, fid):
+        idx = self._order[fid]
+        if not self._hasValue[idx]:
+            return None
+        return self._values[idx]
+
+    def SetValue(self, fid, value):
+        idx = self._order[fid]
+        self._hasValue[idx] = value is not None
+        self._values[idx] = value if value is not None else 0
+
+    def GetWidth(self, fid):
+        return self._widths[self._order[fid]]
+
+    def SetWidth(self, fid, width):
+        self._widths[self._order[fid]] = width or 0
+
+    def GetBBox(self, fid):
+        """Returns bounding box (west, south, east, north) including
+        width or None for feature without vertices."""
+        idx = self._order[fid]
+        if self._offsets[idx + 1] == self._offsets[idx]:
+            return None
+        w, s, e, n = self._bboxes[4 * idx:4 * idx + 4]
+        width = self._widths[idx]
+        return (w - width, s - width, e + width, n + width)
+
+    def GetDrawOrder(self, fid):
+        """Returns position of feature in drawing order"""
+        return self._order[fid]
+
+    def GetIds(self, start=0, end=None):
+        """Returns list of feature ids in drawing order"""
+        if end is None:
+            end = len(self._ids)
+        return list(self._ids[start:end])
+
+    def GetLast(self):
+        """Returns id of the last feature or None"""
+        if not self._ids:
+            return None
+        return self._ids[-1]
+
+    def Remove(self, fid):
+        """Removes feature, removing the last one is constant time"""
+        idx = self._order.pop(fid)
+        start, end = self._offsets[idx], self._offsets[idx + 1]
+        del self._coords[2 * start:2 * end]
+        del self._offsets[idx + 1]
+        if idx < len(self._ids) - 1:
+            count = end - start
+            for i in range(idx + 1, len(self._offsets)):
+                self._offsets[i] -= count
+            for i in range(idx + 1, len(self._ids)):
+                self._order[self._ids[i]] -= 1
+        del self._types[idx]
+        del self._values[idx]
+        del self._hasValue[idx]
+        del self._widths[idx]
+        del self._bboxes[4 * idx:4 * idx + 4]
+        del self._ids[idx]
+
+    def RemoveFeatures(self, fids):
+        """Removes many features, arrays are rewritten only once"""
+        fids = set(fids)
+        if len(fids) == 1:
+            self.Remove(fids.pop())
+            return
+        keep = [idx for idx, fid in enumerate(self._ids) if fid not in fids]
+        coords = array('d')
+        offsets = array('l', [0])
+        bboxes = array('d')
+        for idx in keep:
+            start, end = self._offsets[idx], self._offsets[idx + 1]
+            coords.extend(self._coords[2 * start:2 * end])
+            offsets.append(offsets[-1] + end - start)
+            bboxes.extend(self._bboxes[4 * idx:4 * idx + 4])
+        self._coords = coords
+        self._offsets = offsets
+        self._bboxes = bboxes
+        for name in ('_types', '_values', '_hasValue', '_widths', '_ids'):
+            column = getattr(self, name)
+            setattr(self, name, array(column.typecode, [column[idx] for idx in keep]))
+        self._order = dict(zip(self._ids, range(len(self._ids))))
+
+    def SetDrawOrder(self, fid, position):
+        """Moves feature to given position in drawing order"""
+        coords = self.GetCoords(fid)
+        ftype = self.GetType(fid)
+        value = self.GetValue(fid)
+        width = self.GetWidth(fid)
+        self.Remove(fid)
+        # reinsert at the end and move the record to its position
+        self._append(fid, ftype, coords, value, width)
+        last = len(self._ids) - 1
+        position = max(0, min(position, last))
+        if position == last:
+            return
+        start, end = self._offsets[last], self._offsets[last + 1]
+        count = end - start
+        vertices = self._coords[2 * start:2 * end]
+        del self._coords[2 * start:2 * end]
+        insertAt = self._offsets[position]
+        self._coords[2 * insertAt:2 * insertAt] = vertices
+        del self._offsets[last + 1]
+        for i in range(position + 1, len(self._offsets)):
+            self._offsets[i] += count
+        self._offsets.insert(position + 1, insertAt + count)
+        for column, size in ((self._types, 1), (self._values, 1), (self._hasValue, 1),
+                             (self._widths, 1), (self._bboxes, 4), (self._ids, 1)):
+            record = column[size * last:size * last + size]
+            del column[size * last:size * last + size]
+            column[size * position:size * position] = record
+        for i in range(position, len(self._ids)):
+            self._order[self._ids[i]] = i
@@ -0,0 +1,141 @@
+"""
+@package rdigit.targets
+
+@brief Additional raster maps written by raster digitizer.
+
+Features are rasterized once and the result is written into the edited
+raster map and into each target raster map, cell values of features
+in target raster map are given by value mapping.
+
+Classes:
+ - targets::ValueMapping
+ - targets::TargetRaster
+
+(C) 2014 by the GRASS Development Team
+This program is free software under the GNU General Public
+License (>=v2). Read the file COPYING that comes with GRASS
+for details.
+
+@author Anna Petrasova <kratochanna gmail.com>
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    pass
+
+
+class ValueMapping:
+    """Maps cell values of features to values in target raster map.
+
+    Rules are similar to r.reclass rules, one rule per line:
+
+        1 2 5 = 1
+        10 thru 20 = 2
+        3 = NULL
+        * = 0
+
+    Later rules take precedence over earlier ones, '*' rule gives value
+    of all other values. Values without rule are null (NULL rule),
+    features write null cells then. No rules mean the same values.
+    """
+    def __init__(self, rules=''):
+        """
+        :param rules: text of rules
+
+        Raises ValueError for invalid rules.
+        """
+        # list of (low, high, new value), new value None is null
+        self._rules = []
+        self._default = None
+        self._identity = True
+        for line in rules.splitlines():
+            line = line.split('#')[0].strip()
+            if not line:
+                continue
+            self._identity = False
+            try:
+                self._addRule(line)
+            except ValueError:
+                raise ValueError(_("Invalid rule: %s") % line)
+        self._text = rules.strip()
+
+    def _addRule(self, line):
+        old, new = [each.strip() for each in line.split('=')]
+        new = None if new.upper() == 'NULL' else float(new)
+        if old == '*':
+            self._default = new
+            return
+        words = old.split()
+        if len(words) == 3 and words[1].lower() == 'thru':
+            low, high = float(words[0]), float(words[2])
+            self._rules.append((min(low, high), max(low, high), new))
+        elif words:
+            self._rules.extend((float(word), float(word), new) for word in words)
+        else:
+            raise ValueError(line)
+
+    def GetRules(self):
+        return self._text
+
+    def IsIdentity(self):
+        return self._identity
+
+    def Map(self, value):
+        """Returns mapped value or None for null"""
+        if self._identity or value is None:
+            return value
+        for low, high, new in reversed(self._rules):
+            if low <= value <= high:
+                return new
+        return self._default
+
+    def Apply(self, values):
+        """Maps array of values, null is NaN"""
+        if self._identity:
+            return values
+        nan = float('nan')
+        mapped = np.full(values.shape, nan if self._default is None else self._default)
+        for low, high, new in self._rules:
+            mapped[(values >= low) & (values <= high)] = nan if new is None else new
+        return mapped
+
+    def GetExpression(self, raster):
+        """Returns r.mapcalc expression of mapped values of raster map"""
+        if self._identity:
+            return raster
+
+        def value(new):
+            return 'null()' if new is None else repr(new)
+
+        expression = value(self._default)
+        for low, high, new in self._rules:
+            if low == high:
+                condition = '{r} == {v}'.format(r=raster, v=repr(low))
+            else:
+                condition = '{r} >= {low} && {r} <= {high}'.format(r=raster, low=repr(low),
+                                                                   high=repr(high))
+            expression = 'if({c}, {new}, {other})'.format(c=condition, new=value(new),
+                                                          other=expression)
+        return expression
+
+
+class TargetRaster:
+    """Raster map written together with the edited raster map
+    and its state kept by DigitizerEngine (backup, history, color table)"""
+    def __init__(self, name, mapping):
+        """
+        :param name: fully qualified name of raster map in current mapset
+        :param mapping: ValueMapping
+        """
+        self.name = name
+        self.mapping = mapping
+        # backup copy, TileBackup
+        self.backupRasterName = None
+        self.backup = None
+        # original content is null (new map), no backup is needed
+        self.nullBackup = False
+        # SaveHistory
+        self.history = None
+        # range of values covered by color table
+        self.colorRange = None
@@ -0,0 +1,95 @@
+"""
+@package rdigit.testsuite.test_autosave
+
+@brief Tests of policy for saving edited raster map automatically.
+
+(C) 2014 by the GRASS Development Team
+This program is free software under the GNU General Public
+License (>=v2). Read the file COPYING that comes with GRASS
+for details.
+
+@author Anna Petrasova <kratochanna gmail.com>
+"""
+
+import unittest
+
+from rdigit.autosave import AutosavePolicy
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class AutosavePolicyTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.policy = AutosavePolicy(idleSeconds=2, clock=self.clock)
+
+    def test_disabled(self):
+        self.assertFalse(self.policy.IsEnabled())
+        self.policy.Changed(100)
+        self.clock.now = 1000
+        self.assertFalse(self.policy.IsDue())
+        self.policy.SetLimits(maxSeconds=60)
+        self.assertTrue(self.policy.IsEnabled())
+        self.assertTrue(self.policy.IsDue())
+
+    def test_features(self):
+        self.policy.SetLimits(maxFeatures=3)
+        self.assertFalse(self.policy.IsDue())
+        self.policy.Changed(2)
+        self.assertFalse(self.policy.IsDue())
+        self.policy.Changed()
+        self.assertTrue(self.policy.IsDue())
+        self.policy.Started()
+        self.assertFalse(self.policy.IsDue())
+
+    def test_interval(self):
+        """Age of the oldest unsaved change counts"""
+        self.policy.SetLimits(maxSeconds=60)
+        self.policy.Changed()
+        self.clock.now = 50
+        self.policy.Changed()
+        self.assertFalse(self.policy.IsDue())
+        self.clock.now = 60
+        self.assertTrue(self.policy.IsDue())
+        # changes made while saving wait for the next interval
+        self.policy.Started()
+        self.clock.now = 70
+        self.policy.Changed()
+        self.clock.now = 129
+        self.assertFalse(self.policy.IsTriggered())
+        self.clock.now = 130
+        self.assertTrue(self.policy.IsTriggered())
+
+    def test_idle(self):
+        """Save waits until there was no input for idle time"""
+        self.policy.SetLimits(maxFeatures=1)
+        self.policy.Changed()
+        self.clock.now = 10
+        self.policy.Input()
+        self.clock.now = 11.5
+        self.assertTrue(self.policy.IsTriggered())
+        self.assertFalse(self.policy.IsDue())
+        self.clock.now = 12
+        self.assertTrue(self.policy.IsDue())
+
+    def test_deferred(self):
+        """Save is not due while drawing or while other save runs"""
+        self.policy.SetLimits(maxFeatures=1)
+        self.policy.Changed()
+        self.assertFalse(self.policy.IsDue(drawing=True))
+        self.assertFalse(self.policy.IsDue(busy=True))
+        # triggers which happened meanwhile result in one save
+        self.policy.Changed()
+        self.assertTrue(self.policy.IsDue())
+        self.policy.Started()
+        self.assertFalse(self.policy.IsDue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+"""
+@package rdigit.testsuite.test_backup
+
+@brief Tests of backup of edited raster map by tiles.
+
+(C) 2014 by the GRASS Development Team
+This program is free software under the GNU General Public
+License (>=v2). Read the file COPYING that comes with GRASS
+for details.
+
+@author Anna Petrasova <kratochanna gmail.com>
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from rdigit.backup import TileBackup
+from rdigit.rasterizer import RasterGrid, haveNumpy
+
+if haveNumpy:
+    import numpy as np
+
+
+@unittest.skipUnless(haveNumpy, "NumPy is required")
+class TileBackupTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='rdigit')
+        self.path = os.path.join(self.directory, 'tiles')
+        # 10 x 10 cells in tiles of 4 x 4, the last ones are partial
+        self.grid = RasterGrid(north=10, south=0, east=10, west=0, rows=10, cols=10)
+        self.original = np.arange(100, dtype=np.int32).reshape((10, 10))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _save(self, backup, data, bbox):
+        """Streams rows of data which is going to be overwritten in bbox"""
+        backup.Prepare(self.grid.Window(bbox))
+        for row in range(self.grid.rows):
+            backup.CaptureRow(row, data[row])
+        backup.Finish()
+
+    def _restore(self, backup, data):
+        return np.array([backup.RestoreRow(row, data[row].copy())
+                         for row in range(self.grid.rows)])
+
+    def test_round_trip(self):
+        backup = TileBackup(self.grid, path=self.path, tileSize=4)
+        self.assertTrue(backup.IsEmpty())
+        # window of rows 3 - 6 and columns 2 - 9
+        self._save(backup, self.original, (3.5, 4.5, 8.5, 5.5))
+        self.assertFalse(backup.IsEmpty())
+        current = np.zeros((10, 10), dtype=np.int32)
+        restored = self._restore(backup, current)
+        # tiles of rows 0 - 7 and columns 0 - 9 were saved
+        self.assertTrue((restored[:8] == self.original[:8]).all())
+        self.assertTrue((restored[8:] == 0).all())
+
+    def test_saved_once(self):
+        backup = TileBackup(self.grid, path=self.path, tileSize=4)
+        self._save(backup, self.original, (0.5, 8.5, 1.5, 9.5))
+        # the same tile is overwritten again by other values
+        self._save(backup, self.original + 1000, (0.5, 8.5, 1.5, 9.5))
+        restored = self._restore(backup, np.zeros((10, 10), dtype=np.int32))
+        self.assertTrue((restored[:4, :4] == self.original[:4, :4]).all())
+        self.assertTrue((restored[:4, 4:] == 0).all())
+
+    def test_partial_last_tile(self):
+        backup = TileBackup(self.grid, path=self.path, tileSize=4)
+        # the last cells, the tile has 2 x 2 cells only
+        self._save(backup, self.original, (9.4, 0.4, 9.6, 0.6))
+        restored = self._restore(backup, np.zeros((10, 10), dtype=np.int32))
+        self.assertTrue((restored[8:, 8:] == self.original[8:, 8:]).all())
+        self.assertEqual(int(np.count_nonzero(restored[:8])), 0)
+        # tiles are found by backup of interrupted session
+        resumed = TileBackup(self.grid, path=self.path, tileSize=4)
+        self.assertTrue((self._restore(resumed, np.zeros((10, 10), dtype=np.int32)) ==
+                         restored).all())
+
+    def test_interrupted_capture(self):
+        """Tiles not captured completely are dropped"""
+        backup = TileBackup(self.grid, path=self.path, tileSize=4)
+        backup.Prepare(self.grid.Window((0.5, 0.5, 9.5, 9.5)))
+        for row in range(6):
+            backup.CaptureRow(row, self.original[row])
+        backup.Finish()
+        restored = self._restore(backup, np.zeros((10, 10), dtype=np.int32))
+        self.assertTrue((restored[:4] == self.original[:4]).all())
+        self.assertTrue((restored[4:] == 0).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
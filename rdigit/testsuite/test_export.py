@@ -0,0 +1,228 @@
+"""
+@package rdigit.testsuite.test_export
+
+@brief Tests of export of features by modules run by a fake runner.
+
+(C) 2014 by the GRASS Development Team
+This program is free software under the GNU General Public
+License (>=v2). Read the file COPYING that comes with GRASS
+for details.
+
+@author Anna Petrasova <kratochanna gmail.com>
+"""
+
+import gettext
+import sys
+import types
+import unittest
+
+from rdigit.rasterizer import RasterGrid
+from rdigit.targets import ValueMapping
+
+gettext.install('grasswxpy')
+
+
+class _CalledModuleError(Exception):
+    def __init__(self, module=None, code=None, returncode=None, **kwargs):
+        Exception.__init__(self, module)
+        self.module = module
+        self.returncode = returncode
+
+
+def _importExport():
+    """Imports export module, GRASS modules which are not available
+    are replaced only while importing (the test uses its own runner)"""
+    fakes = {}
+    try:
+        import grass.script.core
+        import grass.exceptions
+    except ImportError:
+        grass = types.ModuleType('grass')
+        script = types.ModuleType('grass.script')
+        script.core = types.ModuleType('grass.script.core')
+        exceptions = types.ModuleType('grass.exceptions')
+        exceptions.CalledModuleError = _CalledModuleError
+        fakes.update({'grass': grass, 'grass.script': script,
+                      'grass.script.core': script.core, 'grass.exceptions': exceptions})
+    try:
+        import core.rastercache
+    except ImportError:
+        core = types.ModuleType('core')
+        core.rastercache = types.ModuleType('core.rastercache')
+        core.rastercache.RasterMetadata = None
+        fakes.update({'core': core, 'core.rastercache': core.rastercache})
+    saved = dict((name, sys.modules.get(name)) for name in fakes)
+    sys.modules.update(fakes)
+    try:
+        from rdigit import export
+    finally:
+        for name, module in saved.items():
+            if module is None:
+                del sys.modules[name]
+            else:
+                sys.modules[name] = module
+    return export
+
+
+export = _importExport()
+
+
+class _Process:
+    def __init__(self, returncode):
+        self.returncode = returncode
+        self.stdin = self
+
+    def write(self, data):
+        pass
+
+    def close(self):
+        pass
+
+    def wait(self):
+        return self.returncode
+
+    def kill(self):
+        pass
+
+
+class FakeRunner:
+    """Runs modules on raster maps represented by descriptions of content"""
+    PIPE = -1
+
+    def __init__(self, maps):
+        self.maps = maps
+        self.calls = []
+        # function called with module and its parameters before it runs,
+        # returns False when the module fails
+        self.hook = None
+
+    def find_file(self, name, element=None, mapset=None):
+        return {'name': name if name in self.maps else ''}
+
+    def region_env(self, **kwargs):
+        return ''
+
+    def _run(self, module, kwargs):
+        self.calls.append(module)
+        if self.hook and self.hook(module, kwargs) is False:
+            return 1
+        if module in ('r.in.poly', 'r.grow'):
+            self.maps[kwargs['output']] = module
+        elif module == 'r.patch':
+            self.maps[kwargs['output']] = ' '.join(self.maps.get(name.split('@')[0], name)
+                                                   for name in kwargs['input'])
+        elif module == 'r.mapcalc':
+            output, expression = kwargs['expression'].split(' = ', 1)
+            self.maps[output] = expression
+        elif module == 'g.rename':
+            old, new = kwargs['rast']
+            if new in self.maps:
+                return 1
+            self.maps[new] = self.maps.pop(old)
+        elif module == 'g.remove':
+            for name in kwargs['name']:
+                self.maps.pop(name, None)
+        return 0
+
+    def start_command(self, module, **kwargs):
+        return _Process(self._run(module, kwargs))
+
+    def run_command(self, module, **kwargs):
+        if self._run(module, kwargs):
+            raise _CalledModuleError(module=module, returncode=1)
+        return 0
+
+
+class _Metadata:
+    @staticmethod
+    def GetInfo(name):
+        return {'datatype': 'CELL'}
+
+
+class ExportJobTest(unittest.TestCase):
+    def setUp(self):
+        self.maps = {'edited': 'original', 'target': 'original target'}
+        self.runner = FakeRunner(self.maps)
+        self.saved = (export.gcore, export.CalledModuleError, export.RasterMetadata)
+        export.gcore = self.runner
+        export.CalledModuleError = _CalledModuleError
+        export.RasterMetadata = _Metadata
+        self.region = RasterGrid(north=10, south=0, east=10, west=0, rows=10, cols=10)
+        # plain features and buffered line form two batches
+        records = [('point', [1.5, 1.5], 1, None),
+                   ('area', [[2, 2], [4, 2], [4, 4]], 2, None),
+                   ('line', [[5.5, 5.5], [7.5, 5.5]], 3, 1.0)]
+        self.job = export.ExportJob(records, base='edited@user', window=self.region,
+                                    region=self.region, output='edited@user', mapType='CELL')
+
+    def tearDown(self):
+        export.gcore, export.CalledModuleError, export.RasterMetadata = self.saved
+
+    def _temporary(self):
+        return [name for name in self.maps if name.startswith('tmp_rdigit')]
+
+    def test_run(self):
+        self.job.Run(method='modules')
+        self.job.CleanUp()
+        self.assertEqual(sorted(self.maps), ['edited', 'target'])
+        self.assertTrue(self.maps['edited'].endswith('original'))
+        self.assertEqual(self.job.GetValueRange(), (1, 3))
+
+    def test_cancel_resume(self):
+        """Batches rasterized before cancelling are not rasterized again"""
+        def cancel(module, kwargs):
+            if module == 'r.grow':
+                self.job.Cancel()
+        self.runner.hook = cancel
+        self.assertRaises(export.ExportCancelled, self.job.Run, method='modules')
+        self.assertEqual(self.maps['edited'], 'original')
+        self.assertEqual(self.runner.calls.count('r.in.poly'), 2)
+
+        self.runner.hook = None
+        self.runner.calls = []
+        self.job.Run(method='modules')
+        self.assertEqual(self.runner.calls.count('r.in.poly'), 1)
+        self.assertEqual(self.runner.calls.count('r.grow'), 1)
+        self.assertNotEqual(self.maps['edited'], 'original')
+        self.job.CleanUp()
+        self.assertEqual(self._temporary(), [])
+
+    def test_rename_rollback(self):
+        """Written raster maps are put back when replacing one of them fails"""
+        def failRename(module, kwargs):
+            # the first rename is moving the target aside
+            if module == 'g.rename' and kwargs['rast'][1] == 'target' and \
+                    kwargs['rast'][0] not in moved:
+                return False
+            if module == 'g.rename' and kwargs['rast'][0] == 'target':
+                moved.append(kwargs['rast'][1])
+        moved = []
+        self.runner.hook = failRename
+        target = export.ExportTarget('target@user', ValueMapping("* = 1"),
+                                     base='target@user')
+        self.assertRaises(_CalledModuleError, self.job.Run, method='modules',
+                          targets=[target])
+        self.assertEqual(self.maps['edited'], 'original')
+        self.assertEqual(self.maps['target'], 'original target')
+        self.assertFalse(self.job.HasWritten())
+        self.job.CleanUp()
+        self.assertEqual(self._temporary(), [])
+
+    def test_cancel_rename(self):
+        """Job cancelled while replacing raster maps leaves them unchanged"""
+        def cancel(module, kwargs):
+            if module == 'g.rename' and kwargs['rast'][1] == 'edited' and \
+                    not self.job.IsCancelled():
+                self.job.Cancel()
+        self.runner.hook = cancel
+        target = export.ExportTarget('target@user', ValueMapping(), base='target@user')
+        self.assertRaises(export.ExportCancelled, self.job.Run, method='modules',
+                          targets=[target])
+        self.assertEqual(self.maps['edited'], 'original')
+        self.assertEqual(self.maps['target'], 'original target')
+        self.job.CleanUp()
+        self.assertEqual(self._temporary(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+"""
+@package rdigit.testsuite.test_fill
+
+@brief Tests of flood fill.
+
+(C) 2014 by the GRASS Development Team
+This program is free software under the GNU General Public
+License (>=v2). Read the file COPYING that comes with GRASS
+for details.
+
+@author Anna Petrasova <kratochanna gmail.com>
+"""
+
+import unittest
+
+from rdigit.fill import FloodFill, RunsToCoords
+from rdigit.rasterizer import RasterGrid, haveNumpy
+
+if haveNumpy:
+    import numpy as np
+
+
+@unittest.skipUnless(haveNumpy, "NumPy is required")
+class FloodFillTest(unittest.TestCase):
+    def setUp(self):
+        nan = float('nan')
+        self.data = np.array([[1, 1, 2, 1],
+                              [2, 1, 2, 1],
+                              [1, 2, 1, 1],
+                              [nan, nan, 3, 1]])
+
+    def test_connectivity(self):
+        self.assertEqual(FloodFill(self.data, 0, 0),
+                         [(0, 0, 1), (1, 1, 1)])
+        self.assertEqual(FloodFill(self.data, 0, 0, connectivity=8),
+                         [(0, 0, 1), (0, 3, 3), (1, 1, 1), (1, 3, 3),
+                          (2, 0, 0), (2, 2, 3), (3, 3, 3)])
+
+    def test_tolerance(self):
+        runs = FloodFill(self.data, 0, 0, tolerance=1)
+        self.assertEqual(runs, [(0, 0, 3), (1, 0, 3), (2, 0, 3), (3, 3, 3)])
+
+    def test_null(self):
+        self.assertEqual(FloodFill(self.data, 3, 1), [(3, 0, 1)])
+
+    def test_coords(self):
+        grid = RasterGrid(north=4, south=0, east=8, west=0, rows=4, cols=4)
+        self.assertEqual(RunsToCoords(grid, [(1, 0, 2)]), [[1, 2.5], [5, 2.5]])
+
+
+if __name__ == '__main__':
+    unittest.main()
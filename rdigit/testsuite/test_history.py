@@ -0,0 +1,116 @@
+"""
+@package rdigit.testsuite.test_history
+
+@brief Tests of undo and redo of saves.
+
+(C) 2014 by the GRASS Development Team
+This program is free software under the GNU General Public
+License (>=v2). Read the file COPYING that comes with GRASS
+for details.
+
+@author Anna Petrasova <kratochanna gmail.com>
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from rdigit import rasterizer
+from rdigit.history import SaveDelta, SaveHistory
+from rdigit.rasterizer import RasterGrid, haveNumpy
+
+if haveNumpy:
+    import numpy as np
+
+
+@unittest.skipUnless(haveNumpy, "NumPy is required")
+class SaveDeltaTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='rdigit')
+        self.window = RasterGrid(north=6, south=0, east=8, west=0, rows=6, cols=8)
+        self.before = np.arange(48, dtype=np.int32).reshape((6, 8))
+        self.after = self.before.copy()
+        self.after[1:3, 5:7] = -1
+        self.raster = None
+        self.rewriteRaster = rasterizer.RewriteRaster
+        rasterizer.RewriteRaster = self._rewriteRaster
+
+    def tearDown(self):
+        rasterizer.RewriteRaster = self.rewriteRaster
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _rewriteRaster(self, name, rowFunc, progress=None):
+        for i in range(self.raster.shape[0]):
+            self.raster[i] = rowFunc(i, self.raster[i].copy())
+
+    def _capture(self):
+        delta = SaveDelta(self.window, os.path.join(self.directory, 'save'), tileSize=4)
+        for row in range(self.window.rows):
+            delta.CaptureRow(row, self.before[row], self.after[row])
+        delta.Finish()
+        return delta
+
+    def test_changed_tiles_only(self):
+        delta = self._capture()
+        self.assertEqual(len(delta._tiles), 1)
+        self.assertTrue(os.path.exists(os.path.join(self.directory, 'save')))
+
+    def test_undo_redo(self):
+        delta = self._capture()
+        self.raster = self.after.copy()
+        delta.Apply('map', 'before')
+        self.assertTrue((self.raster == self.before).all())
+        delta.Apply('map', 'after')
+        self.assertTrue((self.raster == self.after).all())
+
+    def test_file_closed(self):
+        """File of the delta is open only while capturing and applying"""
+        delta = self._capture()
+        self.assertIsNone(delta._file)
+        self.raster = self.after.copy()
+        delta.Apply('map', 'before')
+        self.assertIsNone(delta._file)
+        delta.Discard()
+        self.assertFalse(os.path.exists(os.path.join(self.directory, 'save')))
+
+
+@unittest.skipUnless(haveNumpy, "NumPy is required")
+class SaveHistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='rdigit')
+        self.window = RasterGrid(north=16, south=0, east=16, west=0, rows=16, cols=16)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _save(self, history, after):
+        delta = history.NewDelta(self.window)
+        before = np.zeros((16, 16), dtype=np.int32)
+        for row in range(16):
+            delta.CaptureRow(row, before[row], after[row])
+        delta.Finish()
+        return history.Push(delta)
+
+    def test_undo_redo_stacks(self):
+        history = SaveHistory(self.directory)
+        self.assertTrue(self._save(history, np.ones((16, 16), dtype=np.int32)))
+        self.assertTrue(self._save(history, np.ones((16, 16), dtype=np.int32)))
+        history.Undo()
+        self.assertTrue(history.CanUndo() and history.CanRedo())
+        self._save(history, np.ones((16, 16), dtype=np.int32))
+        self.assertFalse(history.CanRedo())
+
+    def test_save_over_budget(self):
+        """Older saves can't be undone when a save is not recorded"""
+        history = SaveHistory(self.directory, budget=1024)
+        self.assertTrue(self._save(history, np.ones((16, 16), dtype=np.int32)))
+        self.assertTrue(history.CanUndo())
+        noise = np.random.RandomState(0).randint(0, 2 ** 30, (16, 16)).astype(np.int32)
+        self.assertFalse(self._save(history, noise))
+        self.assertFalse(history.CanUndo())
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
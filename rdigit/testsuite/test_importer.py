@@ -0,0 +1,230 @@
+"""
+@package rdigit.testsuite.test_importer
+
+@brief Tests of reading features from WKT, GeoJSON and vector maps.
+
+(C) 2014 by the GRASS Development Team
+This program is free software under the GNU General Public
+License (>=v2). Read the file COPYING that comes with GRASS
+for details.
+
+@author Anna Petrasova <kratochanna gmail.com>
+"""
+
+import gettext
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import types
+import unittest
+
+gettext.install('grasswxpy')
+
+
+class _CalledModuleError(Exception):
+    pass
+
+
+def _importImporter():
+    """Imports importer module, GRASS modules which are not available
+    are replaced only while importing (the test uses its own runner)"""
+    fakes = {}
+    try:
+        import grass.script.core
+        import grass.script.vector
+        import grass.exceptions
+    except ImportError:
+        grass = types.ModuleType('grass')
+        script = types.ModuleType('grass.script')
+        script.core = types.ModuleType('grass.script.core')
+        script.vector = types.ModuleType('grass.script.vector')
+        exceptions = types.ModuleType('grass.exceptions')
+        exceptions.CalledModuleError = _CalledModuleError
+        exceptions.ScriptError = RuntimeError
+        fakes.update({'grass': grass, 'grass.script': script,
+                      'grass.script.core': script.core,
+                      'grass.script.vector': script.vector, 'grass.exceptions': exceptions})
+    saved = dict((name, sys.modules.get(name)) for name in fakes)
+    sys.modules.update(fakes)
+    try:
+        from rdigit import importer
+    finally:
+        for name, module in saved.items():
+            if module is None:
+                del sys.modules[name]
+            else:
+                sys.modules[name] = module
+    return importer
+
+
+importer = _importImporter()
+
+
+def _read(text, reader):
+    directory = tempfile.mkdtemp(prefix='rdigit')
+    try:
+        path = os.path.join(directory, 'features')
+        with open(path, 'w') as f:
+            f.write(text)
+        return [(ftype, coords) for ftype, coords, properties in reader(path)]
+    finally:
+        shutil.rmtree(directory)
+
+
+class WKTTest(unittest.TestCase):
+    def test_multi(self):
+        features = _read("MULTIPOINT (1 2, 3 4)\n"
+                         "MULTIPOINT ((5 6), (7 8))\n"
+                         "MULTILINESTRING ((0 0, 1 1), (2 2, 3 3, 4 4))\n"
+                         "MULTIPOLYGON (((0 0, 4 0, 4 4, 0 0)), ((5 5, 6 5, 6 6, 5 5)))",
+                         importer.ReadWKT)
+        self.assertEqual(features, [('point', [1, 2]), ('point', [3, 4]),
+                                    ('point', [5, 6]), ('point', [7, 8]),
+                                    ('line', [[0, 0], [1, 1]]),
+                                    ('line', [[2, 2], [3, 3], [4, 4]]),
+                                    ('area', [[0, 0], [4, 0], [4, 4]]),
+                                    ('area', [[5, 5], [6, 5], [6, 6]])])
+
+    def test_empty(self):
+        features = _read("POINT EMPTY\nLINESTRING EMPTY\nPOLYGON Z EMPTY\n"
+                         "GEOMETRYCOLLECTION EMPTY\n"
+                         "GEOMETRYCOLLECTION (POINT EMPTY, POINT Z (1 2 3))",
+                         importer.ReadWKT)
+        self.assertEqual([(ftype, coords) for ftype, coords in features if coords],
+                         [('point', [1, 2])])
+
+    def test_holes(self):
+        """Holes of polygons are dropped"""
+        features = _read("POLYGON ((0 0, 10 0, 10 10, 0 10, 0 0), (2 2, 4 2, 4 4, 2 2))",
+                         importer.ReadWKT)
+        self.assertEqual(features, [('area', [[0, 0], [10, 0], [10, 10], [0, 10]])])
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, _read, "POINT (1 2", importer.ReadWKT)
+        self.assertRaises(ValueError, _read, "CIRCLE (1 2)", importer.ReadWKT)
+
+
+class GeoJSONTest(unittest.TestCase):
+    def _collection(self, geometries):
+        return json.dumps({'type': 'FeatureCollection',
+                           'features': [{'type': 'Feature', 'properties': {'cat': i},
+                                         'geometry': geometry}
+                                        for i, geometry in enumerate(geometries)]})
+
+    def test_chunks(self):
+        """Features split between chunks are decoded"""
+        geometries = [{'type': 'LineString', 'coordinates': [[i, i], [i + 1, i + 0.5]]}
+                      for i in range(50)]
+        # text of the file is unicode on Python 2 as well
+        f = io.StringIO(u'' + self._collection(geometries))
+        features = list(importer._readGeoJSONObjects(f, chunkSize=64))
+        self.assertEqual([feature['properties']['cat'] for feature in features],
+                         list(range(50)))
+        self.assertEqual(features[49]['geometry'], geometries[49])
+
+    def test_multi_holes(self):
+        polygon = [[[0, 0], [10, 0], [10, 10], [0, 0]], [[6, 2], [8, 2], [8, 4], [6, 2]]]
+        features = _read(self._collection([
+            {'type': 'MultiPolygon', 'coordinates': [polygon, [[[20, 20], [21, 20],
+                                                                [21, 21], [20, 20]]]]},
+            {'type': 'MultiPoint', 'coordinates': [[1, 2, 3], [4, 5, 6]]},
+            {'type': 'GeometryCollection',
+             'geometries': [{'type': 'Point', 'coordinates': [7, 8]},
+                            {'type': 'LineString', 'coordinates': [[0, 0], [1, 1]]}]}]),
+            importer.ReadGeoJSON)
+        self.assertEqual(features, [('area', [[0, 0], [10, 0], [10, 10]]),
+                                    ('area', [[20, 20], [21, 20], [21, 21]]),
+                                    ('point', [1, 2]), ('point', [4, 5]),
+                                    ('point', [7, 8]), ('line', [[0, 0], [1, 1]])])
+
+    def test_empty(self):
+        features = _read(self._collection([
+            None,
+            {'type': 'Point', 'coordinates': []},
+            {'type': 'MultiPolygon', 'coordinates': [[]]},
+            {'type': 'GeometryCollection', 'geometries': []},
+            {'type': 'Point', 'coordinates': [1, 2]}]), importer.ReadGeoJSON)
+        self.assertEqual(features, [('point', [1, 2])])
+
+    def test_geometry(self):
+        """File with bare geometry"""
+        features = _read(json.dumps({'type': 'Point', 'coordinates': [1, 2]}),
+                         importer.ReadGeoJSON)
+        self.assertEqual(features, [('point', [1, 2])])
+
+
+class FakeVector:
+    """Vector map exported by fake v.out.ogr"""
+    geometries = {'point': {'type': 'Point', 'coordinates': [1, 2]},
+                  'line': {'type': 'LineString', 'coordinates': [[0, 0], [1, 1]]},
+                  'area': {'type': 'Polygon', 'coordinates': [[[0, 0], [1, 0], [1, 1]]]}}
+
+    def __init__(self, topology, combined=True):
+        """
+        :param topology: dictionary returned by vector_info_topo
+        :param combined: False if only first type is written and None
+                         if module fails when more types are requested
+        """
+        self.topology = topology
+        self.combined = combined
+        self.exported = []
+
+    def find_file(self, name, element=None):
+        return {'name': name}
+
+    def vector_info_topo(self, name):
+        return self.topology
+
+    def run_command(self, module, type, output, **kwargs):
+        self.exported.append(type)
+        vtypes = type.split(',')
+        if self.combined is None and len(vtypes) > 1:
+            raise _CalledModuleError()
+        if not self.combined:
+            vtypes = vtypes[:1]
+        with open(output, 'w') as f:
+            json.dump({'type': 'FeatureCollection',
+                       'features': [{'type': 'Feature', 'properties': {},
+                                     'geometry': self.geometries[vtype]}
+                                    for vtype in vtypes]}, f)
+
+
+class ReadVectorTest(unittest.TestCase):
+    def setUp(self):
+        self.saved = (importer.gcore, importer.gvector, importer.CalledModuleError)
+        importer.CalledModuleError = _CalledModuleError
+
+    def tearDown(self):
+        importer.gcore, importer.gvector, importer.CalledModuleError = self.saved
+
+    def _readVector(self, vector):
+        importer.gcore = importer.gvector = vector
+        return [ftype for ftype, coords, properties in importer.ReadVector('map')]
+
+    def test_combined(self):
+        vector = FakeVector({'points': 1, 'lines': 2, 'centroids': 1})
+        self.assertEqual(self._readVector(vector), ['point', 'line', 'area'])
+        self.assertEqual(vector.exported, ['point,line,area'])
+
+    def test_missing_types(self):
+        """Types not written together are exported separately"""
+        vector = FakeVector({'points': 0, 'lines': 2, 'centroids': 1}, combined=False)
+        self.assertEqual(self._readVector(vector), ['line', 'area'])
+        self.assertEqual(vector.exported, ['line,area', 'area'])
+
+    def test_unsupported_combination(self):
+        vector = FakeVector({'points': 1, 'lines': 0, 'centroids': 1}, combined=None)
+        self.assertEqual(self._readVector(vector), ['point', 'area'])
+        self.assertEqual(vector.exported, ['point,area', 'point', 'area'])
+
+    def test_no_features(self):
+        vector = FakeVector({'points': 0, 'lines': 0, 'areas': 2, 'centroids': 0})
+        self.assertEqual(self._readVector(vector), [])
+        self.assertEqual(vector.exported, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+"""
+@package rdigit.testsuite.test_journal
+
+@brief Tests of raster digitizer edit journal.
+
+(C) 2014 by the GRASS Development Team
+This program is free software under the GNU General Public
+License (>=v2). Read the file COPYING that comes with GRASS
+for details.
+
+@author Anna Petrasova <kratochanna gmail.com>
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from rdigit.journal import EditJournal
+from rdigit.rasterizer import RasterGrid
+
+
+class EditJournalTest(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self.journal = EditJournal(os.path.join(self._dir, 'journal'))
+        grid = RasterGrid(north=100, south=0, east=200, west=0, rows=10, cols=20)
+        self.journal.Create(grid, backupRaster='backup_map')
+
+    def tearDown(self):
+        self.journal.Close()
+        shutil.rmtree(self._dir)
+
+    def read(self):
+        self.journal.Sync()
+        return self.journal.Read()
+
+    def test_header(self):
+        state = self.read()
+        self.assertEqual(state.region, (100, 0, 200, 0, 10, 20))
+        self.assertEqual(state.backupRaster, 'backup_map')
+        self.assertEqual(state.mapType, None)
+        self.assertEqual(len(state), 0)
+
+    def test_new_map(self):
+        """New map keeps its background until the first save"""
+        journal = EditJournal(os.path.join(self._dir, 'new'))
+        grid = RasterGrid(north=100, south=0, east=200, west=0, rows=10, cols=20)
+        journal.Create(grid, backupRaster='background', mapType='FCELL')
+        journal.AddFeature('point', [1, 2], 1, None)
+        journal.Sync()
+        state = journal.Read()
+        self.assertEqual((state.backupRaster, state.mapType, state.nullBackup, state.written),
+                         ('background', 'FCELL', False, False))
+        journal.Save(1)
+        journal.Undo()
+        journal.Sync()
+        state = journal.Read()
+        self.assertTrue(state.written)
+        self.assertEqual(state.savedCount, 0)
+        journal.Close()
+
+        journal = EditJournal(os.path.join(self._dir, 'null'))
+        journal.Create(grid, mapType='CELL', nullBackup=True)
+        state = journal.Read()
+        self.assertEqual((state.backupRaster, state.mapType, state.nullBackup, state.written),
+                         (None, 'CELL', True, False))
+        journal.Close()
+
+    def test_features(self):
+        self.journal.AddFeature('area', [[0, 0], [10, 0], [10, 20]], 5, None)
+        self.journal.AddFeature('point', [3, 4], None, 2)
+        self.journal.AddFeature('line', [[1, 1], [2, 2]], 1.5, 1)
+        state = self.read()
+        self.assertEqual(state.types, ['area', 'point', 'line'])
+        self.assertEqual(state.values, [5, None, 1.5])
+        self.assertEqual(state.widths, [0, 2, 1])
+        self.assertEqual(state.counts, [3, 1, 2])
+        self.assertEqual(list(state.coords), [0, 0, 10, 0, 10, 20, 3, 4, 1, 1, 2, 2])
+        self.assertEqual(list(state.bboxes[:4]), [0, 0, 10, 20])
+        self.assertEqual(state.savedCount, 0)
+
+    def test_edits(self):
+        for i in range(4):
+            self.journal.AddFeature('point', [i, i], i, None)
+        self.journal.Save(4)
+        self.journal.Undo()
+        self.journal.SetValue(0, 10)
+        self.journal.SetDrawOrder(0, 2)
+        self.journal.Remove(1)
+        state = self.read()
+        # features 0, 1, 2 after undo, 1, 2, 0 after move, 1, 0 after removal
+        self.assertEqual(state.values, [1, 10])
+        self.assertEqual(list(state.coords), [1, 1, 0, 0])
+        self.assertEqual(state.savedCount, 2)
+        self.assertEqual(state.dirty, [1])
+        self.assertEqual(len(state.removedFeatures), 2)
+
+    def test_incomplete_record(self):
+        self.journal.AddFeature('point', [1, 2], 1, None)
+        self.journal.AddFeature('line', [[1, 1], [2, 2]], 2, None)
+        self.journal.Close()
+        with open(self.journal.GetPath(), 'rb+') as f:
+            f.seek(-8, os.SEEK_END)
+            f.truncate()
+        state = self.journal.Read()
+        self.assertEqual(state.types, ['point'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+"""
+@package rdigit.testsuite.test_planner
+
+@brief Tests of grouping features into rasterization batches.
+
+(C) 2014 by the GRASS Development Team
+This program is free software under the GNU General Public
+License (>=v2). Read the file COPYING that comes with GRASS
+for details.
+
+@author Anna Petrasova <kratochanna gmail.com>
+"""
+
+import unittest
+
+from rdigit.planner import BatchPlanner
+from rdigit.rasterizer import RasterGrid
+
+
+def Batches(planner):
+    return [(batch.key, batch.features) for batch in planner.GetBatches()]
+
+
+class BatchPlannerTest(unittest.TestCase):
+    def setUp(self):
+        # cells of size 1 x 1
+        self.grid = RasterGrid(north=10, south=0, east=100, west=0, rows=10, cols=100)
+
+    def test_join_distant(self):
+        planner = BatchPlanner(grid=self.grid)
+        planner.AddFeature(0, 'a', (0, 0, 5, 1))
+        planner.AddFeature(1, 'b', (20, 0, 30, 1))
+        planner.AddFeature(2, 'a', (50, 0, 60, 1))
+        self.assertEqual(Batches(planner), [('a', [0, 2]), ('b', [1])])
+
+    def test_overlapping_keeps_order(self):
+        planner = BatchPlanner(grid=self.grid)
+        planner.AddFeature(0, 'a', (0, 0, 5, 1))
+        planner.AddFeature(1, 'b', (20, 0, 30, 1))
+        planner.AddFeature(2, 'a', (25, 0, 28, 1))
+        self.assertEqual(Batches(planner), [('a', [0]), ('b', [1]), ('a', [2])])
+
+    def test_shared_cell_keeps_order(self):
+        """Disjoint bounding boxes within the same cell"""
+        planner = BatchPlanner(grid=self.grid)
+        planner.AddFeature(0, 'a', (0, 0, 5, 1))
+        planner.AddFeature(1, 'b', (10.4, 0, 12, 1))
+        planner.AddFeature(2, 'a', (8, 0, 10.2, 1))
+        self.assertEqual(Batches(planner), [('a', [0]), ('b', [1]), ('a', [2])])
+
+    def test_last_drawn_wins(self):
+        """Patching batches in order gives the same cells as drawing
+        features one by one"""
+        features = [('a', (0, 0, 3.2, 1)), ('b', (3.4, 0, 6, 1)), ('a', (6.5, 0, 7, 1)),
+                    ('c', (2.9, 0, 3.1, 1)), ('a', (3.3, 0, 3.3, 1)), ('b', (0.5, 0, 0.7, 1))]
+
+        def cells(bbox):
+            col0, row1 = self.grid.ToGrid(bbox[0], bbox[1])
+            col1, row0 = self.grid.ToGrid(bbox[2], bbox[3])
+            return [(row, col) for row in range(int(row0), int(row1))
+                    for col in range(int(col0), int(col1) + 1)]
+
+        expected = {}
+        planner = BatchPlanner(grid=self.grid)
+        for i, (key, bbox) in enumerate(features):
+            planner.AddFeature(i, key, bbox)
+            for cell in cells(bbox):
+                expected[cell] = key
+        result = {}
+        for batch in planner.GetBatches():
+            for i in batch.features:
+                for cell in cells(features[i][1]):
+                    result[cell] = batch.key
+        self.assertEqual(result, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,221 @@
+"""
+@package rdigit.testsuite.test_rasterizer
+
+@brief Tests of rasterization of features.
+
+(C) 2014 by the GRASS Development Team
+This program is free software under the GNU General Public
+License (>=v2). Read the file COPYING that comes with GRASS
+for details.
+
+@author Anna Petrasova <kratochanna gmail.com>
+"""
+
+import sys
+import types
+import unittest
+
+from rdigit.rasterizer import (RasterGrid, FeatureMask, FeatureRasterizer, DiskKernel,
+                               GrowMask, RasterizeBatches, PatchRaster, CELL_NULL,
+                               haveNumpy)
+
+if haveNumpy:
+    import numpy as np
+
+_dtypes = {'CELL': 'int32', 'FCELL': 'float32', 'DCELL': 'float64'}
+
+
+@unittest.skipUnless(haveNumpy, "NumPy is required")
+class RasterizerTest(unittest.TestCase):
+    def setUp(self):
+        self.grid = RasterGrid(north=10, south=0, east=10, west=0, rows=10, cols=10)
+
+    def test_empty_features(self):
+        for ftype in ('area', 'line', 'point', 'cells'):
+            self.assertEqual(FeatureMask(self.grid, ftype, []), None)
+
+    def test_point(self):
+        row, col, mask = FeatureMask(self.grid, 'point', [2.5, 7.5])
+        self.assertEqual((row, col, mask.tolist()), (2, 2, [[True]]))
+
+    def test_polygon_cell_centers(self):
+        """Cells are filled when their centers are inside"""
+        row, col, mask = FeatureMask(self.grid, 'area', [[1.4, 1.4], [3.6, 1.4],
+                                                         [3.6, 3.6], [1.4, 3.6]])
+        self.assertEqual((row, col), (6, 1))
+        self.assertEqual(mask.tolist(), [[True, True, True]] * 3)
+        self.assertEqual(FeatureMask(self.grid, 'area', [[1.6, 1.6], [2.4, 1.6],
+                                                         [2.4, 2.4], [1.6, 2.4]]),
+                         None)
+
+    def test_concave_polygon(self):
+        # U shape opened to the north
+        coords = [[0, 0], [6, 0], [6, 6], [4, 6], [4, 2], [2, 2], [2, 6], [0, 6]]
+        row, col, mask = FeatureMask(self.grid, 'area', coords)
+        self.assertEqual((row, col, mask.shape), (4, 0, (6, 6)))
+        self.assertEqual(mask[0].tolist(), [True, True, False, False, True, True])
+        self.assertTrue(mask[4:].all())
+        self.assertEqual(int(mask.sum()), 28)
+
+    def test_line_buffer(self):
+        rasterizer = FeatureRasterizer(self.grid)
+        self.assertTrue(rasterizer.AddFeature('line', [[2.5, 5.5], [6.5, 5.5]], 1,
+                                              width=1))
+        mask = rasterizer.GetMask()
+        self.assertEqual(mask[3:6, :].astype(int).tolist(),
+                         [[0, 0, 1, 1, 1, 1, 1, 0, 0, 0],
+                          [0, 1, 1, 1, 1, 1, 1, 1, 0, 0],
+                          [0, 0, 1, 1, 1, 1, 1, 0, 0, 0]])
+        self.assertEqual(int(mask.sum()), 17)
+
+    def test_point_buffer_outside(self):
+        """Buffer of point outside of the grid reaches into it"""
+        rasterizer = FeatureRasterizer(self.grid)
+        self.assertTrue(rasterizer.AddFeature('point', [-0.5, 5.5], 2, width=1.5))
+        mask = rasterizer.GetMask()
+        self.assertEqual(mask[:, 0].astype(int).tolist(),
+                         [0, 0, 0, 1, 1, 1, 0, 0, 0, 0])
+        self.assertEqual(int(mask.sum()), 3)
+        self.assertEqual(rasterizer.GetRange(), (2, 2))
+
+    def test_kernel_non_square(self):
+        """Kernel rows are given by distances of cell centers in map units"""
+        self.assertEqual(DiskKernel(3, nsres=2, ewres=1), [2, 3, 2])
+        self.assertEqual(DiskKernel(3, nsres=1, ewres=2), [0, 1, 1, 1, 1, 1, 0])
+        mask = np.zeros((1, 1), dtype=bool)
+        mask[0, 0] = True
+        grown = GrowMask(mask, DiskKernel(3, nsres=2, ewres=1))
+        self.assertEqual(grown.astype(int).tolist(),
+                         [[0, 1, 1, 1, 1, 1, 0],
+                          [1, 1, 1, 1, 1, 1, 1],
+                          [0, 1, 1, 1, 1, 1, 0]])
+
+    def test_kernel_zero(self):
+        """Growing by zero radius keeps the mask"""
+        self.assertEqual(DiskKernel(0, nsres=2, ewres=1), [0])
+        mask = np.array([[True, False], [False, True]])
+        self.assertEqual(GrowMask(mask, [0]).tolist(), mask.tolist())
+
+    def test_batches_skip_empty(self):
+        """Unfinished point does not stop rasterization of the batch"""
+        batches = [([('point', [], 1), ('point', [0.5, 9.5], 1)], None),
+                   ([('point', [], 2)], None),
+                   ([('line', [[0.5, 9.5], [3.5, 9.5]], 3)], None)]
+        rasterizer = RasterizeBatches(self.grid, batches)
+        values = rasterizer.GetValues()
+        mask = rasterizer.GetMask()
+        self.assertEqual(int(mask.sum()), 4)
+        self.assertEqual(values[0, :4].tolist(), [3, 3, 3, 3])
+
+    def test_later_overwrites(self):
+        batches = [([('area', [[0, 0], [4, 0], [4, 4], [0, 4]], 1)], None),
+                   ([('line', [[0.5, 8.5], [0.5, 1.5]], 2)], 1)]
+        values = RasterizeBatches(self.grid, batches).GetValues()
+        self.assertEqual(values[7, :5].tolist(), [2, 2, 1, 1, 0])
+        # buffer of the line end
+        self.assertEqual(values[9, :4].tolist(), [2, 1, 1, 1])
+
+
+class _RasterRow(object):
+    """Raster map kept in memory in place of pygrass RasterRow"""
+    maps = {}
+
+    def __init__(self, name, mapset=''):
+        self.name = name
+        self.mtype = None
+        self.data = None
+        self.written = 0
+
+    def open(self, mode, mtype=None, overwrite=False):
+        self.mode = mode
+        if mode == 'r':
+            self.mtype, self.data = self.maps[self.name]
+        else:
+            self.mtype = mtype
+        self.info = types.ModuleType('info')
+        self.info.rows = 10
+
+    def get_row(self, i):
+        return self.data[i].copy()
+
+    def put_row(self, row):
+        assert row.dtype == np.dtype(_dtypes[self.mtype])
+        if self.data is None:
+            self.data = np.zeros((10, row.shape[0]), dtype=row.dtype)
+        self.data[self.written] = row
+        self.written += 1
+
+    def close(self):
+        if self.mode == 'w':
+            self.maps[self.name] = (self.mtype, self.data)
+
+
+def _buffer(shape, mtype='FCELL'):
+    return np.empty(shape, dtype=_dtypes[mtype])
+
+
+@unittest.skipUnless(haveNumpy, "NumPy is required")
+class PatchRasterTest(unittest.TestCase):
+    """Patching with raster maps kept in memory"""
+    def setUp(self):
+        self.modules = {}
+        raster = types.ModuleType('grass.pygrass.raster')
+        raster.RasterRow = _RasterRow
+        buffer = types.ModuleType('grass.pygrass.raster.buffer')
+        buffer.Buffer = _buffer
+        for name, module in (('grass', types.ModuleType('grass')),
+                             ('grass.pygrass', types.ModuleType('grass.pygrass')),
+                             ('grass.pygrass.raster', raster),
+                             ('grass.pygrass.raster.buffer', buffer)):
+            self.modules[name] = sys.modules.get(name)
+            sys.modules[name] = module
+        _RasterRow.maps = {}
+        self.grid = RasterGrid(north=10, south=0, east=10, west=0, rows=10, cols=10)
+        self.rasterizer = FeatureRasterizer(self.grid.Window((2.5, 2.5, 3.5, 3.5)))
+        self.rasterizer.AddFeature('point', [3.5, 3.5], 5)
+
+    def tearDown(self):
+        for name, module in self.modules.items():
+            if module is None:
+                del sys.modules[name]
+            else:
+                sys.modules[name] = module
+
+    def test_rows(self):
+        base = np.arange(100, dtype=np.int32).reshape((10, 10))
+        _RasterRow.maps['base'] = ('CELL', base)
+        rows = []
+        PatchRaster(self.rasterizer, 'base', 'output', progress=rows.append)
+        self.assertEqual(rows, list(range(1, 11)))
+        mtype, data = _RasterRow.maps['output']
+        self.assertEqual(mtype, 'CELL')
+        expected = base.copy()
+        expected[6, 3] = 5
+        self.assertEqual(data.tolist(), expected.tolist())
+
+    def test_convert_type(self):
+        base = np.arange(100, dtype=np.int32).reshape((10, 10))
+        base[0, 0] = CELL_NULL
+        _RasterRow.maps['base'] = ('CELL', base)
+        PatchRaster(self.rasterizer, 'base', 'output', mtype='DCELL')
+        mtype, data = _RasterRow.maps['output']
+        self.assertEqual((mtype, data.dtype), ('DCELL', np.float64))
+        self.assertTrue(np.isnan(data[0, 0]))
+        self.assertEqual((data[6, 3], data[9, 9]), (5, 99))
+
+    def test_null_window(self):
+        """Without base the window is null, outside is kept"""
+        outside = np.ones((10, 10), dtype=np.float32)
+        _RasterRow.maps['outside'] = ('FCELL', outside)
+        PatchRaster(self.rasterizer, None, 'output', outside='outside')
+        data = _RasterRow.maps['output'][1]
+        window = self.rasterizer.GetGrid()
+        self.assertEqual((window.rowOffset, window.colOffset, window.rows, window.cols),
+                         (5, 1, 4, 4))
+        self.assertEqual(int(np.isnan(data[5:9, 1:5]).sum()), 15)
+        self.assertEqual(data[6, 3], 5)
+        self.assertEqual(float(np.nansum(data)), 100 - 16 + 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+"""
+@package rdigit.testsuite.test_selection
+
+@brief Tests of spatial index and hit testing of features.
+
+(C) 2014 by the GRASS Development Team
+This program is free software under the GNU General Public
+License (>=v2). Read the file COPYING that comes with GRASS
+for details.
+
+@author Anna Petrasova <kratochanna gmail.com>
+"""
+
+import unittest
+
+from rdigit.selection import FeatureIndex, HitFeature, FeatureInPolygon
+
+
+class FeatureIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = FeatureIndex(cellSize=10, maxCells=16)
+        self.index.Insert(1, (1, 1, 2, 2))
+        # crosses borders of four grid cells
+        self.index.Insert(2, (8, 8, 12, 12))
+        self.index.Insert(3, (25, 25, 26, 26))
+        # spans too many grid cells, kept aside
+        self.index.Insert(4, (0, 0, 100, 1))
+
+    def test_query(self):
+        self.assertEqual(sorted(self.index.Query((0, 0, 5, 5))), [1, 4])
+        self.assertEqual(sorted(self.index.Query((24, 24, 30, 30))), [3])
+        self.assertEqual(self.index.Query((50, 50, 60, 60)), [])
+        # large extent goes through occupied cells
+        self.assertEqual(sorted(self.index.Query((-1000, -1000, 1000, 1000))), [1, 2, 3, 4])
+
+    def test_crossing_cells(self):
+        """Feature is found from any grid cell it overlaps"""
+        for bbox in ((9, 9, 9.5, 9.5), (11, 9, 11.5, 9.5),
+                     (9, 11, 9.5, 11.5), (11, 11, 11.5, 11.5)):
+            self.assertEqual(self.index.Query(bbox), [2])
+        # grid cell is shared, bounding boxes do not intersect
+        self.assertEqual(self.index.Query((13, 13, 14, 14)), [])
+
+    def test_remove(self):
+        self.index.Remove(2)
+        self.index.Remove(4)
+        self.assertEqual(len(self.index), 2)
+        self.assertFalse(2 in self.index)
+        self.assertEqual(self.index.Query((9, 9, 11, 11)), [])
+        self.assertEqual(self.index.Query((0, 0, 100, 1)), [1])
+        # removing unknown feature is ignored
+        self.index.Remove(5)
+        self.assertEqual(len(self.index), 2)
+
+    def test_update(self):
+        self.index.Insert(1, (30, 30, 31, 31))
+        self.assertEqual(self.index.GetBBox(1), (30, 30, 31, 31))
+        self.assertEqual(sorted(self.index.Query((0, 0, 5, 5))), [4])
+        self.assertEqual(self.index.Query((29, 29, 32, 32)), [1])
+        # empty feature is not indexed
+        self.index.Insert(1, None)
+        self.assertFalse(1 in self.index)
+
+
+class HitTest(unittest.TestCase):
+    def setUp(self):
+        # lasso with a notch from the north
+        self.lasso = [[0, 0], [10, 0], [10, 10], [6, 10], [6, 4], [4, 4], [4, 10], [0, 10]]
+
+    def test_lasso_vertices(self):
+        """Features are in lasso when all their vertices are"""
+        self.assertTrue(FeatureInPolygon('point', [2, 8], self.lasso))
+        self.assertFalse(FeatureInPolygon('point', [5, 8], self.lasso))
+        self.assertTrue(FeatureInPolygon('line', [[1, 1], [9, 1], [9, 9]], self.lasso))
+        # segment crosses the notch, vertices are inside
+        self.assertTrue(FeatureInPolygon('line', [[2, 8], [8, 8]], self.lasso))
+        self.assertFalse(FeatureInPolygon('area', [[1, 1], [5, 5], [1, 5]], self.lasso))
+        self.assertTrue(FeatureInPolygon('cells', [[1.5, 2.5], [8.5, 2.5]], self.lasso))
+        self.assertFalse(FeatureInPolygon('line', [], self.lasso))
+
+    def test_hit(self):
+        self.assertTrue(HitFeature('point', [5, 5], None, 5.5, 5, tolerance=1))
+        self.assertFalse(HitFeature('point', [5, 5], None, 7, 5, tolerance=1))
+        # width of buffered line counts
+        self.assertTrue(HitFeature('line', [[0, 0], [10, 0]], 2, 5, 2.5, tolerance=1))
+        self.assertFalse(HitFeature('line', [[0, 0], [10, 0]], None, 5, 2.5, tolerance=1))
+        # inside of area
+        self.assertTrue(HitFeature('area', self.lasso, None, 8, 8, tolerance=0))
+        self.assertFalse(HitFeature('area', self.lasso, None, 5, 8, tolerance=0.5))
+        # runs of cells are not connected
+        self.assertFalse(HitFeature('cells', [[0, 0], [2, 0], [6, 0], [8, 0]], None,
+                                    4, 0, tolerance=1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+"""
+@package rdigit.testsuite.test_simplify
+
+@brief Tests of simplification of digitized polylines.
+
+(C) 2014 by the GRASS Development Team
+This program is free software under the GNU General Public
+License (>=v2). Read the file COPYING that comes with GRASS
+for details.
+
+@author Anna Petrasova <kratochanna gmail.com>
+"""
+
+import unittest
+
+from rdigit.simplify import DouglasPeucker, StreamSimplifier, SegmentDistance
+
+
+def MaxDistance(points, vertices):
+    """Returns maximum distance of points from polyline"""
+    return max(min(SegmentDistance(x, y, v0[0], v0[1], v1[0], v1[1])
+                   for v0, v1 in zip(vertices[:-1], vertices[1:]))
+               for x, y in points)
+
+
+class SimplifyTest(unittest.TestCase):
+    def setUp(self):
+        # zigzag along a line with a sharp turn
+        self.points = [(i, 0.1 * (i % 2)) for i in range(20)] + \
+            [(19, i) for i in range(1, 10)]
+
+    def test_douglas_peucker(self):
+        self.assertEqual(DouglasPeucker(self.points, 0.5), [0, 19, 28])
+        # collinear vertices are removed with any tolerance
+        self.assertEqual(DouglasPeucker(self.points, 1e-9), list(range(20)) + [28])
+        self.assertEqual(DouglasPeucker(self.points[:2], 1), [0, 1])
+
+    def test_stream(self):
+        simplifier = StreamSimplifier(0.5)
+        for x, y in self.points:
+            simplifier.Add(x, y)
+        vertices = simplifier.GetVertices()
+        self.assertEqual(vertices[0], [0, 0])
+        self.assertEqual(vertices[-1], [19, 9])
+        self.assertTrue(len(vertices) <= 4)
+        self.assertEqual(simplifier.GetNumberOfVertices(), len(vertices))
+        self.assertTrue(MaxDistance(self.points, vertices) <= 0.5 + 1e-9)
+
+    def test_budget(self):
+        simplifier = StreamSimplifier(0.01, maxTolerance=0.5, budget=5)
+        for x, y in self.points:
+            simplifier.Add(x, y)
+        self.assertTrue(simplifier.GetNumberOfVertices() <= 5)
+        self.assertTrue(MaxDistance(self.points, simplifier.GetVertices()) <= 0.5 + 1e-9)
+
+
+if __name__ == '__main__':
+    unittest.main()
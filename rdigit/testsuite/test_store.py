@@ -0,0 +1,70 @@
+"""
+@package rdigit.testsuite.test_store
+
+@brief Tests of columnar feature storage.
+
+(C) 2014 by the GRASS Development Team
+This program is free software under the GNU General Public
+License (>=v2). Read the file COPYING that comes with GRASS
+for details.
+
+@author Anna Petrasova <kratochanna gmail.com>
+"""
+
+import unittest
+
+from rdigit.store import FeatureStore
+
+
+class FeatureStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.store = FeatureStore()
+        self.a = self.store.AddFeature('area', [[0, 0], [2, 0], [2, 2]], value=1)
+        self.b = self.store.AddFeature('line', [[5, 5], [6, 7]], value=2, width=0.5)
+        self.c = self.store.AddFeature('point', [3, 4])
+
+    def assertFeatures(self, expected):
+        store = self.store
+        self.assertEqual(store.GetIds(), [fid for fid, coords in expected])
+        for order, (fid, coords) in enumerate(expected):
+            self.assertEqual(store.GetDrawOrder(fid), order)
+            self.assertEqual(store.GetCoords(fid), coords)
+
+    def test_add(self):
+        self.assertEqual(len(self.store), 3)
+        self.assertEqual(self.store.GetValue(self.c), None)
+        self.assertEqual(self.store.GetBBox(self.b), (4.5, 4.5, 6.5, 7.5))
+        self.assertEqual(self.store.GetCoords(self.c), [3, 4])
+
+    def test_draw_order(self):
+        self.store.SetDrawOrder(self.c, 0)
+        self.assertFeatures([(self.c, [3, 4]), (self.a, [[0, 0], [2, 0], [2, 2]]),
+                             (self.b, [[5, 5], [6, 7]])])
+        self.assertEqual(self.store.GetType(self.c), 'point')
+        self.store.SetDrawOrder(self.c, 10)
+        self.assertFeatures([(self.a, [[0, 0], [2, 0], [2, 2]]), (self.b, [[5, 5], [6, 7]]),
+                             (self.c, [3, 4])])
+        self.assertEqual(self.store.GetWidth(self.b), 0.5)
+
+    def test_remove(self):
+        self.store.Remove(self.a)
+        self.assertFeatures([(self.b, [[5, 5], [6, 7]]), (self.c, [3, 4])])
+        self.assertFalse(self.a in self.store)
+
+    def test_remove_features(self):
+        d = self.store.AddFeature('line', [[1, 1], [1, 2]], value=4)
+        self.store.RemoveFeatures([self.a, self.c])
+        self.assertFeatures([(self.b, [[5, 5], [6, 7]]), (d, [[1, 1], [1, 2]])])
+        self.assertEqual(self.store.GetValue(d), 4)
+        self.assertEqual(self.store.GetBBox(d), (1, 1, 1, 2))
+
+    def test_last_vertex(self):
+        self.assertFalse(self.store.AppendVertex(self.a, 9, 9))
+        line = self.store.AddFeature('line', [[0, 0]], value=1)
+        self.assertTrue(self.store.AppendVertex(line, 1, 1))
+        self.assertEqual(self.store.GetCoords(line), [[0, 0], [1, 1]])
+        self.assertEqual(self.store.GetNumberOfVertices(self.b), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
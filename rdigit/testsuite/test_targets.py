@@ -0,0 +1,65 @@
+"""
+@package rdigit.testsuite.test_targets
+
+@brief Tests of mapping cell values to target raster maps.
+
+(C) 2014 by the GRASS Development Team
+This program is free software under the GNU General Public
+License (>=v2). Read the file COPYING that comes with GRASS
+for details.
+
+@author Anna Petrasova <kratochanna gmail.com>
+"""
+
+import gettext
+import unittest
+
+from rdigit.rasterizer import haveNumpy
+from rdigit.targets import ValueMapping
+
+gettext.install('grasswxpy')
+
+if haveNumpy:
+    import numpy as np
+
+
+class ValueMappingTest(unittest.TestCase):
+    def setUp(self):
+        self.mapping = ValueMapping("1 2 5 = 1\n"
+                                    "10 thru 20 = 2  # range\n"
+                                    "3 = NULL\n"
+                                    "15 = 7\n"
+                                    "* = 0\n")
+
+    def test_map(self):
+        self.assertEqual([self.mapping.Map(value) for value in (1, 5, 3, 10, 15, 20, 4, None)],
+                         [1, 1, None, 2, 7, 2, 0, None])
+
+    def test_identity(self):
+        mapping = ValueMapping()
+        self.assertTrue(mapping.IsIdentity())
+        self.assertEqual(mapping.Map(4.5), 4.5)
+        self.assertEqual(mapping.GetExpression('map'), 'map')
+
+    def test_no_default(self):
+        self.assertEqual(ValueMapping("1 = 2").Map(3), None)
+
+    def test_invalid(self):
+        for rules in ("1 = a", "= 1", "1 2", "1 thru = 2"):
+            self.assertRaises(ValueError, ValueMapping, rules)
+
+    def test_expression(self):
+        self.assertEqual(ValueMapping("1 = 2\n3 thru 4 = NULL").GetExpression('m'),
+                         'if(m >= 3.0 && m <= 4.0, null(), if(m == 1.0, 2.0, null()))')
+
+    @unittest.skipUnless(haveNumpy, "NumPy is required")
+    def test_apply(self):
+        mapped = self.mapping.Apply(np.array([1, 3, 15, 4, np.nan]))
+        self.assertEqual(mapped[[0, 2, 3]].tolist(), [1, 7, 0])
+        self.assertTrue(np.isnan(mapped[1]))
+        # null cells get default value
+        self.assertEqual(mapped[4], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
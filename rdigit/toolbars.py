@@ -20,6 +20,7 @@ from core.utils import _
 from gui_core.toolbars import BaseToolbar
 from icons.icon import MetaIcon
 from gui_core.widgets import FloatValidator
+from rdigit.dialogs import VectorImportDialog
 import wx.lib.colourselect as csel
 
 
@@ -29,8 +30,33 @@ rdigitIcons = {'area': MetaIcon(img='polygon-create',
                                 label=_('Digitize line')),
                'point': MetaIcon(img='point-create',
                                  label=_('Digitize point')),
+               'fill': MetaIcon(img='layer-raster-analysis',
+                                label=_('Fill cells connected to clicked cell')),
+               'brush': MetaIcon(img='line-edit',
+                                 label=_('Paint cells with brush')),
                'save': MetaIcon(img='save', label=_("Save raster map")),
+               'autosave': MetaIcon(img='settings',
+                                    label=_("Save edits automatically "
+                                            "(after 50 features or 5 minutes)")),
+               'targets': MetaIcon(img='layer-raster-more',
+                                   label=_("Save features also to other raster maps")),
+               'import': MetaIcon(img='layer-import',
+                                  label=_("Import features from vector map or file")),
+               'cancel': MetaIcon(img='layer-remove', label=_("Cancel saving raster map")),
                'undo': MetaIcon(img='undo', label=_("Undo")),
+               'redo': MetaIcon(img='redo', label=_("Redo")),
+               'select': MetaIcon(img='select',
+                                  label=_("Select features by click or box")),
+               'lasso': MetaIcon(img='boundary-create',
+                                 label=_("Select features by polygon")),
+               'delete': MetaIcon(img='line-delete', label=_("Delete selected features")),
+               'revalue': MetaIcon(img='cats-display',
+                                   label=_("Set current cell value to selected features")),
+               'raise': MetaIcon(img='layer-up', label=_("Move selected features to top")),
+               'lower': MetaIcon(img='layer-down',
+                                 label=_("Move selected features to bottom")),
+               'preview': MetaIcon(img='layer-raster-add',
+                                   label=_("Show preview of raster cells")),
                'quit': MetaIcon(img='quit', label=_("Quit raster digitizer"))}
 
 
@@ -58,7 +84,7 @@ class RDigitToolbar(BaseToolbar):
                                         size=(30, 30))
         self._color.Bind(csel.EVT_COLOURSELECT, lambda evt: self._changeDrawColor())
         self._color.SetToolTipString(_("Set drawing color (not raster cell color)"))
-        self.InsertControl(4, self._color)
+        self.InsertControl(6, self._color)
 
         self._cellValues = set(['1'])
         self._valueComboId = wx.NewId()
@@ -70,8 +96,8 @@ class RDigitToolbar(BaseToolbar):
         self._valueCombo.Bind(wx.EVT_TEXT, lambda evt: self._cellValueChanged())
         self._valueCombo.SetSelection(0)
         self._cellValueChanged()
-        self.InsertControl(6, wx.StaticText(self, label=" %s" % _("Cell value:")))
-        self.InsertControl(7, self._valueCombo)
+        self.InsertControl(8, wx.StaticText(self, label=" %s" % _("Cell value:")))
+        self.InsertControl(9, self._valueCombo)
 
         self._widthValueId = wx.NewId()
         # validator does not work with combobox, SetBackgroundColor is not working
@@ -79,11 +105,53 @@ class RDigitToolbar(BaseToolbar):
                                        size=(80, -1), validator=FloatValidator())
         self._widthValue.Bind(wx.EVT_TEXT, lambda evt: self._widthValueChanged())
         self._widthValueChanged()
-        self._widthValue.SetToolTipString(_("Width of currently digitized line/point in map units."))
-        self.InsertControl(8, wx.StaticText(self, label=" %s" % _("Width:")))
-        self.InsertControl(9, self._widthValue)
+        self._widthValue.SetToolTipString(_("Width of currently digitized line/point "
+                                            "and brush radius in map units."))
+        self.InsertControl(10, wx.StaticText(self, label=" %s" % _("Width:")))
+        self.InsertControl(11, self._widthValue)
 
-        for tool in (self.area, self.line, self.point):
+        self._toleranceValue = wx.TextCtrl(self, value='0', size=(50, -1),
+                                           validator=FloatValidator())
+        self._toleranceValue.Bind(wx.EVT_TEXT, lambda evt: self._fillOptionsChanged())
+        self._toleranceValue.SetToolTipString(_("Maximum difference of filled cells "
+                                                "from value of clicked cell"))
+        self._connectivity = wx.Choice(self, choices=[_("4 neighbors"), _("8 neighbors")])
+        self._connectivity.SetSelection(0)
+        self._connectivity.Bind(wx.EVT_CHOICE, lambda evt: self._fillOptionsChanged())
+        self._connectivity.SetToolTipString(_("Cells connected to filled cells"))
+        self.InsertControl(12, wx.StaticText(self, label=" %s" % _("Tolerance:")))
+        self.InsertControl(13, self._toleranceValue)
+        self.InsertControl(14, self._connectivity)
+
+        self._brushShape = wx.Choice(self, choices=[_("Circle"), _("Square")])
+        self._brushShape.SetSelection(0)
+        self._brushShape.Bind(wx.EVT_CHOICE,
+                              lambda evt: self._controller.SetBrushShape(
+                                  'square' if self._brushShape.GetSelection() == 1 else 'circle'))
+        self._brushShape.SetToolTipString(_("Shape of brush"))
+        self.InsertControl(15, self._brushShape)
+
+        self._simplifyValue = wx.TextCtrl(self, value='1', size=(50, -1),
+                                          validator=FloatValidator())
+        self._simplifyValue.Bind(wx.EVT_TEXT, lambda evt: self._simplificationChanged())
+        self._simplifyValue.SetToolTipString(_("Maximum distance of vertices removed "
+                                               "from digitized line/area (0 to disable)"))
+        self._simplifyUnits = wx.Choice(self, choices=[_("pixels"), _("cells")])
+        self._simplifyUnits.SetSelection(0)
+        self._simplifyUnits.Bind(wx.EVT_CHOICE, lambda evt: self._simplificationChanged())
+        self._vertexBudget = wx.TextCtrl(self, value='1000', size=(60, -1),
+                                         validator=FloatValidator())
+        self._vertexBudget.Bind(wx.EVT_TEXT, lambda evt: self._simplificationChanged())
+        self._vertexBudget.SetToolTipString(_("Maximum number of vertices of digitized "
+                                              "line/area (0 for unlimited)"))
+        self.InsertControl(16, wx.StaticText(self, label=" %s" % _("Simplify:")))
+        self.InsertControl(17, self._simplifyValue)
+        self.InsertControl(18, self._simplifyUnits)
+        self.InsertControl(19, wx.StaticText(self, label=" %s" % _("Max vertices:")))
+        self.InsertControl(20, self._vertexBudget)
+
+        for tool in (self.area, self.line, self.point, self.fill, self.brush,
+                     self.select, self.lasso):
             self.toolSwitcher.AddToolToGroup(group='mouseUse', toolbar=self, tool=tool)
         self.toolSwitcher.toggleToolChanged.connect(self.CheckSelectedTool)
         self._default = self.area
@@ -101,17 +169,101 @@ class RDigitToolbar(BaseToolbar):
                                      ('point', rdigitIcons['point'],
                                       lambda event: self._controller.SelectType('point'),
                                       wx.ITEM_CHECK),
+                                     ('fill', rdigitIcons['fill'],
+                                      lambda event: self._controller.SelectType('fill'),
+                                      wx.ITEM_CHECK),
+                                     ('brush', rdigitIcons['brush'],
+                                      lambda event: self._controller.SelectType('brush'),
+                                      wx.ITEM_CHECK),
                                      (None, ),
                                      (None, ),
                                      ('undo', rdigitIcons['undo'],
                                       lambda event: self._controller.Undo()),
+                                     ('redo', rdigitIcons['redo'],
+                                      lambda event: self._controller.Redo()),
+                                     (None, ),
+                                     ('select', rdigitIcons['select'],
+                                      lambda event: self._controller.SelectType('select'),
+                                      wx.ITEM_CHECK),
+                                     ('lasso', rdigitIcons['lasso'],
+                                      lambda event: self._controller.SelectType('lasso'),
+                                      wx.ITEM_CHECK),
+                                     ('delete', rdigitIcons['delete'],
+                                      lambda event: self._controller.DeleteSelected()),
+                                     ('revalue', rdigitIcons['revalue'],
+                                      lambda event: self._controller.SetSelectedValue()),
+                                     ('raise', rdigitIcons['raise'],
+                                      lambda event: self._controller.RaiseSelected()),
+                                     ('lower', rdigitIcons['lower'],
+                                      lambda event: self._controller.LowerSelected()),
+                                     (None, ),
+                                     ('import', rdigitIcons['import'],
+                                      lambda event: self._importMenu()),
+                                     ('preview', rdigitIcons['preview'],
+                                      lambda event: self._showPreview(),
+                                      wx.ITEM_CHECK),
                                      ('save', rdigitIcons['save'],
                                       lambda event: self._controller.Save()),
+                                     ('autosave', rdigitIcons['autosave'],
+                                      lambda event: self._controller.EnableAutosave(
+                                          self.GetToolState(self.autosave)),
+                                      wx.ITEM_CHECK),
+                                     ('targets', rdigitIcons['targets'],
+                                      lambda event: self._targetsMenu()),
+                                     ('cancel', rdigitIcons['cancel'],
+                                      lambda event: self._controller.CancelExport()),
                                      ('quit', rdigitIcons['quit'],
                                       lambda event: self._controller.Stop())))
 
+    def _importMenu(self):
+        """Shows menu for importing features from vector map or file"""
+        menu = wx.Menu()
+        item = menu.Append(wx.ID_ANY, _("From vector map..."))
+        self.Bind(wx.EVT_MENU, lambda evt: self._importVector(), item)
+        item = menu.Append(wx.ID_ANY, _("From GeoJSON or WKT file..."))
+        self.Bind(wx.EVT_MENU, lambda evt: self._importFile(), item)
+        self.PopupMenu(menu)
+        menu.Destroy()
+
+    def _importVector(self):
+        dlg = VectorImportDialog(self)
+        if dlg.ShowModal() == wx.ID_OK:
+            self._controller.LoadFeatures(dlg.GetMapName())
+        dlg.Destroy()
+
+    def _importFile(self):
+        dlg = wx.FileDialog(self, message=_("Import features"),
+                            wildcard=_("GeoJSON (*.geojson;*.json)|*.geojson;*.json|"
+                                       "WKT (*.wkt;*.txt)|*.wkt;*.txt"),
+                            style=wx.FD_OPEN | wx.FD_FILE_MUST_EXIST)
+        if dlg.ShowModal() == wx.ID_OK:
+            self._controller.LoadFeatures(dlg.GetPath())
+        dlg.Destroy()
+
+    def _targetsMenu(self):
+        """Shows menu for adding and removing target raster maps"""
+        menu = wx.Menu()
+        item = menu.Append(wx.ID_ANY, _("Add raster map..."))
+        self.Bind(wx.EVT_MENU, lambda evt: self._controller.AddTargetMap(), item)
+        targets = self._controller.GetTargetMaps()
+        if targets:
+            menu.AppendSeparator()
+        for name in targets:
+            item = menu.Append(wx.ID_ANY, _("Stop saving to <%s>") % name)
+            self.Bind(wx.EVT_MENU,
+                      lambda evt, name=name: self._controller.RemoveTargetMap(name), item)
+        self.PopupMenu(menu)
+        menu.Destroy()
+
+    def _showPreview(self):
+        show = self.GetToolState(self.preview)
+        if not self._controller.ShowPreview(show):
+            self.ToggleTool(self.preview, False)
+
     def CheckSelectedTool(self, id):
-        if self.toolSwitcher.IsToolInGroup(tool=id, group='mouseUse') and id not in (self.area, self.line, self.point):
+        if self.toolSwitcher.IsToolInGroup(tool=id, group='mouseUse') and \
+                id not in (self.area, self.line, self.point, self.fill,
+                           self.brush, self.select, self.lasso):
             self._controller.SelectType(None)
 
     def UpdateRasterLayers(self, rasters):
@@ -166,6 +318,26 @@ class RDigitToolbar(BaseToolbar):
             self._controller.SetWidthValue(0)
             return
 
+    def _fillOptionsChanged(self):
+        try:
+            tolerance = float(self._toleranceValue.GetValue())
+        except ValueError:
+            tolerance = 0
+        connectivity = 8 if self._connectivity.GetSelection() == 1 else 4
+        self._controller.SetFillOptions(connectivity=connectivity, tolerance=tolerance)
+
+    def _simplificationChanged(self):
+        try:
+            tolerance = max(float(self._simplifyValue.GetValue()), 0)
+        except ValueError:
+            tolerance = 0
+        try:
+            budget = max(int(float(self._vertexBudget.GetValue())), 0)
+        except ValueError:
+            budget = 0
+        units = 'cells' if self._simplifyUnits.GetSelection() == 1 else 'pixels'
+        self._controller.SetSimplification(tolerance=tolerance, units=units, budget=budget)
+
     def _changeDrawColor(self):
         color = self._color.GetColour()
         self._controller.ChangeDrawColor(color=color)